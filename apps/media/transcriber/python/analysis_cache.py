@@ -0,0 +1,135 @@
+"""Analysis result cache with in-flight request coalescing.
+
+Voicemail greetings, dead-air calls and other stock transcripts produce the
+same text over and over. Results are keyed by a hash of the normalized
+transcript plus the prompt version, kept for a TTL in a bounded LRU, and
+concurrent callers asking for the same key share one in-flight request.
+
+Only the caller that actually ran the request gets its token usage; values
+served from the cache or from another caller's in-flight request are
+marked `cached` with tokensIn/tokensOut zeroed (see mark_reused), so
+per-result token accounting adds up to what was really spent.
+"""
+
+import re
+import copy
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_transcript(transcript: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace."""
+    text = _PUNCTUATION.sub(" ", transcript.lower())
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def make_key(transcript: str, prompt_version: str) -> str:
+    material = f"{prompt_version}\n{normalize_transcript(transcript)}"
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def mark_reused(value: Any) -> Any:
+    """Flag a reused analysis record and zero the tokens it did not spend."""
+    if isinstance(value, dict):
+        value["cached"] = True
+        for key in ("tokensIn", "tokensOut"):
+            if key in value:
+                value[key] = 0
+    return value
+
+
+class AnalysisCache:
+    def __init__(self, ttl_seconds: int = 86400, max_entries: int = 10000,
+                 reused: Callable[[Any], Any] = mark_reused):
+        self.reused = reused
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.inflight = {}            # key -> Future
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """Cached value (marked as reused), or None."""
+        with self.lock:
+            value = self._get_locked(key)
+            if value is not None:
+                self.hits += 1
+        return self.reused(value) if value is not None else None
+
+    def _get_locked(self, key: str) -> Optional[Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return copy.deepcopy(value)
+
+    def put(self, key: str, value: Any):
+        with self.lock:
+            self.entries[key] = (time.time() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any],
+                       cacheable: Callable[[Any], bool] = lambda value: True) -> Any:
+        """Return the cached value, join an identical in-flight call, or compute it.
+
+        Values rejected by `cacheable` (e.g. API errors) are returned to every
+        waiting caller but not stored.
+        """
+        with self.lock:
+            value = self._get_locked(key)
+            if value is not None:
+                self.hits += 1
+                return self.reused(value)
+            future = self.inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                self.misses += 1
+                future = Future()
+                self.inflight[key] = future
+                owner = True
+
+        if not owner:
+            return self.reused(copy.deepcopy(future.result()))
+
+        try:
+            value = compute()
+            if cacheable(value):
+                self.put(key, value)
+            future.set_result(value)
+            return copy.deepcopy(value)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced
+            }
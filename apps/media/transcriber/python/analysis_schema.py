@@ -0,0 +1,270 @@
+"""Typed analysis results for the billing / application prompts.
+
+In JSON mode the model is asked for one JSON object with the keys in
+JSON_FIELDS (DeepSeek's response_format json_object), which
+parse_json_analysis decodes and type-checks in a single pass. Legacy
+"Field: value" replies go through parse_text_analysis, one scan over the
+lines instead of a re.search per field. Both produce a CallAnalysis, so
+consumers read typed fields instead of re-parsing the text blob.
+
+Billable and Application Submitted are never defaulted: a reply that does
+not answer both raises AnalysisParseError, so the caller records a failed
+(uncached) analysis instead of a silent No.
+"""
+
+import re
+import json
+from dataclasses import dataclass, asdict
+from typing import Dict, Optional, Tuple
+
+
+class AnalysisParseError(ValueError):
+    pass
+
+
+@dataclass
+class CallAnalysis:
+    billable: bool
+    application_submitted: bool
+    billable_reason: Optional[str] = None
+    application_reason: Optional[str] = None
+    answered_by_agent: Optional[bool] = None
+    prospect_on_call: Optional[bool] = None
+    customer_name: Optional[str] = None
+    phone_number: Optional[str] = None
+    monthly_premium: Optional[float] = None
+    carrier: Optional[str] = None
+    address: Optional[str] = None
+    ssn: Optional[str] = None
+    bank_account_number: Optional[str] = None
+    bank_routing_number: Optional[str] = None
+    card_details: Optional[str] = None
+    agent_name: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        """camelCase keys, matching the rest of the worker's result payload."""
+        return {_camel(name): value for name, value in asdict(self).items()}
+
+    def to_text(self) -> str:
+        """Render in the legacy "Field: value" layout used by the report files."""
+        def yes_no(value):
+            return "Yes" if value else "No"
+
+        def shown(value):
+            return "Not Provided" if value in (None, "") else value
+
+        premium = f"${self.monthly_premium:.2f}" if self.monthly_premium is not None else None
+        lines = [
+            f"Billable: {yes_no(self.billable)}",
+            f"Reason (if Not Billable): {shown(self.billable_reason) if not self.billable else 'N/A'}",
+            f"Application Submitted: {yes_no(self.application_submitted)}",
+            f"Reason (if No): {shown(self.application_reason) if not self.application_submitted else 'N/A'}",
+            f"Customer Name: {shown(self.customer_name)}",
+            f"Phone Number: {shown(self.phone_number)}",
+            f"Monthly Premium: {shown(premium)}",
+            f"Carrier: {shown(self.carrier)}",
+            f"Address: {shown(self.address)}",
+            f"SSN: {shown(self.ssn)}",
+            f"Bank Account Number: {shown(self.bank_account_number)}",
+            f"Bank Routing Number: {shown(self.bank_routing_number)}",
+            f"Card Number, Exp Date, & 3 digit Code: {shown(self.card_details)}",
+            f"Agent Name: {shown(self.agent_name)}",
+        ]
+        return "\n".join(lines)
+
+
+def _camel(name: str) -> str:
+    head, *rest = name.split("_")
+    return head + "".join(part.title() for part in rest)
+
+
+# -----------------------------------------------------------------------------
+# JSON mode
+# -----------------------------------------------------------------------------
+# key -> (type, required); optional keys may be null or absent
+JSON_FIELDS = {
+    "billable": (bool, True),
+    "application_submitted": (bool, True),
+    "billable_reason": (str, False),
+    "application_reason": (str, False),
+    "answered_by_agent": (bool, False),
+    "prospect_on_call": (bool, False),
+    "customer_name": (str, False),
+    "phone_number": (str, False),
+    "monthly_premium": (float, False),
+    "carrier": (str, False),
+    "address": (str, False),
+    "ssn": (str, False),
+    "bank_account_number": (str, False),
+    "bank_routing_number": (str, False),
+    "card_details": (str, False),
+    "agent_name": (str, False),
+}
+
+_TYPE_NAMES = {bool: "true/false", str: "string", float: "number"}
+
+
+def json_instructions(batch: bool = False) -> str:
+    """Prompt block asking for the JSON object (or {"calls": [...]} when batched)."""
+    keys = ",\n".join(
+        f'  "{key}": {_TYPE_NAMES[kind]}{"" if required else " or null"}'
+        for key, (kind, required) in JSON_FIELDS.items()
+    )
+    if batch:
+        shape = (
+            'Respond with ONLY one JSON object of the form {"calls": [...]}, with one entry per call '
+            'in call order. Each entry has "call": <number> plus these keys:'
+        )
+    else:
+        shape = "Respond with ONLY one JSON object with exactly these keys:"
+    return f"""
+--- OUTPUT FORMAT (JSON) ---
+Ignore the "Field: value" output layout above. {shape}
+{{
+{keys}
+}}
+Use null for anything not provided in the call. monthly_premium is the amount in dollars as a number.
+Reasons are one short sentence, and null when the answer is Yes. No markdown, no text outside the JSON.
+""".strip()
+
+
+_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+_MONEY = re.compile(r"-?\d[\d,]*(?:\.\d+)?")
+_BOOLS = {"yes": True, "y": True, "true": True, "no": False, "n": False, "false": False}
+
+
+def _check(key: str, value, kind):
+    if value is None:
+        return None
+    if kind is bool:
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str) and value.strip().lower() in _BOOLS:
+            return _BOOLS[value.strip().lower()]
+    elif kind is float:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        if isinstance(value, str):
+            match = _MONEY.search(value)
+            if match:
+                return float(match.group(0).replace(",", ""))
+            if value.strip().lower() in ("", "not provided", "n/a"):
+                return None
+    elif isinstance(value, str):
+        value = value.strip()
+        return None if value.lower() in ("", "not provided", "n/a") else value
+    raise AnalysisParseError(f"{key}: expected {_TYPE_NAMES[kind]}, got {type(value).__name__}")
+
+
+def analysis_from_object(data) -> CallAnalysis:
+    if not isinstance(data, dict):
+        raise AnalysisParseError("expected a JSON object")
+    values = {}
+    for key, (kind, required) in JSON_FIELDS.items():
+        if key not in data or data[key] is None:
+            if required:
+                raise AnalysisParseError(f"missing required key {key}")
+            continue
+        values[key] = _check(key, data[key], kind)
+    return CallAnalysis(**values)
+
+
+def _decode(text: str):
+    try:
+        return json.loads(_FENCE.sub("", text or ""))
+    except ValueError as e:
+        raise AnalysisParseError(f"invalid JSON: {e}")
+
+
+def parse_json_analysis(text: str) -> CallAnalysis:
+    """Strict parse of a JSON-mode reply; raises AnalysisParseError."""
+    return analysis_from_object(_decode(text))
+
+
+def parse_json_batch(text: str, count: int) -> Dict[int, CallAnalysis]:
+    """{call_number: CallAnalysis} from a batched JSON reply; bad entries are dropped."""
+    try:
+        data = json.loads(_FENCE.sub("", text or ""))
+    except ValueError:
+        return {}
+    calls = data.get("calls") if isinstance(data, dict) else None
+    results = {}
+    for entry in calls if isinstance(calls, list) else []:
+        if not isinstance(entry, dict) or not isinstance(entry.get("call"), int):
+            continue
+        number = entry["call"]
+        if not 1 <= number <= count or number in results:
+            continue
+        try:
+            results[number] = analysis_from_object(entry)
+        except AnalysisParseError:
+            continue
+    return results
+
+
+# -----------------------------------------------------------------------------
+# Legacy "Field: value" mode
+# -----------------------------------------------------------------------------
+_YES_NO = re.compile(r"^(yes|no)\b", re.IGNORECASE)
+_LINE = re.compile(r"^[\s\-*#]*([A-Za-z][A-Za-z0-9 &,()/]*?)[\s*]*:[\s*]*(.*?)\s*$", re.MULTILINE)
+
+_TEXT_LABELS = {
+    "billable": "billable",
+    "reason (if not billable)": "billable_reason",
+    "application submitted": "application_submitted",
+    "reason (if no)": "application_reason",
+    "customer name": "customer_name",
+    "phone number": "phone_number",
+    "monthly premium": "monthly_premium",
+    "carrier": "carrier",
+    "address": "address",
+    "ssn": "ssn",
+    "bank account number": "bank_account_number",
+    "bank routing number": "bank_routing_number",
+    "card number, exp date, & 3 digit code": "card_details",
+    "agent name": "agent_name",
+}
+
+
+def parse_text_analysis(text: str) -> CallAnalysis:
+    """Parse the legacy line format; raises AnalysisParseError without both Yes/No answers."""
+    raw = {}
+    for match in _LINE.finditer(text or ""):
+        key = _TEXT_LABELS.get(match.group(1).strip().lower())
+        if key and key not in raw:
+            raw[key] = match.group(2).strip().strip("[]")
+
+    values = {}
+    for key, value in raw.items():
+        kind = JSON_FIELDS[key][0]
+        if kind is bool:
+            answer = _YES_NO.match(value)
+            if answer is None:
+                raise AnalysisParseError(f"{key}: expected Yes/No, got {value!r}")
+            values[key] = _check(key, answer.group(1), bool)
+        else:
+            try:
+                values[key] = _check(key, value, kind)
+            except AnalysisParseError:
+                values[key] = None
+    for key, (_, required) in JSON_FIELDS.items():
+        if required and key not in values:
+            raise AnalysisParseError(f"missing required field {key}")
+    return CallAnalysis(**values)
+
+
+def parse_analysis(text: str, response_format: str = "json") -> Tuple[CallAnalysis, str]:
+    """Parse a reply in the requested format; raises AnalysisParseError.
+
+    A JSON-mode reply that is not JSON at all falls back to the line format.
+    One that decodes but fails validation is an error, not a fallback.
+    Returns (analysis, format actually parsed).
+    """
+    if response_format == "json":
+        try:
+            data = _decode(text)
+        except AnalysisParseError:
+            pass
+        else:
+            return analysis_from_object(data), "json"
+    return parse_text_analysis(text), "text"
@@ -0,0 +1,66 @@
+"""In-memory audio fetching for the transcription workers.
+
+Recordings are streamed from HTTP into memory and decoded straight to the
+16 kHz mono float32 array Whisper consumes, so there is no temp file, no
+ffmpeg re-encode and no subprocess per job.
+"""
+
+import io
+import hashlib
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+import requests
+from faster_whisper.audio import decode_audio
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+CHUNK_SIZE = 64 * 1024
+
+
+def download_bytes(url: str, timeout: Optional[float] = None, headers: Optional[dict] = None,
+                   session=None) -> Tuple[io.BytesIO, str]:
+    """Download a recording into memory. Returns (buffer, sha256 of the content)."""
+    http = session or requests
+    buffer = io.BytesIO()
+    digest = hashlib.sha256()
+    with http.get(url, stream=True, timeout=timeout, headers=headers) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            if chunk:
+                buffer.write(chunk)
+                digest.update(chunk)
+    buffer.seek(0)
+    return buffer, digest.hexdigest()
+
+
+def decode_buffer(buffer: io.BytesIO, split_stereo: bool = False):
+    """Decode an in-memory recording to 16 kHz float32 samples.
+
+    Returns a mono array, or (left, right) with split_stereo (identical
+    channels for mono sources).
+    """
+    size_mb = buffer.getbuffer().nbytes / (1024 * 1024)
+    # PyAV decodes and resamples from the buffer in-process
+    audio = decode_audio(buffer, sampling_rate=SAMPLE_RATE, split_stereo=split_stereo)
+    samples = len(audio[0]) if split_stereo else len(audio)
+    logger.info(f"Decoded {size_mb:.1f} MB into {samples / SAMPLE_RATE:.1f}s of audio")
+    return audio
+
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a file on disk, for the temp-file download path."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fetch_audio(url: str, timeout: Optional[float] = None, headers: Optional[dict] = None,
+                session=None) -> np.ndarray:
+    """Download a recording and decode it to 16 kHz mono float32 samples."""
+    buffer, _ = download_bytes(url, timeout=timeout, headers=headers, session=session)
+    return decode_buffer(buffer)
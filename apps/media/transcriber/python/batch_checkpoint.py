@@ -0,0 +1,85 @@
+"""Resumable checkpoint for fe-bill batch runs.
+
+Every finished call is written to a local SQLite file (WAL mode) as soon
+as it completes, keyed by URL, with the full result as JSON. A restarted
+run skips URLs already recorded as "Success", so a crash late in a large
+backfill only repeats the calls that were in flight. Failed calls are
+recorded too but retried on the next run.
+"""
+
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DONE_STATUS = "Success"
+
+
+class BatchCheckpoint:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " url TEXT PRIMARY KEY,"
+            " call_number INTEGER NOT NULL,"
+            " status TEXT NOT NULL,"
+            " application_submitted INTEGER NOT NULL,"
+            " tokens_in INTEGER NOT NULL,"
+            " tokens_out INTEGER NOT NULL,"
+            " attempts INTEGER NOT NULL,"
+            " result TEXT NOT NULL,"
+            " updated REAL NOT NULL)"
+        )
+
+    def is_done(self, url: str) -> bool:
+        with self.lock:
+            row = self.db.execute("SELECT status FROM results WHERE url = ?", (url,)).fetchone()
+        return row is not None and row[0] == DONE_STATUS
+
+    def record(self, result: dict):
+        """Store one finished call (any status); a later attempt replaces an earlier one."""
+        with self.lock:
+            self.db.execute(
+                "INSERT INTO results (url, call_number, status, application_submitted, tokens_in, tokens_out,"
+                " attempts, result, updated) VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?)"
+                " ON CONFLICT(url) DO UPDATE SET call_number = excluded.call_number, status = excluded.status,"
+                " application_submitted = excluded.application_submitted, tokens_in = excluded.tokens_in,"
+                " tokens_out = excluded.tokens_out, attempts = results.attempts + 1,"
+                " result = excluded.result, updated = excluded.updated",
+                (
+                    result["url"], result["call_number"], result["status"],
+                    int(bool(result.get("application_submitted"))),
+                    result.get("tokens_in", 0), result.get("tokens_out", 0),
+                    json.dumps(result), time.time()
+                )
+            )
+
+    def summary(self) -> Dict[str, int]:
+        """Totals over everything recorded so far, across restarts."""
+        with self.lock:
+            done, app_yes, tokens_in, tokens_out = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(application_submitted), 0),"
+                " COALESCE(SUM(tokens_in), 0), COALESCE(SUM(tokens_out), 0)"
+                " FROM results WHERE status = ?", (DONE_STATUS,)
+            ).fetchone()
+            failed = self.db.execute("SELECT COUNT(*) FROM results WHERE status != ?", (DONE_STATUS,)).fetchone()[0]
+        return {"done": done, "app_yes": app_yes, "failed": failed, "tokens_in": tokens_in, "tokens_out": tokens_out}
+
+
+def open_checkpoint(path: str) -> Optional[BatchCheckpoint]:
+    """Open the checkpoint, or return None when disabled or unavailable."""
+    if not path:
+        return None
+    try:
+        return BatchCheckpoint(path)
+    except Exception as e:
+        logger.warning(f"Batch checkpoint disabled ({path}): {e}")
+        return None
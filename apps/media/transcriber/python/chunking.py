@@ -0,0 +1,113 @@
+"""Splitting long calls into overlapping chunks and stitching them back.
+
+Long enrollment calls are cut near the quietest point around every
+CHUNK_TARGET_SEC so each chunk can be transcribed by a different worker
+process. Neighbouring chunks overlap by CHUNK_OVERLAP_SEC so no word is lost
+at a cut; when stitching, each side keeps the segments reaching into its half
+of the overlap, and words repeated across the seam are dropped.
+"""
+
+import os
+import re
+from typing import List, Tuple
+
+import numpy as np
+
+from vad_trim import SAMPLE_RATE, frame_energy_db
+
+CHUNK_TARGET_SEC = float(os.getenv("CHUNK_TARGET_SEC", "180"))
+CHUNK_OVERLAP_SEC = float(os.getenv("CHUNK_OVERLAP_SEC", "2"))
+CHUNK_SEARCH_SEC = float(os.getenv("CHUNK_SEARCH_SEC", "15"))   # look this far either side for silence
+CHUNK_FRAME_MS = 100
+SEAM_MAX_WORDS = 12
+
+_WORD = re.compile(r"[^\w']+")
+
+
+def plan_chunks(audio: np.ndarray, sample_rate: int = SAMPLE_RATE,
+                target_sec: float = CHUNK_TARGET_SEC, overlap_sec: float = CHUNK_OVERLAP_SEC,
+                search_sec: float = CHUNK_SEARCH_SEC) -> List[Tuple[int, int]]:
+    """(start, end) sample ranges covering `audio`, cut at low-energy points."""
+    total = len(audio)
+    if total <= target_sec * sample_rate * 1.5:
+        return [(0, total)]
+
+    frame = sample_rate * CHUNK_FRAME_MS // 1000
+    energy = frame_energy_db(audio, frame)
+    half_overlap = int(overlap_sec * sample_rate / 2)
+
+    cuts = []
+    position = 0
+    while total - position > target_sec * sample_rate * 1.5:
+        target = position + int(target_sec * sample_rate)
+        low = max(position + half_overlap, target - int(search_sec * sample_rate)) // frame
+        high = min(total - half_overlap, target + int(search_sec * sample_rate)) // frame
+        window = energy[low:high]
+        cut = (low + int(np.argmin(window))) * frame if window.size else target
+        cuts.append(cut)
+        position = cut
+
+    bounds = [0] + cuts + [total]
+    return [
+        (max(0, start - half_overlap) if index else 0, min(total, end + half_overlap))
+        for index, (start, end) in enumerate(zip(bounds, bounds[1:]))
+    ]
+
+
+def _words(text: str) -> List[str]:
+    return [word for word in _WORD.split(text.lower()) if word]
+
+
+def _drop_repeated_prefix(previous: str, text: str) -> str:
+    """Remove words at the start of `text` that repeat the end of `previous`."""
+    prev_words = _words(previous)
+    raw_words = text.split()
+    norm_words = [" ".join(_words(word)) for word in raw_words]
+    for size in range(min(SEAM_MAX_WORDS, len(prev_words), len(raw_words)), 0, -1):
+        if prev_words[-size:] == norm_words[:size]:
+            return " ".join(raw_words[size:])
+    return text
+
+
+def stitch_segments(chunks: List[Tuple[int, int, List[dict]]],
+                    sample_rate: int = SAMPLE_RATE) -> List[dict]:
+    """Merge per-chunk segments into one ordered list.
+
+    `chunks` holds (start_sample, end_sample, segments) in order, with
+    segment times already absolute. Each chunk keeps the segments that reach
+    into its half of the overlap, so a segment straddling the middle is kept
+    by both sides however each one split it. The next chunk's segments that
+    start inside the overlap are joined and the words repeated from the
+    previous chunk dropped.
+    """
+    stitched = []
+    for index, (start, end, segments) in enumerate(chunks):
+        lower = (start + chunks[index - 1][1]) / 2 / sample_rate if index else float("-inf")
+        upper = (chunks[index + 1][0] + end) / 2 / sample_rate if index + 1 < len(chunks) else float("inf")
+        kept = [segment for segment in sorted(segments, key=lambda s: s["start"])
+                if segment["start"] < upper and segment["end"] > lower]
+        if stitched:
+            overlap_start, overlap_end = start / sample_rate, chunks[index - 1][1] / sample_rate
+            head = [segment for segment in kept if segment["start"] < overlap_end]
+            if head:
+                kept = [_stitch_seam(stitched, head, overlap_start)] + kept[len(head):]
+        stitched.extend(segment for segment in kept if segment["text"])
+    return stitched
+
+
+def _stitch_seam(stitched: List[dict], head: List[dict], overlap_start: float) -> dict:
+    """Join `head` into one segment without the words `stitched` already ends with."""
+    tail = [segment for segment in stitched if segment["end"] > overlap_start] or stitched[-1:]
+    text = _drop_repeated_prefix(" ".join(segment["text"] for segment in tail),
+                                 " ".join(segment["text"] for segment in head))
+    return dict(head[0], start=max(head[0]["start"], stitched[-1]["end"]),
+                end=max(head[-1]["end"], stitched[-1]["end"]), text=text)
+
+
+def encode_pcm(audio: np.ndarray) -> bytes:
+    """float32 samples -> little-endian int16 PCM (half the bytes on the wire)."""
+    return (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+
+def decode_pcm(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype="<i2").astype(np.float32) / 32767
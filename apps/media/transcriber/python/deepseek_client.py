@@ -0,0 +1,235 @@
+"""Shared DeepSeek chat-completions client.
+
+Used by the Redis worker and fe-bill.py so every analysis goes through:
+- one keep-alive connection pool (no TLS handshake per call),
+- a concurrency cap shared by every thread,
+- jittered exponential backoff on 429/5xx and connection errors, honouring
+  Retry-After, within an overall per-call deadline (read timeouts are not
+  retried: the server may still be working on a request we gave up on),
+- an optional per-minute token budget shared by all callers in the process.
+
+The endpoint is a plain constructor argument, so the client can be pointed
+at a local mock HTTP server.
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from typing import List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+DEEPSEEK_MAX_CONCURRENCY = int(os.getenv("DEEPSEEK_MAX_CONCURRENCY", "4"))
+DEEPSEEK_MAX_RETRIES = int(os.getenv("DEEPSEEK_MAX_RETRIES", "4"))
+DEEPSEEK_BACKOFF_BASE = float(os.getenv("DEEPSEEK_BACKOFF_BASE", "1.0"))
+DEEPSEEK_BACKOFF_MAX = float(os.getenv("DEEPSEEK_BACKOFF_MAX", "30"))
+# Wall-clock cap for one complete() call, retries and backoff included
+DEEPSEEK_DEADLINE_SEC = float(os.getenv("DEEPSEEK_DEADLINE_SEC", "180"))
+DEEPSEEK_TOKENS_PER_MINUTE = int(os.getenv("DEEPSEEK_TOKENS_PER_MINUTE", "0"))  # 0 = unlimited
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CHARS_PER_TOKEN = 4
+
+
+class RetryableError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBudget:
+    """Token bucket refilled at tokens_per_minute / 60 per second."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = tokens_per_minute
+        self.tokens = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, tokens: int) -> float:
+        """Take tokens if available and return 0, else return seconds to wait."""
+        if self.capacity <= 0:
+            return 0.0
+        # A single request larger than the whole budget waits for a full bucket
+        tokens = min(tokens, self.capacity)
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens: int) -> float:
+        waited = 0.0
+        while True:
+            delay = self.reserve(tokens)
+            if delay <= 0:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    def reconcile(self, estimated: int, actual: int):
+        """Give back (or charge) the difference once the real usage is known."""
+        if self.capacity <= 0:
+            return
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + estimated - actual)
+
+
+class DeepSeekClient:
+    def __init__(self, api_key: str, endpoint: str, model: str = "deepseek-chat",
+                 timeout: float = 90, max_concurrency: int = DEEPSEEK_MAX_CONCURRENCY,
+                 max_retries: int = DEEPSEEK_MAX_RETRIES, backoff_base: float = DEEPSEEK_BACKOFF_BASE,
+                 backoff_max: float = DEEPSEEK_BACKOFF_MAX,
+                 tokens_per_minute: int = DEEPSEEK_TOKENS_PER_MINUTE,
+                 deadline: float = DEEPSEEK_DEADLINE_SEC):
+        self.api_key = api_key
+        self.endpoint = endpoint
+        self.model = model
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.budget = TokenBudget(tokens_per_minute)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        })
+
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.stats_lock = threading.Lock()
+        self.counters = {
+            "requests": 0,
+            "retries": 0,
+            "failures": 0,
+            "promptTokens": 0,
+            "completionTokens": 0,
+            "budgetWaitSec": 0.0
+        }
+
+    # -------------------------------------------------------------------------
+    # Helpers
+    # -------------------------------------------------------------------------
+    def _payload(self, messages: List[dict], max_tokens: int, temperature: float, extra: dict) -> dict:
+        payload = {
+            "messages": messages,
+            "model": self.model,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+            "stream": False
+        }
+        payload.update(extra)
+        return payload
+
+    def estimate_tokens(self, messages: List[dict], max_tokens: int) -> int:
+        chars = sum(len(m.get("content") or "") for m in messages)
+        return chars // CHARS_PER_TOKEN + max_tokens
+
+    def _post_once(self, payload: dict, timeout: float) -> dict:
+        try:
+            resp = self.session.post(self.endpoint, json=payload, timeout=timeout)
+        except requests.ReadTimeout:
+            raise  # not retried; see the module docstring
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise RetryableError(str(e))
+        if resp.status_code in RETRY_STATUSES:
+            retry_after = None
+            try:
+                retry_after = float(resp.headers.get("Retry-After", ""))
+            except ValueError:
+                pass
+            raise RetryableError(f"HTTP {resp.status_code}", retry_after)
+        resp.raise_for_status()
+        return resp.json()
+
+    def _backoff(self, attempt: int, error: RetryableError) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        delay = random.uniform(0, delay)  # full jitter
+        if error.retry_after is not None:
+            delay = max(delay, error.retry_after)
+        return delay
+
+    def _record(self, result: dict, estimated: int):
+        usage = result.get("usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        if usage:
+            self.budget.reconcile(estimated, prompt_tokens + completion_tokens)
+        with self.stats_lock:
+            self.counters["promptTokens"] += prompt_tokens
+            self.counters["completionTokens"] += completion_tokens
+
+    def _count(self, name: str, value=1):
+        with self.stats_lock:
+            self.counters[name] += value
+
+    # -------------------------------------------------------------------------
+    # Public API
+    # -------------------------------------------------------------------------
+    def complete(self, messages: List[dict], max_tokens: int = 1024, temperature: float = 0.1,
+                 **extra) -> dict:
+        """Blocking chat completion. Returns the decoded JSON response.
+
+        Gives up (raising the last error) once `deadline` seconds have passed
+        since the call started; each attempt's HTTP timeout is shortened to
+        what is left of it.
+        """
+        payload = self._payload(messages, max_tokens, temperature, extra)
+        estimated = self.estimate_tokens(messages, max_tokens)
+        self._count("budgetWaitSec", self.budget.acquire(estimated))
+        deadline = time.monotonic() + self.deadline if self.deadline > 0 else None
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.semaphore:
+                    timeout = self.timeout
+                    if deadline is not None:
+                        timeout = min(timeout, deadline - time.monotonic())
+                        if timeout <= 0:
+                            raise requests.Timeout(f"DeepSeek deadline of {self.deadline:.0f}s passed")
+                    self._count("requests")
+                    result = self._post_once(payload, timeout)
+                self._record(result, estimated)
+                return result
+            except RetryableError as e:
+                delay = self._backoff(attempt, e)
+                out_of_time = deadline is not None and time.monotonic() + delay >= deadline
+                if attempt >= self.max_retries or out_of_time:
+                    self._count("failures")
+                    raise
+                logger.warning(f"DeepSeek {e}; retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+                self._count("retries")
+                time.sleep(delay)
+            except requests.Timeout:
+                self._count("failures")
+                raise
+
+    @staticmethod
+    def content(result: dict) -> str:
+        """Text of the first choice, or "" when the response has none."""
+        if "choices" in result and result["choices"]:
+            return (result["choices"][0]["message"]["content"] or "").strip()
+        return ""
+
+    def stats(self) -> dict:
+        with self.stats_lock:
+            return dict(self.counters)
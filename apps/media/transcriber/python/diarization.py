@@ -0,0 +1,257 @@
+"""Cheap speaker diarization for call recordings.
+
+Dual-channel recordings (agent and prospect on separate legs) are split by
+channel: each 100 ms frame goes to the louder active channel. Mono
+recordings fall back to clustering short log-mel windows into two speakers
+with cosine k-means, all in NumPy on the CPU.
+
+diarize() only needs the audio, so it runs alongside Whisper; once the
+transcript exists, label_segments() gives each segment the speaker that
+overlaps it most and maps speakers to "agent" / "prospect".
+"""
+
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from vad_trim import SAMPLE_RATE, frame_energy_db, speech_regions
+
+DIARIZE_AGENT_CHANNEL = os.getenv("DIARIZE_AGENT_CHANNEL", "auto")  # left / right / auto
+DIARIZE_WINDOW_SEC = float(os.getenv("DIARIZE_WINDOW_SEC", "1.5"))
+# Two clusters count as two voices only if their centroids are this many
+# within-cluster spreads apart; otherwise the call is one voice (voicemail, IVR)
+DIARIZE_MIN_SEPARATION = float(os.getenv("DIARIZE_MIN_SEPARATION", "2.5"))
+STEREO_MIN_DIFFERENCE = 0.05
+FRAME_MS = 100
+N_FFT = 400
+HOP = 160
+N_MELS = 40
+
+# Phrases an insurance agent says far more often than the prospect
+AGENT_CUES = re.compile(
+    r"(my name is|this is \w+ (with|from)|licensed|agent|insurance|coverage|carrier|premium|policy"
+    r"|beneficiary|date of birth|social security|routing|checking account|approved|final expense)"
+)
+
+Turn = Tuple[float, float, str]
+
+
+# -----------------------------------------------------------------------------
+# Channel separation
+# -----------------------------------------------------------------------------
+def is_stereo(left: np.ndarray, right: Optional[np.ndarray]) -> bool:
+    """True when the two channels carry different signals (not a mono file upmixed)."""
+    if right is None or len(left) != len(right) or len(left) == 0:
+        return False
+    power = np.mean(np.square(left, dtype=np.float32)) + np.mean(np.square(right, dtype=np.float32))
+    if power <= 0:
+        return False
+    difference = np.mean(np.square(left - right, dtype=np.float32))
+    return difference / (power / 2) > STEREO_MIN_DIFFERENCE
+
+
+def _merge_turns(labels: List[Optional[str]], step_sec: float) -> List[Turn]:
+    turns = []
+    for index, label in enumerate(labels):
+        if label is None:
+            continue
+        start, end = index * step_sec, (index + 1) * step_sec
+        if turns and turns[-1][2] == label and start - turns[-1][1] < 1e-6:
+            turns[-1] = (turns[-1][0], end, label)
+        else:
+            turns.append((start, end, label))
+    return turns
+
+
+def channel_turns(left: np.ndarray, right: np.ndarray, sample_rate: int = SAMPLE_RATE) -> List[Turn]:
+    frame = sample_rate * FRAME_MS // 1000
+    energies = [frame_energy_db(channel, frame) for channel in (left, right)]
+    active = [energy > max(np.percentile(energy, 10) + 12, -50) for energy in energies]
+    louder = energies[0] >= energies[1]
+    labels = [
+        ("left" if loud else "right") if (a or b) else None
+        for loud, a, b in zip(louder, active[0], active[1])
+    ]
+    return _merge_turns(labels, FRAME_MS / 1000)
+
+
+# -----------------------------------------------------------------------------
+# Mono fallback: log-mel window embeddings + 2-way cosine k-means
+# -----------------------------------------------------------------------------
+def _mel_filterbank(sample_rate: int) -> np.ndarray:
+    def hz_to_mel(hz):
+        return 2595 * np.log10(1 + hz / 700)
+
+    def mel_to_hz(mel):
+        return 700 * (10 ** (mel / 2595) - 1)
+
+    mels = np.linspace(hz_to_mel(60), hz_to_mel(sample_rate / 2 - 200), N_MELS + 2)
+    bins = np.floor((N_FFT + 1) * mel_to_hz(mels) / sample_rate).astype(int)
+    bank = np.zeros((N_MELS, N_FFT // 2 + 1), dtype=np.float32)
+    for m in range(1, N_MELS + 1):
+        low, center, high = bins[m - 1], bins[m], bins[m + 1]
+        if center > low:
+            bank[m - 1, low:center] = (np.arange(low, center) - low) / (center - low)
+        if high > center:
+            bank[m - 1, center:high] = (high - np.arange(center, high)) / (high - center)
+    return bank
+
+
+def log_mel(audio: np.ndarray, sample_rate: int = SAMPLE_RATE, block_frames: int = 6000) -> np.ndarray:
+    """(frames, N_MELS) log-mel energies, computed in blocks to bound memory."""
+    if len(audio) < N_FFT:
+        return np.empty((0, N_MELS), dtype=np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(audio, N_FFT)[::HOP]
+    window = np.hanning(N_FFT).astype(np.float32)
+    bank = _mel_filterbank(sample_rate)
+    out = np.empty((len(frames), N_MELS), dtype=np.float32)
+    for start in range(0, len(frames), block_frames):
+        block = frames[start:start + block_frames] * window
+        power = np.abs(np.fft.rfft(block, axis=1)) ** 2
+        out[start:start + block_frames] = np.log(power @ bank.T + 1e-8)
+    return out
+
+
+def _kmeans2(x: np.ndarray, iterations: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+    """Cosine k-means with k=2, seeded with the two most distant points from the mean."""
+    first = int(np.argmin(x @ x.mean(axis=0)))
+    second = int(np.argmin(x @ x[first]))
+    centroids = x[[first, second]]
+    for _ in range(iterations):
+        assign = np.argmax(x @ centroids.T, axis=1)
+        for k in range(2):
+            members = x[assign == k]
+            if len(members):
+                centroid = members.mean(axis=0)
+                centroids[k] = centroid / (np.linalg.norm(centroid) + 1e-8)
+    return assign, centroids
+
+
+def _separation(x: np.ndarray, assign: np.ndarray) -> float:
+    """Distance between the two cluster means relative to the mean within-cluster spread."""
+    if assign.min() == assign.max():
+        return 0.0
+    means = np.stack([x[assign == k].mean(axis=0) for k in range(2)])
+    within = np.linalg.norm(x - means[assign], axis=1).mean()
+    return float(np.linalg.norm(means[0] - means[1]) / (within + 1e-8))
+
+
+def cluster_turns(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> List[Turn]:
+    features = log_mel(audio, sample_rate)
+    if len(features) == 0:
+        return []
+    # Only loud frames describe a voice; pauses inside a window would otherwise
+    # dominate its average and cluster "has a gap" against "no gap"
+    loudness = features.max(axis=1)
+    voiced = loudness > np.percentile(loudness, 30)
+    if not voiced.any():
+        return []
+    features -= features.mean(axis=1, keepdims=True)  # spectral shape only, not loudness
+    features -= features[voiced].mean(axis=0)          # cepstral-style mean normalization per call
+
+    frames_per_window = int(DIARIZE_WINDOW_SEC * sample_rate / HOP)
+    step = frames_per_window // 2
+    starts, embeddings = [], []
+    for region_start, region_end in speech_regions(audio, sample_rate):
+        first, last = region_start // HOP, max(region_start // HOP + 1, region_end // HOP - frames_per_window + 1)
+        for start in range(first, last, step):
+            window = features[start:start + frames_per_window][voiced[start:start + frames_per_window]]
+            if len(window) < frames_per_window // 3:
+                continue
+            embeddings.append(window.mean(axis=0))
+            # Each window speaks for the middle half-step around its center
+            starts.append((start + (frames_per_window - step) / 2) * HOP / sample_rate)
+    if not embeddings:
+        return []
+
+    x = np.stack(embeddings)
+    assign = np.zeros(len(x), dtype=int)
+    if len(x) >= 4:
+        split, _ = _kmeans2(x / (np.linalg.norm(x, axis=1, keepdims=True) + 1e-8))
+        if _separation(x, split) >= DIARIZE_MIN_SEPARATION:
+            assign = split
+
+    # Name speakers in order of first appearance
+    names = {}
+    turns = []
+    step_sec = step * HOP / sample_rate
+    for start, cluster in zip(starts, assign):
+        label = names.setdefault(int(cluster), f"speaker_{len(names)}")
+        end = start + step_sec
+        if turns and turns[-1][2] == label and start - turns[-1][1] < step_sec:
+            turns[-1] = (turns[-1][0], end, label)
+        else:
+            turns.append((start, end, label))
+    return turns
+
+
+# -----------------------------------------------------------------------------
+# Public API
+# -----------------------------------------------------------------------------
+def diarize(left: np.ndarray, right: Optional[np.ndarray] = None,
+            sample_rate: int = SAMPLE_RATE) -> Dict:
+    """Speaker turns for a recording on its original timeline."""
+    if is_stereo(left, right):
+        return {'method': 'channel', 'turns': channel_turns(left, right, sample_rate)}
+    return {'method': 'cluster', 'turns': cluster_turns(left, sample_rate)}
+
+
+def _overlap_speaker(start: float, end: float, turns: List[Turn], starts: List[float]) -> Optional[str]:
+    index = max(0, int(np.searchsorted(starts, start, side='right')) - 1)
+    totals = {}
+    while index < len(turns) and turns[index][0] < end:
+        overlap = min(end, turns[index][1]) - max(start, turns[index][0])
+        if overlap > 0:
+            totals[turns[index][2]] = totals.get(turns[index][2], 0.0) + overlap
+        index += 1
+    return max(totals, key=totals.get) if totals else None
+
+
+def _roles(segments: List[dict], method: str) -> Dict[str, str]:
+    """Map raw labels to agent / prospect; unknown mappings keep the raw label."""
+    labels = {segment['speaker'] for segment in segments if segment['speaker']}
+    if method == 'channel' and DIARIZE_AGENT_CHANNEL in ('left', 'right'):
+        other = 'right' if DIARIZE_AGENT_CHANNEL == 'left' else 'left'
+        return {DIARIZE_AGENT_CHANNEL: 'agent', other: 'prospect'}
+    if len(labels) != 2:
+        return {}
+    scores = {}
+    for label in labels:
+        text = " ".join(s['text'].lower() for s in segments if s['speaker'] == label)
+        scores[label] = len(AGENT_CUES.findall(text)) / max(1, len(text.split()))
+    agent = max(scores, key=scores.get)
+    return {label: ('agent' if label == agent else 'prospect') for label in labels}
+
+
+def label_segments(segments: List[dict], diarization: Dict) -> List[dict]:
+    """Fill segment['speaker'] in place from diarize() output; returns the list."""
+    turns = diarization.get('turns') or []
+    starts = [turn[0] for turn in turns]
+    for segment in segments:
+        segment['speaker'] = _overlap_speaker(segment['start'], segment['end'], turns, starts) if turns else None
+    roles = _roles(segments, diarization.get('method'))
+    for segment in segments:
+        if segment['speaker'] in roles:
+            segment['speaker'] = roles[segment['speaker']]
+    return segments
+
+
+def speaker_transcript(segments: List[dict], only: Optional[str] = None) -> str:
+    """'Agent: ...' / 'Prospect: ...' lines, merging consecutive turns.
+
+    With `only`, keep just that speaker's turns (e.g. "prospect").
+    """
+    lines = []
+    last = None
+    for segment in segments:
+        speaker = segment.get('speaker')
+        if not segment['text'] or (only and speaker != only):
+            continue
+        if speaker == last and lines:
+            lines[-1] += " " + segment['text']
+        else:
+            lines.append(f"{(speaker or 'unknown').replace('_', ' ').title()}: {segment['text']}")
+        last = speaker
+    return "\n".join(lines)
@@ -0,0 +1,84 @@
+"""Cheap local pre-classifier for transcripts.
+
+Dead air and voicemail greetings are not billable, and sending them to
+DeepSeek costs a full LLM round trip. Like the keyword matching in
+ai_check.py's `analyze`, this runs a few phrase checks and returns a
+deterministic result only when the answer is obvious. Otherwise it returns
+None ("unknown") and the caller uses the LLM.
+
+Voicemail needs either one recording-machine phrase ("after the beep",
+"record your message", a carrier intercept) or two of the softer
+greeting phrases ("leave a message", "not available right now"). A live
+prospect can say any single soft phrase. Short calls are not judged by
+length alone: a 15-word "yes, go ahead, my bank is..." is still a call
+for the LLM to judge.
+"""
+
+import os
+import re
+from typing import Optional
+
+from analysis_schema import CallAnalysis
+
+PRECLASSIFY_VOICEMAIL_MAX_WORDS = int(os.getenv("PRECLASSIFY_VOICEMAIL_MAX_WORDS", "80"))
+
+# Phrases only a recording machine or a carrier intercept says
+VOICEMAIL_MACHINE = re.compile(
+    r"\b((leave|record) (me |us )?(a |your )?(brief |detailed )?message (after|at) the (tone|beep)"
+    r"|(after|at) the (tone|beep),? (please )?(leave|record)"
+    r"|when you (have|are) finished recording|press pound (when|for more options)|hang up or press"
+    r"|(forwarded|transferred) to (an automated voice messag\w+ system|(a |the )?voice ?mail)"
+    r"|voice ?mail ?box (of|for|belonging to|is full|has not been set up)|(the )?mailbox is full"
+    r"|the (number|party|person) you (have dialed|are trying to reach|called)"
+    r" (is not in service|has been disconnected|is no longer in service|is not available)"
+    r"|has been disconnected or is no longer in service)\b"
+)
+
+# Greeting phrases a live person may also say; two different ones are needed
+VOICEMAIL_GREETING = re.compile(
+    r"\b(?:(?P<leave>(please )?leave (me |us )?(a |your )?(name and number|(brief |detailed )?message))"
+    r"|(?P<unavailable>(i'?m|i am|we'?re|we are|is|are) (not |un)available (right now|at the moment|to take your call))"
+    r"|(?P<phone>can'?t (come to|get to|take) (the phone|your call))"
+    r"|(?P<callback>(i|we)('ll| will) (call|get back to) you (back )?as soon as)"
+    r"|(?P<reached>you'?ve reached (the )?(voice ?mail|phone) of))\b"
+)
+
+
+def _result(reason: str, words: int) -> dict:
+    analysis = CallAnalysis(billable=False, application_submitted=False,
+                            billable_reason=reason, application_reason=reason)
+    text = (
+        f"Billable: No\n"
+        f"Reason (if Not Billable): {reason}\n"
+        f"Application Submitted: No\n"
+        f"Reason (if No): {reason}"
+    )
+    return {
+        "text": text,
+        "applicationSubmitted": False,
+        "billable": False,
+        "fields": analysis.to_dict(),
+        "source": "local",
+        "reason": reason,
+        "numWords": words
+    }
+
+
+def preclassify(transcript: str) -> Optional[dict]:
+    """Return a local analysis for obviously non-billable transcripts, else None."""
+    text = (transcript or "").lower()
+    words = len(text.split())
+
+    if words == 0:
+        return _result("Dead air: no speech detected", words)
+    if words <= PRECLASSIFY_VOICEMAIL_MAX_WORDS and is_voicemail(text):
+        return _result("Voicemail or carrier message, no live prospect", words)
+    return None
+
+
+def is_voicemail(text: str) -> bool:
+    """One machine phrase, or two different greeting phrases, in lowercased text."""
+    if VOICEMAIL_MACHINE.search(text):
+        return True
+    kinds = {match.lastgroup for match in VOICEMAIL_GREETING.finditer(text)}
+    return len(kinds) >= 2
@@ -0,0 +1,132 @@
+"""Transcript compaction for the analysis prompts.
+
+The billing and application questions only depend on a few kinds of
+passages: age / date of birth, living situation, SSN, bank or card
+collection, Do-Not-Call requests, profanity and the application itself.
+For long calls we index the segments with keyword regexes, keep every hit
+plus a little context and the opening of the call (who answered), and
+replace the rest with "[... omitted ...]" markers. Short transcripts, calls
+with no hits, or compactions that would not save enough fall back to the
+full transcript.
+"""
+
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+COMPACT_ENABLED = os.getenv("COMPACT_ENABLED", "true").lower() == "true"
+COMPACT_MIN_WORDS = int(os.getenv("COMPACT_MIN_WORDS", "800"))
+COMPACT_CONTEXT = int(os.getenv("COMPACT_CONTEXT", "2"))            # segments kept around each hit
+COMPACT_HEAD_SEGMENTS = int(os.getenv("COMPACT_HEAD_SEGMENTS", "8"))  # opening of the call, always kept
+COMPACT_MAX_KEEP_RATIO = float(os.getenv("COMPACT_MAX_KEEP_RATIO", "0.7"))
+
+# Each category targets what an analysis field is decided on, not the topic in
+# general: sales talk about coverage, policies, prices and dates runs through
+# the whole call, so words like "policy", "a month", "bank" or a month name
+# would keep nearly every line. Answers are caught as context of the question
+# ("what's your date of birth?" -> the date two segments later).
+CATEGORY_PATTERNS = {
+    "age_dob": r"\b(\d{2,3} years? old|years of age|how old|my age|date of birth|birth ?date|birthday|born (in|on))\b",
+    "residence": r"\b(nursing home|assisted living|care facility|power of attorney|poa|guardian)\b",
+    "ssn": r"\b(social security|ssn|last four|first five|\d{3}[- ]?\d{2}[- ]?\d{4})\b",
+    "bank_card": (
+        r"\b(bank account|checking account|savings account|routing|account number|name of (your|the) bank"
+        r"|credit card|debit card|card number|visa|master ?card|american express|discover card"
+        r"|expiration|cvv|security code|direct express)\b"
+    ),
+    "dnc": (
+        r"\b(do not call|don'?t call|stop calling|quit calling|take me off|remove (me|my number)"
+        r"|calling list|how did you get my number)\b"
+    ),
+    "profanity": r"\b(fuck\w*|shit\w*|bitch\w*|asshole|bastard|piss off|cunt)\b",
+    "application": (
+        r"\b(application|submit(ted|ting)?|approved|beneficiary|effective date|draft date|monthly premium"
+        r"|premium (is|will be|would be)|my name is|(mailing|street) address|zip code|phone number is)\b"
+    ),
+}
+
+COMPACT_CATEGORIES = [
+    name.strip() for name in os.getenv("COMPACT_CATEGORIES", ",".join(CATEGORY_PATTERNS)).split(",")
+    if name.strip() in CATEGORY_PATTERNS
+]
+_COMPILED = {name: re.compile(CATEGORY_PATTERNS[name], re.IGNORECASE) for name in COMPACT_CATEGORIES}
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+
+def _format_time(seconds: float) -> str:
+    seconds = int(seconds or 0)
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+def _format_segment(segment: dict, with_speakers: bool) -> str:
+    text = segment["text"]
+    if with_speakers:
+        speaker = (segment.get("speaker") or "unknown").replace("_", " ").title()
+        text = f"{speaker}: {text}"
+    if segment.get("start") is not None:
+        text = f"[{_format_time(segment['start'])}] {text}"
+    return text
+
+
+def compact_segments(segments: List[dict], with_speakers: bool = False) -> Tuple[Optional[str], Dict]:
+    """Return (compacted prompt text, info), or (None, info) to use the full transcript.
+
+    info always reports the word counts, so callers can log the savings.
+    """
+    total_words = sum(len(segment["text"].split()) for segment in segments)
+    info = {"compacted": False, "totalSegments": len(segments), "totalWords": total_words}
+    if not COMPACT_ENABLED or not _COMPILED:
+        info["reason"] = "disabled"
+        return None, info
+    if total_words < COMPACT_MIN_WORDS:
+        info["reason"] = "short"
+        return None, info
+
+    keep = set(range(min(COMPACT_HEAD_SEGMENTS, len(segments))))
+    matched = set()
+    for index, segment in enumerate(segments):
+        for name, pattern in _COMPILED.items():
+            if pattern.search(segment["text"]):
+                matched.add(name)
+                keep.update(range(max(0, index - COMPACT_CONTEXT), min(len(segments), index + COMPACT_CONTEXT + 1)))
+    if not matched:
+        info["reason"] = "no matches"
+        return None, info
+
+    kept_words = sum(len(segments[index]["text"].split()) for index in keep)
+    info.update(keptSegments=len(keep), keptWords=kept_words, categories=sorted(matched))
+    if kept_words > total_words * COMPACT_MAX_KEEP_RATIO:
+        info["reason"] = "low savings"
+        return None, info
+
+    duration = segments[-1].get("end")
+    header = (
+        f"NOTE: This long call was compacted to the passages relevant to the criteria "
+        f"(matched: {', '.join(sorted(matched))}), plus the opening of the call. "
+        f"Omitted passages matched none of the age, living situation, SSN, bank/card, "
+        f"Do-Not-Call, profanity or application keywords."
+    )
+    if duration:
+        header += f" Call length: {_format_time(duration)}."
+
+    lines = [header]
+    skipped = 0
+    for index, segment in enumerate(segments):
+        if index not in keep:
+            skipped += 1
+            continue
+        if skipped:
+            lines.append(f"[... {skipped} segments omitted ...]")
+            skipped = 0
+        lines.append(_format_segment(segment, with_speakers))
+    if skipped:
+        lines.append(f"[... {skipped} segments omitted ...]")
+
+    info["compacted"] = True
+    return "\n".join(lines), info
+
+
+def compact_text(transcript: str) -> Tuple[Optional[str], Dict]:
+    """compact_segments for a plain transcript, using sentences as segments."""
+    segments = [{"text": sentence} for sentence in _SENTENCE.split(transcript or "") if sentence.strip()]
+    return compact_segments(segments)
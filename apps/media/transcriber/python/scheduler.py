@@ -0,0 +1,128 @@
+"""Priority lanes and per-tenant fair queuing for transcription jobs.
+
+Jobs are read from one stream per lane (realtime post-call analysis vs.
+bulk backfill) into small local queues, and the worker asks the scheduler
+which job to start next:
+
+- lanes are picked by smooth weighted round robin (e.g. realtime:8,
+  backfill:1), and each lane may be capped to a share of the pipeline so
+  long backfill calls can never occupy every slot;
+- inside a lane, tenants are served by start-time fair queuing (each pop
+  advances the tenant's virtual time by 1/weight), so one tenant's
+  backlog cannot starve the others;
+- tenants at their in-flight cap are skipped until a job finishes.
+"""
+
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+
+def parse_weights(spec: str, default: float = 1.0) -> Dict[str, float]:
+    """Parse "name:weight,name:weight" into a dict."""
+    weights = {}
+    for part in (spec or "").split(","):
+        if not part.strip():
+            continue
+        name, _, value = part.partition(":")
+        weights[name.strip()] = float(value) if value.strip() else default
+    return weights
+
+
+class _Lane:
+    def __init__(self, name: str, weight: float, max_inflight: int):
+        self.name = name
+        self.weight = weight
+        self.max_inflight = max_inflight
+        self.current = 0.0           # smooth WRR credit
+        self.inflight = 0
+        self.clock = 0.0             # virtual time of the last served tenant
+        self.queues = {}             # tenant -> deque of items
+        self.vtime = {}              # tenant -> virtual start time
+        self.size = 0
+
+
+class FairScheduler:
+    def __init__(self, lanes: List[Tuple[str, float, int]], tenant_max_inflight: int = 0,
+                 tenant_weights: Optional[Dict[str, float]] = None):
+        """lanes: (name, weight, max_inflight) in priority order; 0 = no cap."""
+        self.lanes = {name: _Lane(name, weight, cap) for name, weight, cap in lanes}
+        self.tenant_max_inflight = tenant_max_inflight
+        self.tenant_weights = tenant_weights or {}
+        self.tenant_inflight = {}
+        self.lock = threading.Lock()
+
+    def push(self, lane_name: str, tenant: str, item):
+        with self.lock:
+            lane = self.lanes[lane_name]
+            queue = lane.queues.get(tenant)
+            if queue is None:
+                queue = lane.queues[tenant] = deque()
+            if not queue:
+                # A tenant returning from idle starts at the lane's clock, not in the past
+                lane.vtime[tenant] = max(lane.vtime.get(tenant, 0.0), lane.clock)
+            queue.append(item)
+            lane.size += 1
+
+    def queued(self, lane_name: str) -> int:
+        with self.lock:
+            return self.lanes[lane_name].size
+
+    def __len__(self) -> int:
+        with self.lock:
+            return sum(lane.size for lane in self.lanes.values())
+
+    def _tenant_ok(self, tenant: str) -> bool:
+        return not self.tenant_max_inflight or self.tenant_inflight.get(tenant, 0) < self.tenant_max_inflight
+
+    def _eligible_tenant(self, lane: _Lane) -> Optional[str]:
+        if lane.max_inflight and lane.inflight >= lane.max_inflight:
+            return None
+        best, best_vtime = None, None
+        for tenant, queue in lane.queues.items():
+            if queue and self._tenant_ok(tenant):
+                vtime = lane.vtime[tenant]
+                if best is None or vtime < best_vtime:
+                    best, best_vtime = tenant, vtime
+        return best
+
+    def pop(self) -> Optional[Tuple[str, str, object]]:
+        """Return (lane, tenant, item) for the next job to start, or None."""
+        with self.lock:
+            candidates = {}
+            for lane in self.lanes.values():
+                tenant = self._eligible_tenant(lane)
+                if tenant is not None:
+                    candidates[lane.name] = tenant
+            if not candidates:
+                return None
+
+            # Smooth weighted round robin across lanes that can run something
+            total = 0.0
+            chosen = None
+            for name in candidates:
+                lane = self.lanes[name]
+                lane.current += lane.weight
+                total += lane.weight
+                if chosen is None or lane.current > chosen.current:
+                    chosen = lane
+            chosen.current -= total
+
+            tenant = candidates[chosen.name]
+            item = chosen.queues[tenant].popleft()
+            chosen.size -= 1
+            chosen.clock = chosen.vtime[tenant]
+            chosen.vtime[tenant] += 1.0 / self.tenant_weights.get(tenant, 1.0)
+            chosen.inflight += 1
+            self.tenant_inflight[tenant] = self.tenant_inflight.get(tenant, 0) + 1
+            return chosen.name, tenant, item
+
+    def done(self, lane_name: str, tenant: str):
+        """Mark a popped job as finished."""
+        with self.lock:
+            self.lanes[lane_name].inflight -= 1
+            remaining = self.tenant_inflight.get(tenant, 1) - 1
+            if remaining > 0:
+                self.tenant_inflight[tenant] = remaining
+            else:
+                self.tenant_inflight.pop(tenant, None)
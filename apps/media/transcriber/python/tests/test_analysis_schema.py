@@ -0,0 +1,170 @@
+"""Parsing and validation of the DeepSeek analysis replies.
+
+Run from apps/media/transcriber/python:  python -m unittest discover tests
+"""
+
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analysis_schema import (  # noqa: E402
+    AnalysisParseError,
+    CallAnalysis,
+    parse_analysis,
+    parse_json_analysis,
+    parse_json_batch,
+    parse_text_analysis,
+)
+
+
+def reply(**fields) -> dict:
+    data = {"billable": True, "application_submitted": False, "application_reason": "No bank details"}
+    data.update(fields)
+    return data
+
+
+TEXT_REPLY = """
+1. Answered Call: Yes
+- **Billable:** No
+- Reason (if Not Billable): Customer is 84 years old
+- **Application Submitted:** [Yes]
+- Reason (if No): N/A
+- Customer Name: Mary Smith
+- Monthly Premium: $42.50 per month
+- Carrier: Not Provided
+- Agent Name: John
+"""
+
+
+class JsonAnalysisTest(unittest.TestCase):
+    def test_parses_and_coerces(self):
+        analysis = parse_json_analysis(json.dumps(reply(
+            billable="Yes", monthly_premium="$1,042.50", carrier="  Mutual  ", ssn="Not Provided",
+            answered_by_agent="no", customer_name=None,
+        )))
+        self.assertIs(analysis.billable, True)
+        self.assertIs(analysis.answered_by_agent, False)
+        self.assertEqual(analysis.monthly_premium, 1042.5)
+        self.assertEqual(analysis.carrier, "Mutual")
+        self.assertIsNone(analysis.ssn)
+        self.assertIsNone(analysis.customer_name)
+        self.assertEqual(analysis.to_dict()["applicationReason"], "No bank details")
+
+    def test_markdown_fence_is_stripped(self):
+        analysis = parse_json_analysis("```json\n" + json.dumps(reply(monthly_premium=30)) + "\n```")
+        self.assertEqual(analysis.monthly_premium, 30.0)
+
+    def test_invalid_booleans_are_rejected(self):
+        for value in ("maybe", 1, [], {"answer": True}):
+            with self.subTest(value=value), self.assertRaises(AnalysisParseError):
+                parse_json_analysis(json.dumps(reply(billable=value)))
+        with self.assertRaises(AnalysisParseError):
+            parse_json_analysis(json.dumps(reply(prospect_on_call="sometimes")))
+
+    def test_wrong_types_are_rejected(self):
+        with self.assertRaises(AnalysisParseError):
+            parse_json_analysis(json.dumps(reply(monthly_premium=True)))
+        with self.assertRaises(AnalysisParseError):
+            parse_json_analysis(json.dumps(reply(monthly_premium="about forty")))
+        with self.assertRaises(AnalysisParseError):
+            parse_json_analysis(json.dumps(reply(carrier=12)))
+
+    def test_missing_required_fields(self):
+        for key in ("billable", "application_submitted"):
+            data = reply()
+            del data[key]
+            with self.subTest(key=key), self.assertRaisesRegex(AnalysisParseError, key):
+                parse_json_analysis(json.dumps(data))
+        with self.assertRaises(AnalysisParseError):
+            parse_json_analysis(json.dumps(reply(billable=None)))
+
+    def test_not_an_object(self):
+        with self.assertRaises(AnalysisParseError):
+            parse_json_analysis("[1, 2]")
+        with self.assertRaises(AnalysisParseError):
+            parse_json_analysis("Billable: Yes")
+
+
+class JsonBatchTest(unittest.TestCase):
+    def test_entries_by_call_number(self):
+        text = json.dumps({"calls": [dict(reply(billable=False), call=2), dict(reply(), call=1)]})
+        results = parse_json_batch(text, 2)
+        self.assertEqual(sorted(results), [1, 2])
+        self.assertIs(results[2].billable, False)
+
+    def test_bad_and_out_of_range_entries_are_dropped(self):
+        text = json.dumps({"calls": [
+            dict(reply(), call=1),
+            dict(reply(billable="maybe"), call=2),  # fails validation
+            dict(reply(), call=3),                  # more entries than calls
+            dict(reply(), call=0),
+            dict(reply(), call="1"),
+            reply(),                                # no call number
+            dict(reply(billable=False), call=1),    # duplicate: the first one wins
+            "not an entry",
+        ]})
+        results = parse_json_batch(text, 2)
+        self.assertEqual(list(results), [1])
+        self.assertIs(results[1].billable, True)
+
+    def test_fewer_entries_than_calls(self):
+        results = parse_json_batch(json.dumps({"calls": [dict(reply(), call=2)]}), 3)
+        self.assertEqual(list(results), [2])
+
+    def test_unusable_replies_give_nothing(self):
+        for text in ("not json", "", json.dumps([reply()]), json.dumps({"calls": {"1": reply()}})):
+            with self.subTest(text=text):
+                self.assertEqual(parse_json_batch(text, 1), {})
+
+
+class TextAnalysisTest(unittest.TestCase):
+    def test_parses_legacy_lines(self):
+        analysis = parse_text_analysis(TEXT_REPLY)
+        self.assertIs(analysis.billable, False)
+        self.assertEqual(analysis.billable_reason, "Customer is 84 years old")
+        self.assertIs(analysis.application_submitted, True)
+        self.assertIsNone(analysis.application_reason)
+        self.assertEqual(analysis.customer_name, "Mary Smith")
+        self.assertEqual(analysis.monthly_premium, 42.5)
+        self.assertIsNone(analysis.carrier)
+        self.assertEqual(analysis.agent_name, "John")
+
+    def test_answer_must_start_with_yes_or_no(self):
+        with self.assertRaisesRegex(AnalysisParseError, "billable"):
+            parse_text_analysis("Billable: Unclear\nApplication Submitted: No")
+
+    def test_missing_required_field(self):
+        with self.assertRaisesRegex(AnalysisParseError, "application_submitted"):
+            parse_text_analysis("Billable: Yes\nCustomer Name: Bob")
+
+    def test_round_trips_through_to_text(self):
+        analysis = CallAnalysis(billable=False, application_submitted=False, billable_reason="DNC request",
+                                monthly_premium=55.0, customer_name="Ann Lee")
+        self.assertEqual(parse_text_analysis(analysis.to_text()), analysis)
+
+
+class ParseAnalysisTest(unittest.TestCase):
+    def test_json_reply(self):
+        analysis, parsed_as = parse_analysis(json.dumps(reply()))
+        self.assertEqual(parsed_as, "json")
+        self.assertIs(analysis.billable, True)
+
+    def test_non_json_reply_falls_back_to_text(self):
+        analysis, parsed_as = parse_analysis(TEXT_REPLY, "json")
+        self.assertEqual(parsed_as, "text")
+        self.assertIs(analysis.billable, False)
+
+    def test_invalid_json_reply_does_not_fall_back(self):
+        with self.assertRaises(AnalysisParseError):
+            parse_analysis(json.dumps(reply(billable="maybe")), "json")
+
+    def test_text_format(self):
+        _, parsed_as = parse_analysis(TEXT_REPLY, "text")
+        self.assertEqual(parsed_as, "text")
+
+
+if __name__ == "__main__":
+    unittest.main()
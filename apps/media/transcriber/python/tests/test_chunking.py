@@ -0,0 +1,83 @@
+"""Long-call chunk planning and stitching the chunk transcripts back together.
+
+Run from apps/media/transcriber/python:  python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import decode_pcm, encode_pcm, plan_chunks, stitch_segments  # noqa: E402
+from vad_trim import SAMPLE_RATE  # noqa: E402
+
+# Two chunks cut at 180s with a 2s overlap: the seam is in the middle, at 180s
+FIRST = (0, 181 * SAMPLE_RATE)
+SECOND = (179 * SAMPLE_RATE, 400 * SAMPLE_RATE)
+
+
+def segment(start: float, end: float, text: str) -> dict:
+    return {"start": start, "end": end, "text": text}
+
+
+def text_of(segments: list) -> str:
+    return " ".join(s["text"] for s in segments)
+
+
+class PlanChunksTest(unittest.TestCase):
+    def test_short_call_is_one_chunk(self):
+        audio = np.zeros(60 * SAMPLE_RATE, dtype=np.float32)
+        self.assertEqual(plan_chunks(audio), [(0, len(audio))])
+
+    def test_chunks_cover_the_call_and_overlap(self):
+        audio = np.random.default_rng(0).standard_normal(600 * SAMPLE_RATE).astype(np.float32) * 0.1
+        chunks = plan_chunks(audio, target_sec=180, overlap_sec=2)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(chunks[0][0], 0)
+        self.assertEqual(chunks[-1][1], len(audio))
+        for (_, end), (start, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(end - start, 2 * SAMPLE_RATE)
+
+    def test_pcm_round_trip(self):
+        audio = np.array([0.0, 0.5, -0.5, 1.0, -1.0], dtype=np.float32)
+        np.testing.assert_allclose(decode_pcm(encode_pcm(audio)), audio, atol=1e-4)
+
+
+class StitchSegmentsTest(unittest.TestCase):
+    def test_single_chunk_passes_through(self):
+        segments = [segment(0.0, 2.0, "hello"), segment(2.0, 4.0, "there")]
+        self.assertEqual(stitch_segments([(0, 10 * SAMPLE_RATE, segments)]), segments)
+
+    def test_segments_away_from_the_seam_come_from_their_own_chunk(self):
+        stitched = stitch_segments([
+            (*FIRST, [segment(170.0, 178.0, "hello there"), segment(180.5, 181.0, "cut off")]),
+            (*SECOND, [segment(179.0, 179.6, "partial"), segment(182.0, 184.0, "i'm fine")]),
+        ])
+        self.assertEqual(text_of(stitched), "hello there i'm fine")
+
+    def test_segment_straddling_the_seam_is_not_lost(self):
+        # Each chunk puts "how are you" mostly on the other side of 180s, so
+        # owning it by midpoint would drop it from both
+        stitched = stitch_segments([
+            (*FIRST, [segment(170.0, 178.0, "hello there"), segment(179.6, 180.9, "how are you")]),
+            (*SECOND, [segment(179.0, 180.8, "how are you"), segment(182.0, 184.0, "i'm fine")]),
+        ])
+        self.assertEqual(text_of(stitched), "hello there how are you i'm fine")
+        self.assertEqual([s["start"] for s in stitched], sorted(s["start"] for s in stitched))
+
+    def test_mismatched_seam_segmentation(self):
+        # The second chunk splits the same words differently around the seam
+        stitched = stitch_segments([
+            (*FIRST, [segment(170.0, 178.0, "hello there"), segment(179.6, 180.9, "how are you")]),
+            (*SECOND, [segment(179.1, 179.9, "how are"), segment(179.9, 181.5, "you doing"),
+                       segment(182.0, 184.0, "today")]),
+        ])
+        self.assertEqual(text_of(stitched), "hello there how are you doing today")
+        self.assertGreaterEqual(stitched[2]["start"], stitched[1]["end"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+"""DeepSeekClient against a local mock chat-completions server.
+
+Run from apps/media/transcriber/python:  python -m unittest discover tests
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deepseek_client import DeepSeekClient, RetryableError  # noqa: E402
+
+
+class MockDeepSeek(ThreadingHTTPServer):
+    """Serves scripted replies in order; the last one repeats."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), MockHandler)
+        self.replies = [(200, {}, 0.0)]
+        self.requests = []
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1/chat/completions"
+
+    def next_reply(self):
+        with self.lock:
+            index = min(len(self.requests), len(self.replies)) - 1
+            return self.replies[index]
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with server.lock:
+            server.requests.append(body)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        status, headers, delay = server.next_reply()
+        try:
+            time.sleep(delay)
+            payload = json.dumps({
+                "choices": [{"message": {"content": '{"billable": true}'}}],
+                "usage": {"prompt_tokens": 12, "completion_tokens": 3}
+            } if status == 200 else {"error": "busy"}).encode()
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except OSError:
+            pass  # the client timed out and hung up
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, *args):
+        pass
+
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+class DeepSeekClientTest(unittest.TestCase):
+    def setUp(self):
+        self.server = MockDeepSeek()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def client(self, **kwargs) -> DeepSeekClient:
+        options = {"timeout": 5, "max_retries": 3, "backoff_base": 0.01, "backoff_max": 0.05, "deadline": 10}
+        options.update(kwargs)
+        return DeepSeekClient("test-key", self.server.endpoint, **options)
+
+    def test_completion_and_usage(self):
+        client = self.client()
+        result = client.complete(MESSAGES, max_tokens=16, response_format={"type": "json_object"})
+        self.assertEqual(DeepSeekClient.content(result), '{"billable": true}')
+        self.assertEqual(self.server.requests[0]["response_format"], {"type": "json_object"})
+        stats = client.stats()
+        self.assertEqual((stats["requests"], stats["promptTokens"], stats["completionTokens"]), (1, 12, 3))
+
+    def test_retries_429_honouring_retry_after(self):
+        self.server.replies = [(429, {"Retry-After": "0.2"}, 0.0), (200, {}, 0.0)]
+        client = self.client()
+        started = time.monotonic()
+        client.complete(MESSAGES)
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual(client.stats()["retries"], 1)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_gives_up_after_max_retries(self):
+        self.server.replies = [(503, {}, 0.0)]
+        client = self.client(max_retries=2)
+        with self.assertRaises(RetryableError):
+            client.complete(MESSAGES)
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(client.stats()["failures"], 1)
+
+    def test_read_timeout_is_not_retried(self):
+        self.server.replies = [(200, {}, 1.0)]
+        client = self.client(timeout=0.3)
+        with self.assertRaises(requests.Timeout):
+            client.complete(MESSAGES)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_deadline_caps_retries(self):
+        self.server.replies = [(503, {"Retry-After": "0.3"}, 0.0)]
+        client = self.client(max_retries=50, deadline=1.0)
+        started = time.monotonic()
+        with self.assertRaises(RetryableError):
+            client.complete(MESSAGES)
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertLess(len(self.server.requests), 6)
+
+    def test_concurrency_cap(self):
+        self.server.replies = [(200, {}, 0.1)]
+        client = self.client(max_concurrency=2)
+        threads = [threading.Thread(target=client.complete, args=(MESSAGES,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.server.requests), 8)
+        self.assertLessEqual(self.server.max_active, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
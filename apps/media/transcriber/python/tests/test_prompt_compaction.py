@@ -0,0 +1,80 @@
+"""Keyword compaction of long transcripts for the analysis prompt.
+
+Run from apps/media/transcriber/python:  python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prompt_compaction import compact_segments, compact_text  # noqa: E402
+
+# Sales talk that fills most of a final expense call: coverage, prices,
+# carriers and dates come up constantly without deciding any field
+PITCH = [
+    "So this plan is whole life coverage, it never goes up and it never goes away.",
+    "A lot of folks in your area pick the policy that covers burial and funeral costs.",
+    "Most people pay somewhere around forty to sixty dollars a month for that kind of coverage.",
+    "The carrier we work with has been around for over a hundred years, you can bank on that.",
+    "I'm just checking in to see if that makes sense so far, any questions on the policy?",
+    "In March a lot of families were caught off guard by funeral costs, that's why we do this.",
+    "Your family won't have to worry about the bills, the coverage pays out quickly.",
+    "Social gatherings after a service alone can cost a couple thousand dollars these days.",
+    "We can also look at a smaller policy if the price per month is a concern for you.",
+    "Damn, the weather has been something this week, hasn't it, anyway back to the plan.",
+    "There's no medical exam, just a few health questions and that's it for the coverage.",
+    "The price is locked in, so what you pay this month is what you pay in ten years.",
+]
+
+KEY_LINES = [
+    "And what's your date of birth?",
+    "March 3rd, 1950.",
+    "Do you have a checking account or a savings account for the draft?",
+    "Can I get your social security number to finish the application?",
+]
+
+
+def realistic_call() -> list:
+    lines = []
+    for block in range(10):
+        lines.extend(PITCH)
+        if block == 4:
+            lines.extend(KEY_LINES[:2])
+        if block == 7:
+            lines.extend(KEY_LINES[2:])
+    return [{"start": index * 6.0, "end": index * 6.0 + 5.5, "text": text} for index, text in enumerate(lines)]
+
+
+class CompactSegmentsTest(unittest.TestCase):
+    def test_realistic_transcript_shrinks(self):
+        segments = realistic_call()
+        compacted, info = compact_segments(segments)
+        self.assertTrue(info["compacted"], info)
+        self.assertLess(info["keptWords"], info["totalWords"] * 0.4)
+        self.assertEqual(info["categories"], ["age_dob", "application", "bank_card", "ssn"])
+        for line in KEY_LINES:
+            self.assertIn(line, compacted)
+        self.assertIn("segments omitted", compacted)
+
+    def test_generic_sales_talk_matches_nothing(self):
+        segments = [{"text": text} for text in PITCH * 10]
+        compacted, info = compact_segments(segments)
+        self.assertIsNone(compacted)
+        self.assertEqual(info["reason"], "no matches")
+
+    def test_short_transcript_is_left_alone(self):
+        compacted, info = compact_segments([{"text": "What's your date of birth?"}])
+        self.assertIsNone(compacted)
+        self.assertEqual(info["reason"], "short")
+
+    def test_plain_text_uses_sentences(self):
+        transcript = " ".join(segment["text"] for segment in realistic_call())
+        compacted, info = compact_text(transcript)
+        self.assertTrue(info["compacted"], info)
+        self.assertIn("Can I get your social security number to finish the application?", compacted)
+
+
+if __name__ == "__main__":
+    unittest.main()
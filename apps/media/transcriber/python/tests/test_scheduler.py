@@ -0,0 +1,117 @@
+"""FairScheduler lane weights, lane caps and per-tenant fair queuing.
+
+Run from apps/media/transcriber/python:  python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import FairScheduler, parse_weights  # noqa: E402
+
+
+def drain(scheduler: FairScheduler, count: int, finish: bool = True) -> list:
+    """Pop `count` jobs, marking each done straight away unless finish=False."""
+    popped = []
+    for _ in range(count):
+        picked = scheduler.pop()
+        if picked is None:
+            break
+        popped.append(picked)
+        if finish:
+            scheduler.done(picked[0], picked[1])
+    return popped
+
+
+class ParseWeightsTest(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(parse_weights("realtime:8, backfill:1"), {"realtime": 8.0, "backfill": 1.0})
+        self.assertEqual(parse_weights("a:,b:2", default=3.0), {"a": 3.0, "b": 2.0})
+        self.assertEqual(parse_weights(""), {})
+
+
+class LaneTest(unittest.TestCase):
+    def scheduler(self, backfill_cap: int = 0) -> FairScheduler:
+        scheduler = FairScheduler([("realtime", 8, 0), ("backfill", 1, backfill_cap)])
+        for index in range(100):
+            scheduler.push("realtime", "t", index)
+            scheduler.push("backfill", "t", index)
+        return scheduler
+
+    def test_weight_ratio(self):
+        lanes = Counter(lane for lane, _, _ in drain(self.scheduler(), 90))
+        self.assertEqual(lanes, {"realtime": 80, "backfill": 10})
+
+    def test_smooth_interleaving(self):
+        lanes = [lane for lane, _, _ in drain(self.scheduler(), 27)]
+        # One backfill job in every 9 pops, not bunched together
+        positions = [index for index, lane in enumerate(lanes) if lane == "backfill"]
+        self.assertEqual(len(positions), 3)
+        self.assertEqual({b - a for a, b in zip(positions, positions[1:])}, {9})
+
+    def test_idle_lane_does_not_hold_credit(self):
+        scheduler = FairScheduler([("realtime", 8, 0), ("backfill", 1, 0)])
+        for index in range(20):
+            scheduler.push("backfill", "t", index)
+        self.assertEqual({lane for lane, _, _ in drain(scheduler, 20)}, {"backfill"})
+
+    def test_lane_cap(self):
+        scheduler = self.scheduler(backfill_cap=2)
+        running = drain(scheduler, 60, finish=False)
+        self.assertEqual(sum(1 for lane, _, _ in running if lane == "backfill"), 2)
+        self.assertEqual(scheduler.queued("backfill"), 98)
+
+    def test_fifo_within_tenant(self):
+        scheduler = FairScheduler([("realtime", 1, 0)])
+        for index in range(5):
+            scheduler.push("realtime", "t", index)
+        self.assertEqual([item for _, _, item in drain(scheduler, 5)], [0, 1, 2, 3, 4])
+        self.assertIsNone(scheduler.pop())
+
+
+class TenantTest(unittest.TestCase):
+    def test_backlog_does_not_starve_others(self):
+        scheduler = FairScheduler([("realtime", 1, 0)])
+        for index in range(100):
+            scheduler.push("realtime", "big", index)
+        for index in range(5):
+            scheduler.push("realtime", "small", index)
+        tenants = [tenant for _, tenant, _ in drain(scheduler, 10)]
+        self.assertEqual(Counter(tenants), {"big": 5, "small": 5})
+
+    def test_tenant_weights(self):
+        scheduler = FairScheduler([("realtime", 1, 0)], tenant_weights={"gold": 3.0})
+        for index in range(100):
+            scheduler.push("realtime", "gold", index)
+            scheduler.push("realtime", "basic", index)
+        tenants = Counter(tenant for _, tenant, _ in drain(scheduler, 40))
+        self.assertEqual(tenants, {"gold": 30, "basic": 10})
+
+    def test_returning_tenant_gets_no_backlog_credit(self):
+        scheduler = FairScheduler([("realtime", 1, 0)])
+        for index in range(50):
+            scheduler.push("realtime", "busy", index)
+        drain(scheduler, 20)
+        for index in range(50):
+            scheduler.push("realtime", "late", index)
+        tenants = Counter(tenant for _, tenant, _ in drain(scheduler, 20))
+        # Alternates from here on instead of serving 20 "late" jobs in a row
+        self.assertLessEqual(abs(tenants["busy"] - tenants["late"]), 1)
+
+    def test_tenant_inflight_cap(self):
+        scheduler = FairScheduler([("realtime", 1, 0)], tenant_max_inflight=2)
+        for index in range(10):
+            scheduler.push("realtime", "a", index)
+        scheduler.push("realtime", "b", 0)
+        running = drain(scheduler, 10, finish=False)
+        self.assertEqual(Counter(tenant for _, tenant, _ in running), {"a": 2, "b": 1})
+        self.assertIsNone(scheduler.pop())
+        scheduler.done("realtime", "a")
+        self.assertEqual(scheduler.pop()[1], "a")
+
+
+if __name__ == "__main__":
+    unittest.main()
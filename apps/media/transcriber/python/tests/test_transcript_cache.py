@@ -0,0 +1,60 @@
+"""TranscriptCache keys and LRU eviction.
+
+Run from apps/media/transcriber/python:  python -m unittest discover tests
+"""
+
+import os
+import sys
+import json
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transcript_cache import TranscriptCache, LOW_WATER  # noqa: E402
+
+
+class TranscriptCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "cache.sqlite3")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_key_covers_settings(self):
+        fast = TranscriptCache.make_key("abc", model="small", beam_size=1)
+        accurate = TranscriptCache.make_key("abc", model="large-v3", beam_size=5)
+        self.assertNotEqual(fast, accurate)
+        self.assertEqual(fast, TranscriptCache.make_key("abc", beam_size=1, model="small"))
+
+    def test_round_trip_and_replace(self):
+        cache = TranscriptCache(self.path, 1 << 20)
+        cache.put("k", {"segments": [1]})
+        cache.put("k", {"segments": [1, 2]})
+        self.assertEqual(cache.get("k"), {"segments": [1, 2]})
+        self.assertEqual(cache.total, cache._stored_bytes())
+        self.assertIsNone(cache.get("missing"))
+
+    def test_evicts_least_recently_used_to_low_water(self):
+        entry = {"text": "x" * 90}
+        size = len(json.dumps(entry))
+        cache = TranscriptCache(self.path, size * 10)
+        for index in range(10):
+            cache.put(f"k{index}", entry)
+        cache.get("k0")  # most recently used now
+        cache.put("k10", entry)
+        self.assertLessEqual(cache._stored_bytes(), size * 10 * LOW_WATER)
+        self.assertIsNotNone(cache.get("k0"))
+        self.assertIsNone(cache.get("k1"))
+        self.assertIsNotNone(cache.get("k10"))
+        self.assertEqual(cache.total, cache._stored_bytes())
+
+    def test_total_survives_reopen(self):
+        cache = TranscriptCache(self.path, 1 << 20)
+        cache.put("k", {"text": "hello"})
+        self.assertEqual(TranscriptCache(self.path, 1 << 20).total, cache.total)
+
+
+if __name__ == "__main__":
+    unittest.main()
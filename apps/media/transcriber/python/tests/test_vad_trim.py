@@ -0,0 +1,82 @@
+"""Energy VAD trimming and the remap back to original timestamps.
+
+Run from apps/media/transcriber/python:  python -m unittest discover tests
+"""
+
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vad_trim import SAMPLE_RATE, remap_segments, remap_time, trim_silence  # noqa: E402
+
+
+def tone(seconds: float, freq: float = 440.0, level: float = 0.3) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (level * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+def silence(seconds: float) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    return (rng.standard_normal(int(seconds * SAMPLE_RATE)) * 1e-4).astype(np.float32)
+
+
+class TrimSilenceTest(unittest.TestCase):
+    def setUp(self):
+        # 10s ring, 3s "speech", 8s hold, 4s "speech", 5s dead air
+        self.audio = np.concatenate([silence(10), tone(3), silence(8), tone(4, 300), silence(5)])
+
+    def test_trims_long_silences(self):
+        trimmed, remap = trim_silence(self.audio)
+        self.assertIsNotNone(remap)
+        self.assertEqual(len(remap), 2)
+        seconds = len(trimmed) / SAMPLE_RATE
+        self.assertGreater(seconds, 7.0)
+        self.assertLess(seconds, 9.0)  # speech plus the padding on each side
+
+    def test_segment_times_map_back_to_original_audio(self):
+        trimmed, remap = trim_silence(self.audio)
+        first_len = remap[0][2]
+        # A segment inside each kept piece, expressed in trimmed-audio time
+        segments = [
+            {"start": remap[0][0] + 0.5, "end": remap[0][0] + 2.5, "text": "first"},
+            {"start": remap[1][0] + 0.5, "end": remap[1][0] + 3.5, "text": "second"},
+        ]
+        remap_segments(segments, remap)
+        self.assertAlmostEqual(segments[0]["start"], remap[0][1] + 0.5)
+        self.assertAlmostEqual(segments[1]["start"], remap[1][1] + 0.5)
+        # Both land on the tones in the original recording
+        self.assertTrue(10.0 - 0.5 <= segments[0]["start"] and segments[0]["end"] <= 13.0 + 0.5)
+        self.assertTrue(21.0 - 0.5 <= segments[1]["start"] and segments[1]["end"] <= 25.0 + 0.5)
+        # The audio at a remapped time is the audio at the trimmed time
+        for t in (0.7, first_len + 1.2):
+            original = remap_time(t, remap)
+            self.assertEqual(trimmed[int(t * SAMPLE_RATE)], self.audio[int(round(original * SAMPLE_RATE))])
+
+    def test_times_clamp_inside_pieces(self):
+        _, remap = trim_silence(self.audio)
+        end_of_first = remap[0][1] + remap[0][2]
+        self.assertAlmostEqual(remap_time(remap[1][0] - 1e-6, remap), end_of_first, places=4)
+        self.assertAlmostEqual(remap_time(-1.0, remap), remap[0][1])
+
+    def test_mostly_speech_is_left_alone(self):
+        audio = np.concatenate([tone(10), silence(0.5), tone(10)])
+        trimmed, remap = trim_silence(audio)
+        self.assertIsNone(remap)
+        self.assertIs(trimmed, audio)
+
+    def test_all_silence_keeps_one_second(self):
+        trimmed, remap = trim_silence(silence(20))
+        self.assertEqual(len(trimmed), SAMPLE_RATE)
+        self.assertEqual(remap, [(0.0, 0.0, 1.0)])
+
+    def test_no_remap_is_identity(self):
+        segments = [{"start": 1.0, "end": 2.0}]
+        self.assertEqual(remap_segments(segments, None), [{"start": 1.0, "end": 2.0}])
+
+
+if __name__ == "__main__":
+    unittest.main()
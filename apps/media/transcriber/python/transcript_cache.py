@@ -0,0 +1,103 @@
+"""Content-addressed transcript cache.
+
+Transcripts are keyed by the SHA-256 of the recording bytes plus every
+setting that changes Whisper's output (model, compute type, beam size,
+language), so re-queued jobs and reruns over the same audio skip the model
+entirely. Entries live in a local SQLite file (WAL mode, safe to share
+between supervisor children) and are evicted least-recently-used once the
+stored payloads exceed max_bytes, down to LOW_WATER of it. Each process
+keeps a running total of its own writes and re-reads the table's real total
+only when that goes over budget or every RESYNC_EVERY puts, so a put does
+not scan the table.
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+LOW_WATER = 0.9
+RESYNC_EVERY = 200
+
+
+class TranscriptCache:
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS transcripts ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " accessed REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS transcripts_accessed ON transcripts (accessed)")
+        self.total = self._stored_bytes()
+        self.puts = 0  # since the last resync
+
+    @staticmethod
+    def make_key(audio_hash: str, **settings) -> str:
+        """Combine the audio content hash with the decode settings."""
+        material = audio_hash + json.dumps(settings, sort_keys=True)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self.lock:
+            row = self.db.execute("SELECT value FROM transcripts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE transcripts SET accessed = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, value: dict):
+        payload = json.dumps(value)
+        with self.lock:
+            row = self.db.execute("SELECT size FROM transcripts WHERE key = ?", (key,)).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO transcripts (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time())
+            )
+            self.total += len(payload) - (row[0] if row else 0)
+            self.puts += 1
+            if self.total > self.max_bytes or self.puts >= RESYNC_EVERY:
+                self._evict()
+
+    def _stored_bytes(self) -> int:
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+
+    def _evict(self):
+        """Resync the total (other processes write too) and trim to LOW_WATER when over budget."""
+        total = self._stored_bytes()
+        self.puts = 0
+        if total > self.max_bytes:
+            target = self.max_bytes * LOW_WATER
+            evicted = 0
+            rows = self.db.execute("SELECT key, size FROM transcripts ORDER BY accessed").fetchall()
+            for key, size in rows:
+                if total <= target:
+                    break
+                self.db.execute("DELETE FROM transcripts WHERE key = ?", (key,))
+                total -= size
+                evicted += 1
+            logger.info(f"Transcript cache evicted {evicted} entries ({total / (1024 * 1024):.1f} MB kept)")
+        self.total = total
+
+
+def open_cache(path: str, max_mb: int) -> Optional[TranscriptCache]:
+    """Open the cache, or return None when disabled or unavailable."""
+    if not path:
+        return None
+    try:
+        return TranscriptCache(path, max_mb * 1024 * 1024)
+    except Exception as e:
+        logger.warning(f"Transcript cache disabled ({path}): {e}")
+        return None
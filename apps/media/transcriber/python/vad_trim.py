@@ -0,0 +1,130 @@
+"""Energy-based silence trimming ahead of Whisper.
+
+Ring time, dead air and the silent stretches of hold are cut out of the
+16 kHz array before the model sees it, so the encoder only runs over audio
+that might contain speech. Frame energies are computed in one vectorized
+pass; the threshold adapts to each call's noise floor (and stays below its
+loudest stretches, for calls with almost no silence).
+
+Trimming returns a remap table of (trimmed_start, original_start, length)
+pieces, and remap_time / remap_segments translate model timestamps back to
+positions in the original recording.
+
+This is a coarse pre-pass: Whisper's own Silero VAD (vad_filter=True) still
+runs on the trimmed audio and handles the finer speech/non-speech decisions.
+"""
+
+import os
+import bisect
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+VAD_TRIM_ENABLED = os.getenv("VAD_TRIM_ENABLED", "true").lower() == "true"
+VAD_FRAME_MS = int(os.getenv("VAD_FRAME_MS", "30"))
+VAD_MARGIN_DB = float(os.getenv("VAD_MARGIN_DB", "12"))     # above the call's noise floor
+VAD_MIN_DBFS = float(os.getenv("VAD_MIN_DBFS", "-50"))      # never treat quieter frames as speech
+VAD_PAD_MS = int(os.getenv("VAD_PAD_MS", "300"))            # kept on each side of speech
+VAD_MIN_SILENCE_MS = int(os.getenv("VAD_MIN_SILENCE_MS", "1000"))  # shorter gaps are kept
+VAD_MIN_SAVINGS = float(os.getenv("VAD_MIN_SAVINGS", "0.1"))       # skip trimming below this
+
+RemapTable = List[Tuple[float, float, float]]
+
+
+def frame_energy_db(audio: np.ndarray, frame: int) -> np.ndarray:
+    """RMS level of each `frame`-sample frame in dBFS (last partial frame dropped)."""
+    frames = len(audio) // frame
+    if frames == 0:
+        return np.empty(0, dtype=np.float32)
+    blocks = audio[:frames * frame].reshape(frames, frame)
+    rms = np.sqrt(np.mean(np.square(blocks, dtype=np.float32), axis=1))
+    return 20.0 * np.log10(np.maximum(rms, 1e-10))
+
+
+def _dilate(mask: np.ndarray, radius: int) -> np.ndarray:
+    """Grow True runs by `radius` frames on each side."""
+    if radius <= 0 or not mask.any():
+        return mask
+    kernel = np.ones(2 * radius + 1, dtype=np.int32)
+    return np.convolve(mask.astype(np.int32), kernel, mode="same") > 0
+
+
+def speech_regions(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> List[Tuple[int, int]]:
+    """(start, end) sample ranges that may contain speech."""
+    frame = max(1, sample_rate * VAD_FRAME_MS // 1000)
+    energy = frame_energy_db(audio, frame)
+    if energy.size == 0:
+        return [(0, len(audio))] if len(audio) else []
+
+    noise_floor, peak = np.percentile(energy, [10, 99])
+    # Capped below the call's peak: with little or no silence the 10th
+    # percentile is itself speech, and the whole call would count as noise
+    threshold = max(min(noise_floor + VAD_MARGIN_DB, peak - VAD_MARGIN_DB), VAD_MIN_DBFS)
+    mask = energy > threshold
+    mask = _dilate(mask, VAD_PAD_MS // VAD_FRAME_MS)
+
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+    starts, ends = edges[0::2], edges[1::2]
+    min_gap = VAD_MIN_SILENCE_MS // VAD_FRAME_MS
+
+    regions = []
+    for start, end in zip(starts, ends):
+        if regions and start - regions[-1][1] < min_gap:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+
+    result = [(int(start) * frame, int(end) * frame) for start, end in regions]
+    if result and result[-1][1] == energy.size * frame:
+        result[-1] = (result[-1][0], len(audio))  # the partial tail frame goes with the last region
+    return result
+
+
+def trim_silence(audio: np.ndarray, sample_rate: int = SAMPLE_RATE) -> Tuple[np.ndarray, Optional[RemapTable]]:
+    """Drop non-speech stretches.
+
+    Returns (audio, remap). remap is None when trimming is disabled or would
+    save less than VAD_MIN_SAVINGS of the call, in which case `audio` is the
+    untouched input.
+    """
+    if not VAD_TRIM_ENABLED or audio is None or len(audio) == 0:
+        return audio, None
+    regions = speech_regions(audio, sample_rate)
+    kept = sum(end - start for start, end in regions)
+    if kept == 0:
+        # No speech at all: hand the model a token second so it reports nothing
+        regions = [(0, min(len(audio), sample_rate))]
+        kept = regions[0][1]
+    if kept > len(audio) * (1 - VAD_MIN_SAVINGS):
+        return audio, None
+
+    trimmed = np.concatenate([audio[start:end] for start, end in regions])
+    remap = []
+    offset = 0
+    for start, end in regions:
+        remap.append((offset / sample_rate, start / sample_rate, (end - start) / sample_rate))
+        offset += end - start
+    return trimmed, remap
+
+
+def remap_time(t: float, remap: Optional[RemapTable], starts: Optional[List[float]] = None) -> float:
+    """Map a timestamp in trimmed audio back to the original recording."""
+    if not remap:
+        return t
+    if starts is None:
+        starts = [piece[0] for piece in remap]
+    index = max(0, bisect.bisect_right(starts, t) - 1)
+    trimmed_start, original_start, length = remap[index]
+    return original_start + min(max(t - trimmed_start, 0.0), length)
+
+
+def remap_segments(segments: List[dict], remap: Optional[RemapTable]) -> List[dict]:
+    """Rewrite 'start'/'end' of segment dicts in place; returns the list."""
+    if remap:
+        starts = [piece[0] for piece in remap]
+        for segment in segments:
+            segment["start"] = remap_time(segment["start"], remap, starts)
+            segment["end"] = remap_time(segment["end"], remap, starts)
+    return segments
@@ -0,0 +1,259 @@
+"""Cross-job batched Whisper inference.
+
+Short calls spend most of their time in per-call overhead: one encoder pass
+per 30s window and one decode loop per window, each run on its own. The
+WhisperBatcher groups speech windows from many queued jobs into a single
+CTranslate2 encode/generate call and splits the results back per job with
+timestamps relative to each job's audio.
+
+The batch path drives faster-whisper internals (the CTranslate2 model,
+get_prompt, the feature extractor), so it is only enabled for the versions
+in SUPPORTED_VERSIONS. It decodes greedily at temperature 0; a window that
+fails transcribe()'s quality checks (compression ratio, average log prob)
+is re-run through model.transcribe, which has the temperature fallback.
+"""
+
+import time
+import zlib
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import List, Optional
+
+import numpy as np
+import ctranslate2
+import faster_whisper
+from faster_whisper.tokenizer import Tokenizer
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+WINDOW_SECONDS = 30
+TIME_PRECISION = 0.02
+
+SUPPORTED_VERSIONS = ("0.10.",)
+# transcribe()'s defaults
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOG_PROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+
+def batching_supported() -> bool:
+    """True when the installed faster-whisper has the internals the batcher uses."""
+    return faster_whisper.__version__.startswith(SUPPORTED_VERSIONS)
+
+
+def compression_ratio(text: str) -> float:
+    data = text.encode("utf-8")
+    return len(data) / len(zlib.compress(data)) if data else 0.0
+
+
+def speech_windows(audio: np.ndarray, window_seconds: int = WINDOW_SECONDS) -> List[tuple]:
+    """Group VAD speech regions into contiguous windows of at most window_seconds.
+
+    Returns (start_sample, end_sample) pairs. Each window is a plain slice of the
+    original audio, so timestamps inside it only need the window offset added.
+    """
+    options = VadOptions(max_speech_duration_s=window_seconds)
+    regions = get_speech_timestamps(audio, options)
+    max_samples = window_seconds * SAMPLE_RATE
+
+    windows = []
+    for region in regions:
+        if windows and region['end'] - windows[-1][0] <= max_samples:
+            windows[-1] = (windows[-1][0], region['end'])
+        else:
+            windows.append((region['start'], region['end']))
+    return windows
+
+
+def split_timestamped(tokens: List[int], tokenizer: Tokenizer, duration: float) -> List[tuple]:
+    """Split a timestamped token sequence into (start, end, text) tuples.
+
+    Text with no opening timestamp (e.g. decoded before the first one) runs
+    from the previous segment's end, or 0, to the next timestamp.
+    """
+    timestamp_begin = tokenizer.timestamp_begin
+    segments = []
+    current = []
+    start = None
+
+    for token in tokens:
+        if token < timestamp_begin:
+            current.append(token)
+            continue
+        t = min((token - timestamp_begin) * TIME_PRECISION, duration)
+        if current:
+            opened = start if start is not None else (segments[-1][1] if segments else 0.0)
+            segments.append((opened, t, tokenizer.decode(current)))
+            current = []
+            start = None
+        else:
+            start = t
+
+    if current:
+        opened = start if start is not None else (segments[-1][1] if segments else 0.0)
+        segments.append((opened, duration, tokenizer.decode(current)))
+    return segments
+
+
+class _Request:
+    def __init__(self, future: Future, num_windows: int, duration: float, language: str):
+        self.future = future
+        self.remaining = num_windows
+        self.duration = duration
+        self.language = language
+        self.results = [None] * num_windows
+        self.lock = threading.Lock()
+
+
+class WhisperBatcher:
+    """Collects windows from concurrent submit() calls and runs them as batches.
+
+    A batch is flushed when it reaches max_batch_size windows or when the oldest
+    queued window has waited max_wait_ms, whichever comes first.
+    """
+
+    def __init__(self, model, max_batch_size: int = 8, max_wait_ms: int = 50, beam_size: int = 1):
+        if not batching_supported():
+            raise RuntimeError(f"Batched inference needs faster-whisper {'/'.join(SUPPORTED_VERSIONS)}x, "
+                               f"found {faster_whisper.__version__}")
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.beam_size = beam_size
+        self.pending = queue.Queue()
+        self.tokenizers = {}
+        self.thread = threading.Thread(target=self._loop, name='whisper-batcher', daemon=True)
+        self.thread.start()
+
+    def _tokenizer(self, language: str) -> Tokenizer:
+        if language not in self.tokenizers:
+            self.tokenizers[language] = Tokenizer(
+                self.model.hf_tokenizer,
+                self.model.model.is_multilingual,
+                task='transcribe',
+                language=language
+            )
+        return self.tokenizers[language]
+
+    def submit(self, audio: np.ndarray, language: Optional[str] = 'en') -> Future:
+        """Queue one call's audio. The future resolves to (segments, info)."""
+        language = language or 'en'
+        future = Future()
+        duration = len(audio) / SAMPLE_RATE
+        windows = speech_windows(audio)
+
+        if not windows:
+            future.set_result(([], {'language': language, 'duration': duration}))
+            return future
+
+        request = _Request(future, len(windows), duration, language)
+        nb_max_frames = self.model.feature_extractor.nb_max_frames
+        for index, (start, end) in enumerate(windows):
+            # Feature extraction runs on the caller's thread, off the batch loop
+            features = self.model.feature_extractor(audio[start:end])[:, :nb_max_frames]
+            if features.shape[-1] < nb_max_frames:
+                features = np.pad(features, [(0, 0), (0, nb_max_frames - features.shape[-1])])
+            self.pending.put((request, index, start / SAMPLE_RATE, (end - start) / SAMPLE_RATE, features,
+                              audio[start:end]))
+        return future
+
+    def transcribe(self, audio: np.ndarray, language: Optional[str] = 'en'):
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(audio, language).result()
+
+    def _collect(self) -> list:
+        batch = [self.pending.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                logger.error(f"Batch of {len(batch)} windows failed: {e}")
+                for request, *_ in batch:
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _run_batch(self, batch: list):
+        features = np.ascontiguousarray(np.stack([item[4] for item in batch]))
+        to_cpu = self.model.model.device == 'cuda' and len(self.model.model.device_index) > 1
+        encoder_output = self.model.model.encode(ctranslate2.StorageView.from_array(features), to_cpu=to_cpu)
+
+        prompts = [
+            self.model.get_prompt(self._tokenizer(request.language), [], without_timestamps=False)
+            for request, *_ in batch
+        ]
+        results = self.model.model.generate(
+            encoder_output,
+            prompts,
+            beam_size=self.beam_size,
+            max_length=getattr(self.model, 'max_length', 448),
+            return_scores=True,
+            return_no_speech_prob=True,
+            suppress_blank=True,
+            suppress_tokens=[-1]
+        )
+
+        for (request, index, offset, window_duration, _, audio), result in zip(batch, results):
+            tokenizer = self._tokenizer(request.language)
+            tokens = result.sequences_ids[0]
+            # Same averaging as transcribe() (length_penalty 1)
+            avg_logprob = result.scores[0] * len(tokens) / (len(tokens) + 1)
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and avg_logprob < LOG_PROB_THRESHOLD:
+                self._deliver(request, index, [])  # silence
+                continue
+            text = tokenizer.decode([token for token in tokens if token < tokenizer.eot])
+            if compression_ratio(text) > COMPRESSION_RATIO_THRESHOLD or avg_logprob < LOG_PROB_THRESHOLD:
+                self._deliver(request, index, self._fallback(request, offset, audio))
+                continue
+            segments = [
+                {
+                    'start': round(offset + start, 3),
+                    'end': round(offset + end, 3),
+                    'text': text.strip()
+                }
+                for start, end, text in split_timestamped(tokens, tokenizer, window_duration)
+                if text.strip()
+            ]
+            self._deliver(request, index, segments)
+
+    def _fallback(self, request: _Request, offset: float, audio: np.ndarray) -> list:
+        """Re-run one window through model.transcribe (temperature fallback and quality retries)."""
+        logger.info(f"Window at {offset:.1f}s failed the quality checks; re-running it with transcribe()")
+        segments, _ = self.model.transcribe(audio, language=request.language, beam_size=self.beam_size,
+                                            vad_filter=False)
+        return [
+            {
+                'start': round(offset + segment.start, 3),
+                'end': round(offset + segment.end, 3),
+                'text': segment.text.strip()
+            }
+            for segment in segments
+            if segment.text.strip()
+        ]
+
+    def _deliver(self, request: _Request, index: int, segments: list):
+        with request.lock:
+            request.results[index] = segments
+            request.remaining -= 1
+            if request.remaining:
+                return
+        if request.future.done():
+            return
+        merged = [segment for window in request.results for segment in window]
+        request.future.set_result((merged, {'language': request.language, 'duration': request.duration}))
@@ -7,15 +7,32 @@ import tempfile
 import requests
 import redis
 import subprocess
-import hashlib
-import re
 import datetime
+import shutil
+import signal
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 from faster_whisper import WhisperModel
+from faster_whisper.audio import decode_audio
+from whisper_batching import WhisperBatcher, batching_supported
+from audio_io import SAMPLE_RATE, download_bytes, decode_buffer, hash_file
+from transcript_cache import TranscriptCache, open_cache
+from analysis_cache import AnalysisCache, make_key as make_analysis_key
+from deepseek_client import DeepSeekClient
+from preclassifier import preclassify
+from analysis_schema import json_instructions, parse_analysis
+from scheduler import FairScheduler, parse_weights
+from diarization import diarize, label_segments, speaker_transcript
+from prompt_compaction import compact_segments
+from chunking import plan_chunks, stitch_segments, encode_pcm, decode_pcm
+from vad_trim import VAD_TRIM_ENABLED, trim_silence, remap_segments, remap_time
 
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
@@ -30,47 +47,312 @@ DEEPSEEK_API_KEY = os.getenv("DEEPSEEK_API_KEY")
 DEEPSEEK_MODEL = os.getenv("DEEPSEEK_MODEL", "deepseek-chat")
 DEEPSEEK_ENDPOINT = os.getenv("DEEPSEEK_ENDPOINT", "https://api.deepseek.com/v1/chat/completions")
 ANALYSIS_TIMEOUT = int(os.getenv("ANALYSIS_TIMEOUT", "90"))
+# Bump when the prompt changes so cached analyses are not reused across versions
+ANALYSIS_PROMPT_VERSION = "billing-v2"
+# json: DeepSeek JSON mode + strict parser; text: legacy "Field: value" prompt.
+# JSON replies that fail to parse fall back to the line parser either way.
+ANALYSIS_RESPONSE_FORMAT = os.getenv("ANALYSIS_RESPONSE_FORMAT", "json").lower()
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", "86400"))
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "10000"))
+# Short-circuit voicemail / dead air / very short transcripts without the LLM
+PRECLASSIFY_ENABLED = os.getenv("PRECLASSIFY_ENABLED", "true").lower() == "true"
+PRECLASSIFY_REPORT_EVERY = int(os.getenv("PRECLASSIFY_REPORT_EVERY", "100"))
+
+# Audio Config
+# AUDIO_IN_MEMORY decodes the HTTP body straight to a 16 kHz float32 array;
+# set to false to fall back to temp files (+ ffmpeg compression for large files).
+AUDIO_IN_MEMORY = os.getenv("AUDIO_IN_MEMORY", "true").lower() == "true"
+DOWNLOAD_TIMEOUT = int(os.getenv("DOWNLOAD_TIMEOUT", "60"))
 
 # FFmpeg Config
 MAX_FFMPEG_SECONDS = int(os.getenv("FFMPEG_TIMEOUT", "120"))
 LARGE_FILE_THRESHOLD_MB = int(os.getenv("LARGE_FILE_THRESHOLD_MB", "20"))
 
+# Process Pool Config
+# WORKER_PROCESSES: number of child processes, each with its own model replica.
+# "auto" sizes the pool to the available cores divided by WHISPER_CPU_THREADS.
+WORKER_PROCESSES = os.getenv("WORKER_PROCESSES", "1")
+WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", "0"))  # 0 = split cores evenly
+WHISPER_NUM_WORKERS = int(os.getenv("WHISPER_NUM_WORKERS", "1"))
+DEFAULT_THREADS_PER_PROCESS = 4
+CHILD_RESTART_DELAY = float(os.getenv("CHILD_RESTART_DELAY", "5"))
+
+# Pipeline Config
+# Downloads and analysis run on I/O thread pools; Whisper runs on one thread fed
+# from a bounded queue of PIPELINE_DEPTH ready clips.
+PIPELINE_DEPTH = int(os.getenv("PIPELINE_DEPTH", "2"))
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "8"))
+MAX_INFLIGHT_JOBS = int(os.getenv("MAX_INFLIGHT_JOBS", "16"))
+
+# Stream Config
+JOBS_STREAM = 'jobs:transcription'
+RESULTS_STREAM = 'jobs:transcription:results'
+# Entries pending longer than RECLAIM_IDLE_MS (owner crashed) are XAUTOCLAIMed;
+# live workers refresh their own entries every RECLAIM_INTERVAL_SEC.
+RECLAIM_INTERVAL_SEC = float(os.getenv("RECLAIM_INTERVAL_SEC", "30"))
+RECLAIM_IDLE_MS = int(os.getenv("RECLAIM_IDLE_MS", "300000"))
+RECLAIM_MAX_DELIVERIES = int(os.getenv("RECLAIM_MAX_DELIVERIES", "3"))
+CONSUMER_EXPIRE_MS = int(os.getenv("CONSUMER_EXPIRE_MS", "3600000"))
+
+# Scheduling Config
+# Realtime post-call jobs keep using jobs:transcription; bulk re-processing is
+# XADDed to jobs:transcription:backfill. Lanes are served by weight, backfill may
+# hold at most BACKFILL_MAX_SHARE of the pipeline, and tenants (payload tenantId)
+# are fair-queued inside each lane with at most TENANT_MAX_INFLIGHT running.
+BACKFILL_STREAM = 'jobs:transcription:backfill'
+LANE_STREAMS = {'realtime': JOBS_STREAM, 'backfill': BACKFILL_STREAM}
+LANE_WEIGHTS = parse_weights(os.getenv("LANE_WEIGHTS", "realtime:8,backfill:1"))
+BACKFILL_MAX_SHARE = float(os.getenv("BACKFILL_MAX_SHARE", "0.75"))
+TENANT_MAX_INFLIGHT = int(os.getenv("TENANT_MAX_INFLIGHT", "8"))  # 0 = no cap
+TENANT_WEIGHTS = parse_weights(os.getenv("TENANT_WEIGHTS", ""))
+# Each lane reads ahead only as many messages as the pipeline has free slots,
+# plus LANE_LOOKAHEAD so the scheduler has tenants to choose between. A busy
+# process leaves the rest in Redis for its siblings (and other hosts).
+LANE_LOOKAHEAD = int(os.getenv("LANE_LOOKAHEAD", "2"))
+
+# Batching Config
+# TRANSCRIBE_BATCH_SIZE > 1 groups speech windows from several jobs into one
+# encoder/decoder batch, flushed after BATCH_MAX_WAIT_MS at the latest.
+TRANSCRIBE_BATCH_SIZE = int(os.getenv("TRANSCRIBE_BATCH_SIZE", "1"))
+BATCH_MAX_WAIT_MS = int(os.getenv("BATCH_MAX_WAIT_MS", "50"))
+BEAM_SIZE = 5
+
+# Adaptive Model Config
+# With WHISPER_FAST_MODEL set, each process keeps both models loaded and picks
+# one per job (see choose_profile). Jobs may pass settings.quality
+# ("accurate" / "fast" / "auto"). The backlog (group lag + pending across the
+# lane streams) is polled every BACKLOG_POLL_SEC; at BACKLOG_DEGRADE_AT the
+# worker switches to the fast model with greedy decoding and returns to normal
+# once it is back down to BACKLOG_RECOVER_AT.
+WHISPER_FAST_MODEL = os.getenv('WHISPER_FAST_MODEL', '')
+LONG_CALL_SEC = float(os.getenv("LONG_CALL_SEC", "900"))
+BACKLOG_POLL_SEC = float(os.getenv("BACKLOG_POLL_SEC", "5"))
+BACKLOG_DEGRADE_AT = int(os.getenv("BACKLOG_DEGRADE_AT", "100"))
+BACKLOG_RECOVER_AT = int(os.getenv("BACKLOG_RECOVER_AT", "20"))
+
+# profile -> (model key, beam size)
+PROFILES = {
+    'accurate': ('accurate', BEAM_SIZE),
+    'fast': ('fast', BEAM_SIZE),
+    'degraded': ('fast', 1)
+}
+
+# Streaming Config
+# Jobs with settings.stream (or every job when STREAM_PARTIALS=true) get their
+# segments XADDed to jobs:transcription:partial:<jobId> as they are decoded,
+# with sequence numbers, followed by a final summary message. Segments are
+# streamed before speaker labelling, so they carry no `speaker` key; when
+# diarization ran, a `speakers` message ({'method', 'speakers': [...]}, one
+# label per segment index) follows before the final message.
+STREAM_PARTIALS = os.getenv("STREAM_PARTIALS", "false").lower() == "true"
+STREAM_FLUSH_SEGMENTS = int(os.getenv("STREAM_FLUSH_SEGMENTS", "5"))
+STREAM_FLUSH_SEC = float(os.getenv("STREAM_FLUSH_SEC", "2"))
+STREAM_TTL_SEC = int(os.getenv("STREAM_TTL_SEC", "3600"))
+
+# Chunking Config
+# Calls with at least CHUNK_MIN_CALL_SEC of (trimmed) audio are split at
+# silences into overlapping chunks (see chunking.py). The chunks are XADDed to
+# jobs:transcription:chunks with their PCM in Redis, so every worker process
+# (and host) picks them up ahead of its own queued jobs; the owning job waits for
+# all of them and stitches the segments. Chunks nobody has finished after
+# CHUNK_TIMEOUT_SEC are taken back and transcribed by the owner's own model.
+# Chunking only pays off when other models are free to take chunks, so it is on
+# for supervised children (WORKER_PROCESSES > 1) and off for a single process
+# unless CHUNK_ACROSS_HOSTS=true (several single-process hosts on one Redis).
+# Redis cost: int16 PCM is ~1.9 MB per minute of trimmed audio (~86 MB for a
+# 45-minute call). Each chunk is deleted once transcribed, and all of a job's
+# chunks when the job finishes or fails; CHUNK_TTL_SEC only bounds what a crash
+# leaves. It runs from before the wait starts and is longer than the wait, so a
+# chunk is always still there to be taken back.
+CHUNKS_STREAM = 'jobs:transcription:chunks'
+CHUNK_MIN_CALL_SEC = float(os.getenv("CHUNK_MIN_CALL_SEC", "600"))
+CHUNK_TIMEOUT_SEC = int(os.getenv("CHUNK_TIMEOUT_SEC", "1800"))
+CHUNK_TTL_SEC = 2 * CHUNK_TIMEOUT_SEC
+CHUNK_ACROSS_HOSTS = os.getenv("CHUNK_ACROSS_HOSTS", "false").lower() == "true"
+
+# Diarization Config
+# Speakers come from the channels of dual-channel recordings, or from clustering
+# voice features for mono ones (diarization.py), computed on a side pool while
+# Whisper runs and applied in the analysis stage, so the model never waits on it. ANALYSIS_TRANSCRIPT picks what DeepSeek sees: "labeled"
+# (Agent:/Prospect: turns), "prospect" (only the prospect's turns) or "plain".
+# Each diarization task holds both channels of a call, so at most
+# DIARIZE_WORKERS + PIPELINE_DEPTH are running or queued; downloads wait for a
+# slot like they wait for room in the decoded queue.
+DIARIZE_ENABLED = os.getenv("DIARIZE_ENABLED", "true").lower() == "true"
+DIARIZE_WORKERS = int(os.getenv("DIARIZE_WORKERS", "2"))
+DIARIZE_TIMEOUT_SEC = int(os.getenv("DIARIZE_TIMEOUT_SEC", "120"))
+ANALYSIS_TRANSCRIPT = os.getenv("ANALYSIS_TRANSCRIPT", "labeled").lower()
+
+# Transcript Cache Config (set TRANSCRIPT_CACHE_PATH to empty to disable)
+TRANSCRIPT_CACHE_PATH = os.getenv("TRANSCRIPT_CACHE_PATH", "transcript_cache.sqlite3")
+TRANSCRIPT_CACHE_MAX_MB = int(os.getenv("TRANSCRIPT_CACHE_MAX_MB", "512"))
+
+
+def choose_profile(duration_sec: float, backlog: int, degraded: bool, quality: str = 'auto') -> str:
+    """Pick a transcription profile for one job.
+
+    An explicit quality hint wins; otherwise a deep backlog degrades every job
+    to the fast greedy profile, and long calls use the fast model whenever
+    there is any queue behind them.
+    """
+    quality = (quality or 'auto').lower()
+    if quality in ('accurate', 'high'):
+        return 'accurate'
+    if quality in ('fast', 'low'):
+        return 'degraded' if degraded else 'fast'
+    if degraded:
+        return 'degraded'
+    if duration_sec >= LONG_CALL_SEC and backlog > BACKLOG_RECOVER_AT:
+        return 'fast'
+    return 'accurate'
+
+
+def available_cores() -> int:
+    """Number of cores this process may run on (respects cpusets/affinity)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def plan_process_pool() -> tuple:
+    """Resolve (processes, cpu_threads) from the environment.
+
+    Each replica gets an equal share of the cores so that N processes never
+    oversubscribe the box; CTranslate2 then runs one intra-op pool per replica.
+    """
+    cores = available_cores()
+    if WORKER_PROCESSES.strip().lower() == "auto":
+        per_process = WHISPER_CPU_THREADS or DEFAULT_THREADS_PER_PROCESS
+        processes = max(1, cores // per_process)
+    else:
+        processes = max(1, int(WORKER_PROCESSES))
+
+    if WHISPER_CPU_THREADS > 0:
+        cpu_threads = WHISPER_CPU_THREADS
+    elif processes > 1:
+        cpu_threads = max(1, cores // processes)
+    else:
+        cpu_threads = 0  # let CTranslate2 pick its default
+    return processes, cpu_threads
+
+
 class TranscriptionWorker:
-    def __init__(self):
+    def __init__(self, cpu_threads: int = 0, num_workers: int = WHISPER_NUM_WORKERS, chunking: bool = False):
+        self.chunking = chunking and CHUNK_MIN_CALL_SEC > 0
         self.redis = redis.from_url(REDIS_URL, decode_responses=True)
-        self.model = None
+        self.redis_bin = redis.from_url(REDIS_URL)  # chunk PCM payloads
+        self.models = {}
+        self.model_names = {}
+        self.batchers = {}
+        self.backlog = 0
+        self.degraded = False
+        self.backlog_checked = 0.0
+        self.has_ffmpeg = None
+        self.transcript_cache = open_cache(TRANSCRIPT_CACHE_PATH, TRANSCRIPT_CACHE_MAX_MB)
+        self.analysis_cache = AnalysisCache(ANALYSIS_CACHE_TTL, ANALYSIS_CACHE_SIZE)
+        self.deepseek = DeepSeekClient(DEEPSEEK_API_KEY, DEEPSEEK_ENDPOINT, DEEPSEEK_MODEL, timeout=ANALYSIS_TIMEOUT)
+        self.analysis_sources = {'local': 0, 'llm': 0}
+        self.stats_lock = threading.Lock()
         self.running = False
+        self.cpu_threads = cpu_threads
+        self.num_workers = num_workers
         self.consumer_group = 'transcriber-group'
         self.consumer_name = f'python-worker-{uuid.uuid4().hex[:8]}'
+        self.stream_lanes = {stream: lane for lane, stream in LANE_STREAMS.items()}
 
     def load_model(self):
-        logger.info(f"Loading Faster-Whisper model: {MODEL_SIZE} on {DEVICE}...")
+        self.model_names = {'accurate': MODEL_SIZE, 'fast': WHISPER_FAST_MODEL or MODEL_SIZE}
         try:
-            self.model = WhisperModel(MODEL_SIZE, device=DEVICE, compute_type=COMPUTE_TYPE)
+            for key, name in self.model_names.items():
+                if key == 'fast' and name == MODEL_SIZE:
+                    self.models[key] = self.models['accurate']  # single-model mode
+                    continue
+                logger.info(
+                    f"Loading Faster-Whisper {key} model: {name} on {DEVICE} "
+                    f"(cpu_threads={self.cpu_threads or 'default'}, num_workers={self.num_workers})..."
+                )
+                self.models[key] = WhisperModel(
+                    name,
+                    device=DEVICE,
+                    compute_type=COMPUTE_TYPE,
+                    cpu_threads=self.cpu_threads,
+                    num_workers=self.num_workers
+                )
             logger.info("Model loaded successfully.")
+            if TRANSCRIBE_BATCH_SIZE > 1 and not batching_supported():
+                logger.warning("Batched inference needs faster-whisper 0.10 internals; transcribing per job")
+            elif TRANSCRIBE_BATCH_SIZE > 1:
+                for profile, (key, beam_size) in PROFILES.items():
+                    self.batchers[profile] = WhisperBatcher(
+                        self.models[key],
+                        max_batch_size=TRANSCRIBE_BATCH_SIZE,
+                        max_wait_ms=BATCH_MAX_WAIT_MS,
+                        beam_size=beam_size
+                    )
+                logger.info(f"Batched inference enabled (batch={TRANSCRIBE_BATCH_SIZE}, wait={BATCH_MAX_WAIT_MS}ms)")
         except Exception as e:
             logger.error(f"Failed to load model: {e}")
             raise
 
-    def setup_redis(self):
+    # -------------------------------------------------------------------------
+    # Adaptive model selection
+    # -------------------------------------------------------------------------
+    def _refresh_backlog(self):
+        """Poll unread + pending entries across the lanes, at most every BACKLOG_POLL_SEC."""
+        if not WHISPER_FAST_MODEL or time.time() - self.backlog_checked < BACKLOG_POLL_SEC:
+            return
+        self.backlog_checked = time.time()
+        backlog = 0
         try:
-            self.redis.xgroup_create('jobs:transcription', self.consumer_group, id='0', mkstream=True)
-        except redis.exceptions.ResponseError as e:
-            if "BUSYGROUP" not in str(e):
-                raise
+            for stream in LANE_STREAMS.values():
+                for group in self.redis.xinfo_groups(stream):
+                    if group['name'] != self.consumer_group:
+                        continue
+                    # `lag` (Redis 7+) counts entries not yet delivered to the group;
+                    # older servers only report pending, so fall back to XLEN there
+                    lag = group.get('lag')
+                    backlog += group['pending'] + (lag if lag is not None else self.redis.xlen(stream))
+        except Exception as e:
+            logger.warning(f"Backlog check failed: {e}")
+            return
+
+        self.backlog = backlog
+        if not self.degraded and backlog >= BACKLOG_DEGRADE_AT:
+            self.degraded = True
+            logger.warning(f"Backlog at {backlog}: degrading to {WHISPER_FAST_MODEL} with greedy decoding")
+        elif self.degraded and backlog <= BACKLOG_RECOVER_AT:
+            self.degraded = False
+            logger.info(f"Backlog down to {backlog}: back to {MODEL_SIZE}")
+
+    def _choose_profile(self, job) -> str:
+        audio = job['audio']
+        duration = len(audio) / SAMPLE_RATE if audio is not None else 0.0
+        quality = job['data'].get('settings', {}).get('quality', 'auto')
+        profile = choose_profile(duration, self.backlog, self.degraded, quality)
+        job['profile'] = profile
+        return profile
+
+    def setup_redis(self):
+        for stream in list(LANE_STREAMS.values()) + [CHUNKS_STREAM]:
+            try:
+                self.redis.xgroup_create(stream, self.consumer_group, id='0', mkstream=True)
+            except redis.exceptions.ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
 
     def _ffmpeg_available(self) -> bool:
-        try:
-            subprocess.run(["ffmpeg", "-version"], capture_output=True, check=False)
-            return True
-        except Exception:
-            return False
+        # Looked up once per process instead of forking `ffmpeg -version` per job
+        if self.has_ffmpeg is None:
+            self.has_ffmpeg = shutil.which("ffmpeg") is not None
+        return self.has_ffmpeg
 
     def download_audio(self, url: str) -> str:
         """Download audio to temp file; compress if large."""
         try:
             logger.info(f"Downloading: {url}")
-            response = requests.get(url, stream=True)
+            response = requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT)
             response.raise_for_status()
 
             suffix = os.path.splitext(url)[1] or '.wav'
@@ -119,13 +401,22 @@ class TranscriptionWorker:
         if not DEEPSEEK_API_KEY:
             return {"error": "No API key configured"}
 
-        logger.info("Analyzing transcript...")
-
         # Calculate cutoff date (simplified version of fe-bill.py logic)
         today = datetime.date.today()
         cutoff_year = today.year - 81
         cutoff_date_str = f"{today.strftime('%B %d')}, {cutoff_year}"
 
+        # Identical transcripts (voicemail, dead air) share one cached/in-flight result
+        cache_key = make_analysis_key(
+            transcript, f"{ANALYSIS_PROMPT_VERSION}:{ANALYSIS_RESPONSE_FORMAT}:{cutoff_date_str}"
+        )
+        return self.analysis_cache.get_or_compute(
+            cache_key,
+            lambda: self._request_analysis(self._build_prompt(transcript, cutoff_date_str)),
+            cacheable=lambda result: "error" not in result
+        )
+
+    def _build_prompt(self, transcript: str, cutoff_date_str: str) -> str:
         prompt_content = f"""
 Analyze the following call transcript:
 --- TRANSCRIPT START ---
@@ -182,12 +473,14 @@ Output for Application Submission:
 --- IMPORTANT INSTRUCTIONS ---
 Provide ONLY the structured output based on the format defined above.
 """.strip()
+        if ANALYSIS_RESPONSE_FORMAT == "json":
+            prompt_content += "\n\n" + json_instructions()
+        return prompt_content
 
+    def _request_analysis(self, prompt_content: str) -> dict:
+        """POST the prompt to DeepSeek and parse the structured reply."""
+        logger.info("Analyzing transcript...")
         try:
-            headers = {
-                "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-                "Content-Type": "application/json"
-            }
             messages = [
                 {
                     "role": "system",
@@ -195,87 +488,336 @@ Provide ONLY the structured output based on the format defined above.
                 },
                 {"role": "user", "content": prompt_content}
             ]
-            data = {
-                "messages": messages,
-                "model": DEEPSEEK_MODEL,
-                "max_tokens": 1024,
-                "temperature": 0.1,
-                "stream": False
-            }
-            resp = requests.post(
-                DEEPSEEK_ENDPOINT,
-                headers=headers,
-                json=data,
-                timeout=ANALYSIS_TIMEOUT
-            )
-            resp.raise_for_status()
-            result = resp.json()
-
-            analysis_text = ""
-            if "choices" in result and result["choices"]:
-                analysis_text = result["choices"][0]["message"]["content"].strip()
-
-            # Extract application submitted status
-            app_submitted = False
-            match = re.search(r'Application Submitted:\s*(Yes|No)', analysis_text, re.IGNORECASE)
-            if match:
-                app_submitted = match.group(1).lower() == "yes"
+            extra = {"response_format": {"type": "json_object"}} if ANALYSIS_RESPONSE_FORMAT == "json" else {}
+            result = self.deepseek.complete(messages, max_tokens=1024, temperature=0.1, **extra)
 
-            # Extract billable status
-            billable = False
-            match_bill = re.search(r'Billable:\s*(Yes|No)', analysis_text, re.IGNORECASE)
-            if match_bill:
-                billable = match_bill.group(1).lower() == "yes"
+            analysis_text = DeepSeekClient.content(result)
+            analysis, parsed_as = parse_analysis(analysis_text, ANALYSIS_RESPONSE_FORMAT)
+            if parsed_as != ANALYSIS_RESPONSE_FORMAT:
+                logger.warning("Analysis reply was not valid JSON; used the line parser")
 
+            usage = result.get("usage") or {}
             return {
                 "text": analysis_text,
-                "applicationSubmitted": app_submitted,
-                "billable": billable
+                "applicationSubmitted": analysis.application_submitted,
+                "billable": analysis.billable,
+                "fields": analysis.to_dict(),
+                "format": parsed_as,
+                "tokensIn": usage.get("prompt_tokens", 0),
+                "tokensOut": usage.get("completion_tokens", 0)
             }
 
         except Exception as e:
             logger.error(f"Analysis error: {e}")
             return {"error": str(e)}
 
-    def process_job(self, job_id, job_data):
-        logger.info(f"Processing job {job_id} for call {job_data.get('callId')}")
-        start_time = time.time()
-        temp_file = None
+    def _new_job(self, message_id, payload, stream=JOBS_STREAM) -> dict:
+        return {
+            'messageId': message_id,
+            'stream': stream,
+            'data': payload,
+            'startTime': time.time(),
+            'audio': None,
+            'audioFile': None,
+            'vadMap': None,
+            'partialStream': self._partial_stream_key(message_id, payload),
+            'partialSeq': 0,
+            'streamedSegments': 0
+        }
+
+    def _partial_stream_key(self, message_id, payload):
+        if not (STREAM_PARTIALS or payload.get('settings', {}).get('stream')):
+            return None
+        return f"jobs:transcription:partial:{payload.get('jobId') or message_id}"
+
+    def _publish_partial(self, job, message_type, body, pipe=None):
+        """XADD one sequenced message to the job's partial-results stream.
 
+        When `pipe` is given the commands are queued on it instead of sent.
+        """
+        key = job.get('partialStream')
+        if not key:
+            return
+        seq = job['partialSeq']
+        job['partialSeq'] = seq + 1
         try:
-            # 1. Download
-            recording_url = job_data.get('recordingUrl')
+            own_pipe = pipe is None
+            if own_pipe:
+                pipe = self.redis.pipeline(transaction=False)
+            pipe.xadd(key, {
+                'type': message_type,
+                'seq': seq,
+                'jobId': job['data'].get('jobId') or '',
+                'callId': job['data'].get('callId') or '',
+                'payload': json.dumps(body)
+            })
+            pipe.expire(key, STREAM_TTL_SEC)
+            if own_pipe:
+                pipe.execute()
+        except Exception as e:
+            logger.warning(f"Partial publish failed for {job['messageId']}: {e}")
+
+    def _stream_segments(self, job, segments):
+        """Publish the segments not yet streamed for this job."""
+        if not job.get('partialStream'):
+            return
+        fresh = segments[job['streamedSegments']:]
+        if not fresh:
+            return
+        self._publish_partial(job, 'segments', {
+            'offset': job['streamedSegments'],
+            'segments': fresh
+        })
+        job['streamedSegments'] = len(segments)
+
+    def _cleanup_audio(self, job):
+        job['audio'] = None
+        temp_file = job.get('audioFile')
+        if temp_file and os.path.exists(temp_file):
+            try:
+                os.remove(temp_file)
+            except:
+                pass
+        job['audioFile'] = None
+
+    def _download_stage(self, job):
+        """I/O stage: fetch the recording, then hand it to the Whisper stage."""
+        try:
+            recording_url = job['data'].get('recordingUrl')
             if not recording_url:
                 raise ValueError("No recordingUrl provided")
+            if AUDIO_IN_MEMORY:
+                logger.info(f"Downloading: {recording_url}")
+                buffer, audio_hash = download_bytes(recording_url, timeout=DOWNLOAD_TIMEOUT)
+            else:
+                job['audioFile'] = self.download_audio(recording_url)
+                audio_hash = hash_file(job['audioFile'])
 
-            temp_file = self.download_audio(recording_url)
+            if self._load_cached_transcript(job, audio_hash):
+                # Same audio and settings were transcribed before: skip the model
+                self._cleanup_audio(job)
+                self.analysis_pool.submit(self._analyze_stage, job)
+                return
 
-            # 2. Transcribe
-            logger.info("Starting transcription...")
-            segments, info = self.model.transcribe(
-                temp_file,
-                beam_size=5,
-                language=job_data.get('settings', {}).get('language', 'en'),
-                vad_filter=True
-            )
+            if AUDIO_IN_MEMORY:
+                if DIARIZE_ENABLED:
+                    left, right = decode_buffer(buffer, split_stereo=True)
+                    audio = (left + right) / 2
+                    # Runs while the job waits for and goes through Whisper
+                    job['diarization'] = self._submit_diarization(left, right)
+                else:
+                    audio = decode_buffer(buffer)
+                job['originalDurationSec'] = len(audio) / SAMPLE_RATE
+                # Cut dead air before the encoder; segment times are mapped back via vadMap
+                job['audio'], job['vadMap'] = trim_silence(audio)
+                if job['vadMap']:
+                    logger.info(
+                        f"VAD trim kept {len(job['audio']) / SAMPLE_RATE:.1f}s "
+                        f"of {job['originalDurationSec']:.1f}s"
+                    )
+            if self._should_chunk(job):
+                # Finished by _collect_chunks once every chunk is back
+                self._submit_chunks(job)
+                return
+            # Blocks while PIPELINE_DEPTH clips are already waiting on the model
+            self.decoded.put(job)
+        except Exception as e:
+            self._fail_job(job, e)
+
+    def _submit_diarization(self, left, right):
+        """Queue diarization, blocking while DIARIZE_WORKERS + PIPELINE_DEPTH calls already hold a slot."""
+        self.diarize_slots.acquire()
+        try:
+            future = self.diarize_pool.submit(diarize, left, right)
+        except Exception:
+            self.diarize_slots.release()
+            raise
+        future.add_done_callback(lambda _: self.diarize_slots.release())
+        return future
+
+    def _transcribe_stage(self, job):
+        """CPU stage: runs on the single transcription thread."""
+        job_data = job['data']
+        logger.info(f"Transcribing job {job['messageId']} for call {job_data.get('callId')}")
+        audio = job['audio'] if job['audio'] is not None else job['audioFile']
+        model_key, beam_size = PROFILES[self._choose_profile(job)]
+        segments, info = self.models[model_key].transcribe(
+            audio,
+            beam_size=beam_size,
+            language=job_data.get('settings', {}).get('language', 'en'),
+            vad_filter=True
+        )
+
+        # Collect results (the generator does the actual decoding work)
+        transcript_segments = []
+        last_flush = time.time()
+        for segment in segments:
+            transcript_segments.append({
+                'start': remap_time(segment.start, job['vadMap']),
+                'end': remap_time(segment.end, job['vadMap']),
+                'text': segment.text.strip()
+            })
+            if job['partialStream'] and (
+                len(transcript_segments) - job['streamedSegments'] >= STREAM_FLUSH_SEGMENTS
+                or time.time() - last_flush >= STREAM_FLUSH_SEC
+            ):
+                self._stream_segments(job, transcript_segments)
+                last_flush = time.time()
+        self._store_transcript(job, transcript_segments, info.language, info.duration)
+        job['cacheTranscript'] = True  # once speakers are labelled
+
+    def _transcript_cache_key(self, job, profile) -> str:
+        model_key, beam_size = PROFILES[profile]
+        return TranscriptCache.make_key(
+            job['audioHash'],
+            model=self.model_names[model_key],
+            compute_type=COMPUTE_TYPE,
+            beam_size=beam_size,
+            batched=bool(self.batchers),
+            vad_trim=VAD_TRIM_ENABLED,
+            language=job['data'].get('settings', {}).get('language', 'en')
+        )
+
+    def _load_cached_transcript(self, job, audio_hash) -> bool:
+        """Reuse a transcript of the same audio, best profile first.
+
+        Jobs that ask for accurate quality only take an accurate transcript;
+        the others take any profile, as they may be degraded anyway.
+        """
+        if not self.transcript_cache:
+            return False
+        job['audioHash'] = audio_hash
+        quality = (job['data'].get('settings', {}).get('quality') or 'auto').lower()
+        profiles = ['accurate'] if quality in ('accurate', 'high') else list(PROFILES)
+        cached = None
+        try:
+            for profile in profiles:
+                cached = self.transcript_cache.get(self._transcript_cache_key(job, profile))
+                if cached is not None:
+                    job['profile'] = profile
+                    break
+        except Exception as e:
+            logger.warning(f"Transcript cache read failed: {e}")
+            return False
+        if cached is None:
+            return False
+        logger.info(f"Transcript cache hit for job {job['messageId']} ({job['profile']})")
+        self._store_transcript(job, cached['segments'], cached['language'], cached['durationSec'])
+        job['transcriptCached'] = True
+        return True
+
+    def _cache_transcript(self, job):
+        if not self.transcript_cache or not job.get('audioHash'):
+            return
+        try:
+            self.transcript_cache.put(self._transcript_cache_key(job, job['profile']), {
+                'segments': job['segments'],
+                'language': job['language'],
+                'durationSec': job['durationSec']
+            })
+        except Exception as e:
+            logger.warning(f"Transcript cache write failed: {e}")
+
+    def _store_transcript(self, job, segments, language, duration):
+        job['language'] = language
+        if job['vadMap']:
+            job['speechSec'] = duration
+            duration = job['originalDurationSec']  # report the recording, not the trimmed audio
+        job['durationSec'] = duration
+        job['segments'] = segments
+        job['fullText'] = " ".join(segment['text'] for segment in segments)
+        self._stream_segments(job, segments)
 
-            # Collect results
-            transcript_segments = []
-            full_text = []
+    def _label_speakers(self, job):
+        """Attach diarization speakers (analysis stage); cached segments keep the labels they were stored with.
 
-            for segment in segments:
-                transcript_segments.append({
-                    'start': segment.start,
-                    'end': segment.end,
-                    'text': segment.text.strip(),
-                    'speaker': None
+        Streamed segments went out unlabelled, so the labels are published
+        as one `speakers` message.
+        """
+        segments = job['segments']
+        future = job.pop('diarization', None)
+        if future is not None:
+            try:
+                diarization = future.result(timeout=DIARIZE_TIMEOUT_SEC)
+                label_segments(segments, diarization)
+                job['diarizationMethod'] = diarization['method']
+                self._publish_partial(job, 'speakers', {
+                    'method': diarization['method'],
+                    'speakers': [segment.get('speaker') for segment in segments]
                 })
-                full_text.append(segment.text.strip())
+                return
+            except Exception as e:
+                logger.warning(f"Diarization failed for job {job['messageId']}: {e}")
+        for segment in segments:
+            segment.setdefault('speaker', None)
+
+    def _analysis_text(self, job) -> str:
+        """Transcript sent to DeepSeek.
 
-            full_transcript_text = " ".join(full_text)
+        Uses speaker turns when diarization found roles, and only the
+        keyword-relevant windows of long calls (see prompt_compaction).
+        """
+        segments = job['segments']
+        labeled = ANALYSIS_TRANSCRIPT != 'plain' and any(s.get('speaker') == 'prospect' for s in segments)
+        if labeled and ANALYSIS_TRANSCRIPT == 'prospect':
+            segments = [s for s in segments if s.get('speaker') == 'prospect'] or segments
 
-            # 3. Analyze
-            analysis_result = self.analyze_transcript(full_transcript_text)
+        compacted, job['compaction'] = compact_segments(segments, with_speakers=labeled)
+        if compacted is not None:
+            info = job['compaction']
+            logger.info(f"Compacted job {job['messageId']} prompt to {info['keptWords']}/{info['totalWords']} words")
+            return compacted
+        if labeled:
+            return speaker_transcript(segments)
+        return job['fullText'] if segments is job['segments'] else " ".join(s['text'] for s in segments)
+
+    def _submit_batched(self, job):
+        """Queue the job's speech windows on the batcher instead of transcribing inline."""
+        job_data = job['data']
+        logger.info(f"Batching job {job['messageId']} for call {job_data.get('callId')}")
+        audio = job['audio'] if job['audio'] is not None else decode_audio(job['audioFile'])
+        job['audio'] = audio
+        batcher = self.batchers[self._choose_profile(job)]
+        future = batcher.submit(audio, job_data.get('settings', {}).get('language', 'en'))
+        future.add_done_callback(lambda f: self._on_batched(job, f))
+
+    def _on_batched(self, job, future):
+        try:
+            segments, info = future.result()
+            remap_segments(segments, job['vadMap'])
+            self._store_transcript(job, segments, info['language'], info['duration'])
+            job['cacheTranscript'] = True
+        except Exception as e:
+            self._fail_job(job, e)
+            return
+        self.analysis_pool.submit(self._analyze_stage, job)
+
+    def _record_analysis_source(self, source: str):
+        with self.stats_lock:
+            self.analysis_sources[source] += 1
+            total = sum(self.analysis_sources.values())
+            skipped = self.analysis_sources['local']
+        if PRECLASSIFY_REPORT_EVERY and total % PRECLASSIFY_REPORT_EVERY == 0:
+            logger.info(f"Pre-classifier skipped {skipped}/{total} LLM calls ({skipped / total:.0%})")
+
+    def _analyze_stage(self, job):
+        """I/O stage: speaker labels, local pre-classification or DeepSeek analysis, then publish and ack."""
+        try:
+            self._label_speakers(job)
+            if job.pop('cacheTranscript', False):
+                self._cache_transcript(job)
+            analysis_result = preclassify(job['fullText']) if PRECLASSIFY_ENABLED else None
+            if analysis_result is None:
+                analysis_result = self.analyze_transcript(self._analysis_text(job))
+                analysis_result['source'] = 'llm'
+            else:
+                logger.info(f"Job {job['messageId']} classified locally: {analysis_result['reason']}")
+            analysis_result.setdefault('tokensIn', 0)
+            analysis_result.setdefault('tokensOut', 0)
+            self._record_analysis_source(analysis_result['source'])
+            job_data = job['data']
+            full_transcript_text = job['fullText']
+            transcript_segments = job['segments']
 
             result = {
                 'ok': True,
@@ -283,73 +825,613 @@ Provide ONLY the structured output based on the format defined above.
                 'callId': job_data.get('callId'),
                 'tenantId': job_data.get('tenantId'),
                 'engine': 'faster-whisper',
-                'language': info.language,
-                'durationSec': info.duration,
+                'model': self.model_names[PROFILES[job['profile']][0]],
+                'language': job['language'],
+                'durationSec': job['durationSec'],
                 'fullText': full_transcript_text,
                 'segments': transcript_segments,
                 'stats': {
                     'numSegments': len(transcript_segments),
                     'numWords': len(full_transcript_text.split()),
-                    'latencyMs': int((time.time() - start_time) * 1000)
+                    'latencyMs': int((time.time() - job['startTime']) * 1000),
+                    'transcriptCached': job.get('transcriptCached', False),
+                    'analysisCached': analysis_result.get('cached', False),
+                    'profile': job['profile'],
+                    'beamSize': PROFILES[job['profile']][1],
+                    'backlog': self.backlog,
+                    'speechSec': job.get('speechSec', job['durationSec']),
+                    'diarization': job.get('diarizationMethod'),
+                    'compaction': job.get('compaction'),
+                    'tokensIn': analysis_result['tokensIn'],
+                    'tokensOut': analysis_result['tokensOut']
                 },
                 'analysis': analysis_result
             }
+            self._complete_job(job, result)
+            logger.info(f"Job {job['messageId']} completed successfully.")
+        except Exception as e:
+            self._fail_job(job, e)
+
+    # -------------------------------------------------------------------------
+    # Long-call chunking
+    # -------------------------------------------------------------------------
+    def _should_chunk(self, job) -> bool:
+        return (self.chunking and job['audio'] is not None
+                and len(job['audio']) >= CHUNK_MIN_CALL_SEC * SAMPLE_RATE)
+
+    def _submit_chunks(self, job):
+        """Publish the job's chunks for any worker and wait for them off-thread.
+
+        Runs on the download pool, so encoding and uploading the PCM never
+        holds up the model.
+        """
+        audio = job['audio']
+        self._choose_profile(job)
+        chunks = plan_chunks(audio)
+        # Unique per attempt so a reclaimed job never mixes results with its predecessor
+        chunk_key = f"jobs:transcription:chunk:{job['data'].get('jobId') or job['messageId']}:{uuid.uuid4().hex[:8]}"
+        logger.info(f"Splitting job {job['messageId']} ({len(audio) / SAMPLE_RATE:.0f}s) into {len(chunks)} chunks")
+
+        language = job['data'].get('settings', {}).get('language', 'en')
+        job['chunks'] = chunks
+        job['chunkKey'] = chunk_key
+        job['chunkTasks'] = [
+            {'chunkKey': chunk_key, 'index': index, 'offsetSec': start / SAMPLE_RATE,
+             'profile': job['profile'], 'language': language}
+            for index, (start, _) in enumerate(chunks)
+        ]
+        job['audioSec'] = len(audio) / SAMPLE_RATE
+        # Fixed before the keys are written, so their CHUNK_TTL_SEC outlives the wait
+        job['chunkDeadline'] = time.time() + CHUNK_TIMEOUT_SEC
 
-            # 4. Publish result
-            self.redis.xadd('jobs:transcription:results', {'payload': json.dumps(result)})
-            logger.info(f"Job {job_id} completed successfully.")
+        pipe = self.redis_bin.pipeline(transaction=False)
+        pipe.delete(f"{chunk_key}:done")
+        for task, (start, end) in zip(job['chunkTasks'], chunks):
+            pipe.set(f"{chunk_key}:{task['index']}", encode_pcm(audio[start:end]), ex=CHUNK_TTL_SEC)
+            pipe.xadd(CHUNKS_STREAM, {'payload': json.dumps(task)})
+        try:
+            replies = pipe.execute()
+        except Exception:
+            self._drop_chunks(job)
+            raise
+        job['chunkIds'] = [message_id.decode() for message_id in replies[2::2]]
+        self._cleanup_audio(job)
+        self.chunk_wait_pool.submit(self._collect_chunks, job)
+
+    def _collect_chunks(self, job):
+        """Wait for every chunk result, stitch them, then continue to analysis."""
+        try:
+            results = {}
+            self._await_chunks(job, results, job['chunkDeadline'])
+            if len(results) < len(job['chunks']):
+                taken = self._take_back_chunks(job, results)
+                # Without any chunk of our own queued, only wait for a result pushed just now
+                self._await_chunks(job, results, time.time() + (CHUNK_TIMEOUT_SEC if taken else 5))
+            if len(results) < len(job['chunks']):
+                raise TimeoutError(f"{len(job['chunks']) - len(results)} chunks not transcribed in time")
 
+            segments = stitch_segments([
+                (start, end, results[index]['segments'])
+                for index, (start, end) in enumerate(job['chunks'])
+            ])
+            remap_segments(segments, job['vadMap'])
+            self._store_transcript(job, segments, results[0]['language'], job['audioSec'])
+            job['cacheTranscript'] = True
         except Exception as e:
-            logger.error(f"Job {job_id} failed: {e}")
-            error_result = {
-                'ok': False,
-                'jobId': job_data.get('jobId'),
-                'callId': job_data.get('callId'),
-                'tenantId': job_data.get('tenantId'),
-                'error': str(e)
-            }
-            self.redis.xadd('jobs:transcription:results', {'payload': json.dumps(error_result)})
+            self._fail_job(job, e)
+            return
         finally:
-            if temp_file and os.path.exists(temp_file):
+            self._drop_chunks(job)
+        self.analysis_pool.submit(self._analyze_stage, job)
+
+    def _await_chunks(self, job, results, deadline):
+        """Collect chunk results into `results` until all are in or `deadline` passes."""
+        while len(results) < len(job['chunks']):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return
+            item = self.redis.blpop(f"{job['chunkKey']}:done", timeout=min(remaining, 5))
+            if item is None:
+                continue
+            result = json.loads(item[1])
+            if result.get('error'):
+                raise RuntimeError(f"Chunk {result['index']} failed: {result['error']}")
+            results[result['index']] = result
+
+    def _take_back_chunks(self, job, results) -> int:
+        """Queue the job's unfinished chunks on our own model; returns how many.
+
+        Taking the PCM makes any worker that reads the chunk later skip it; one
+        already transcribing it just pushes a result we no longer need.
+        """
+        taken = 0
+        for task, message_id in zip(job['chunkTasks'], job['chunkIds']):
+            if task['index'] in results:
+                continue
+            data = self.redis_bin.getdel(f"{job['chunkKey']}:{task['index']}")
+            if data is None:
+                continue  # finished just now, or lost to a Redis eviction
+            with self.slots:
+                self.chunk_ids.add(message_id)
+            self.chunk_queue.put({'chunk': task, 'messageId': message_id, 'audio': decode_pcm(data)})
+            taken += 1
+        if taken:
+            logger.warning(f"Transcribing {taken} unfinished chunks of job {job['messageId']} locally")
+        return taken
+
+    def _drop_chunks(self, job):
+        """Free the chunk PCM and stream entries of a finished or failed job."""
+        try:
+            keys = [f"{job['chunkKey']}:{index}" for index in range(len(job['chunks']))]
+            self.redis_bin.delete(f"{job['chunkKey']}:done", *keys)
+            if job.get('chunkIds'):
+                self.redis.xdel(CHUNKS_STREAM, *job['chunkIds'])
+        except Exception as e:
+            logger.warning(f"Could not delete chunks of job {job['messageId']}: {e}")
+
+    def _chunk_reader_loop(self):
+        """Keep one chunk task queued ahead of the local model's own jobs.
+
+        Keeps going while stopping until our own jobs are done, since their
+        chunks may still be waiting for a model.
+        """
+        while self.running or self.active > 0:
+            if not self.chunk_queue.empty():
+                time.sleep(0.2)
+                continue
+            try:
+                entries = self.redis.xreadgroup(self.consumer_group, self.consumer_name,
+                                                {CHUNKS_STREAM: '>'}, count=1, block=1000)
+            except Exception as e:
+                logger.error(f"Chunk reader error: {e}")
+                time.sleep(1)
+                continue
+            for _, messages in entries or []:
+                for message_id, fields in messages:
+                    self._enqueue_chunk(message_id, fields)
+
+    def _enqueue_chunk(self, message_id, fields):
+        task = None
+        try:
+            task = json.loads(fields['payload'])
+            data = self.redis_bin.get(f"{task['chunkKey']}:{task['index']}")
+        except Exception as e:
+            logger.error(f"Dropping chunk {message_id}: {e}")
+            if task and 'chunkKey' in task:
+                # Let the owning job fail now instead of at CHUNK_TIMEOUT_SEC
+                pipe = self.redis.pipeline(transaction=False)
+                pipe.rpush(f"{task['chunkKey']}:done", json.dumps({'index': task.get('index'), 'error': str(e)}))
+                pipe.expire(f"{task['chunkKey']}:done", CHUNK_TTL_SEC)
+                pipe.execute()
+            self.redis.xack(CHUNKS_STREAM, self.consumer_group, message_id)
+            return
+        if data is None:
+            # The owner took it back, or its job is already over
+            self.redis.xack(CHUNKS_STREAM, self.consumer_group, message_id)
+            return
+        with self.slots:
+            self.chunk_ids.add(message_id)
+        self.chunk_queue.put({'chunk': task, 'messageId': message_id, 'audio': decode_pcm(data)})
+
+    def _transcribe_chunk(self, chunk_job):
+        """Transcribe one chunk for whichever worker owns the job and hand back its segments."""
+        task = chunk_job['chunk']
+        result = {'index': task['index']}
+        try:
+            model_key, beam_size = PROFILES[task['profile']]
+            segments, info = self.models[model_key].transcribe(
+                chunk_job['audio'], beam_size=beam_size, language=task['language'], vad_filter=True
+            )
+            offset = task['offsetSec']
+            result['segments'] = [
+                {'start': segment.start + offset, 'end': segment.end + offset, 'text': segment.text.strip()}
+                for segment in segments
+            ]
+            result['language'] = info.language
+        except Exception as e:
+            logger.error(f"Chunk {task['chunkKey']}:{task['index']} failed: {e}")
+            result['error'] = str(e)
+
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.rpush(f"{task['chunkKey']}:done", json.dumps(result))
+        pipe.expire(f"{task['chunkKey']}:done", CHUNK_TTL_SEC)
+        pipe.xack(CHUNKS_STREAM, self.consumer_group, chunk_job['messageId'])
+        pipe.execute()
+        self.redis_bin.delete(f"{task['chunkKey']}:{task['index']}")
+        with self.slots:
+            self.chunk_ids.discard(chunk_job['messageId'])
+
+    def _next_model_job(self):
+        """Chunks first, since other workers' calls are waiting on them; None to stop."""
+        while True:
+            try:
+                return self.chunk_queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                job = self.decoded.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            if job is None and not self.chunk_queue.empty():
+                # Finish the chunks queued here before stopping
+                self.decoded.put(None)
+                continue
+            return job
+
+    def _transcribe_loop(self):
+        """Feed the model from the decoded queue so it never waits on the network."""
+        while True:
+            job = self._next_model_job()
+            if job is None:
+                break
+            if 'chunk' in job:
                 try:
-                    os.remove(temp_file)
-                except:
-                    pass
+                    self._transcribe_chunk(job)
+                except Exception as e:
+                    logger.error(f"Error publishing chunk {job['messageId']}: {e}")
+                continue
+            try:
+                if self.batchers:
+                    # The batcher thread hands the job to analysis when its windows finish
+                    self._submit_batched(job)
+                    continue
+                self._transcribe_stage(job)
+            except Exception as e:
+                self._fail_job(job, e)
+                continue
+            finally:
+                self._cleanup_audio(job)
+            self.analysis_pool.submit(self._analyze_stage, job)
+
+    def _fail_job(self, job, error):
+        logger.error(f"Job {job['messageId']} failed: {error}")
+        job_data = job['data']
+        error_result = {
+            'ok': False,
+            'jobId': job_data.get('jobId'),
+            'callId': job_data.get('callId'),
+            'tenantId': job_data.get('tenantId'),
+            'error': str(error)
+        }
+        self._cleanup_audio(job)
+        self._complete_job(job, error_result)
+
+    def _complete_job(self, job, result):
+        """Publish the result and XACK in one MULTI: the last step of the pipeline."""
+        try:
+            pipe = self.redis.pipeline(transaction=True)
+            if job.get('partialStream'):
+                result['partialStream'] = job['partialStream']
+                self._publish_partial(job, 'final', {
+                    'ok': result['ok'],
+                    'error': result.get('error'),
+                    'numSegments': len(job.get('segments') or []),
+                    'durationSec': job.get('durationSec'),
+                    'latencyMs': int((time.time() - job['startTime']) * 1000)
+                }, pipe=pipe)
+            pipe.xadd(RESULTS_STREAM, {'payload': json.dumps(result)})
+            pipe.xack(job['stream'], self.consumer_group, job['messageId'])
+            pipe.execute()
+        except Exception as e:
+            # Left pending: the reclaimer hands it to a consumer after RECLAIM_IDLE_MS
+            logger.error(f"Error publishing result for {job['messageId']}: {e}")
+        finally:
+            self._release_slot(job)
+
+    def _enqueue(self, stream, message_id, fields):
+        """Queue a freshly read (or reclaimed) message in its lane for scheduling."""
+        try:
+            if not fields:
+                raise ValueError("message has no fields (deleted from the stream)")
+            payload = json.loads(fields['payload'])
+        except Exception as e:
+            logger.error(f"Error processing message {message_id}: {e}")
+            self.redis.xack(stream, self.consumer_group, message_id)
+            return
+
+        with self.slots:
+            self.held_ids.add((stream, message_id))
+        self.scheduler.push(self.stream_lanes[stream], payload.get('tenantId') or 'default',
+                            (stream, message_id, payload))
+
+    def _dispatch_ready(self):
+        """Start scheduled jobs until the pipeline or every eligible lane/tenant is full."""
+        while True:
+            with self.slots:
+                if self.active >= MAX_INFLIGHT_JOBS:
+                    return
+                picked = self.scheduler.pop()
+                if picked is None:
+                    return
+                self.active += 1
+            lane, tenant, (stream, message_id, payload) = picked
+            job = self._new_job(message_id, payload, stream)
+            job['lane'] = lane
+            job['tenant'] = tenant
+            logger.info(f"Processing {lane} job {message_id} for tenant {tenant}, call {payload.get('callId')}")
+            self.download_pool.submit(self._download_stage, job)
+
+    # -------------------------------------------------------------------------
+    # In-flight accounting
+    # -------------------------------------------------------------------------
+    def _lane_room(self, lane) -> int:
+        free = max(0, MAX_INFLIGHT_JOBS - self.active)
+        return free + LANE_LOOKAHEAD - self.scheduler.queued(lane)
+
+    def _release_slot(self, job):
+        with self.slots:
+            self.held_ids.discard((job['stream'], job['messageId']))
+            if job.get('lane'):
+                self.active -= 1
+                self.scheduler.done(job['lane'], job['tenant'])
+            self.slots.notify_all()
+        if job.get('lane'):
+            # A finished job may unblock its tenant or lane; start the next one now
+            self._dispatch_ready()
+
+    # -------------------------------------------------------------------------
+    # Pending-entry reclaim
+    # -------------------------------------------------------------------------
+    def _reclaim_loop(self):
+        """Keep our own pending entries fresh and adopt ones from dead consumers."""
+        cursors = {stream: '0-0' for stream in LANE_STREAMS.values()}
+        while self.running:
+            time.sleep(RECLAIM_INTERVAL_SEC)
+            try:
+                self._heartbeat_pending()
+                cursors = self._reclaim_idle(cursors)
+                if self.chunking:
+                    self._reclaim_chunks()
+                self._expire_consumers()
+            except Exception as e:
+                logger.error(f"Reclaimer error: {e}")
+
+    def _heartbeat_pending(self):
+        """Reset the idle time of entries still in our pipeline.
+
+        Long calls can take longer than RECLAIM_IDLE_MS; re-claiming them to
+        ourselves stops other workers from stealing live work.
+        """
+        with self.slots:
+            held = list(self.held_ids) + [(CHUNKS_STREAM, message_id) for message_id in self.chunk_ids]
+        for stream in list(LANE_STREAMS.values()) + [CHUNKS_STREAM]:
+            message_ids = [message_id for held_stream, message_id in held if held_stream == stream]
+            if message_ids:
+                self.redis.xclaim(stream, self.consumer_group, self.consumer_name,
+                                  min_idle_time=0, message_ids=message_ids, justid=True)
+
+    def _reclaim_idle(self, cursors):
+        for lane, stream in LANE_STREAMS.items():
+            room = self._lane_room(lane)
+            if room <= 0:
+                continue
+            response = self.redis.xautoclaim(stream, self.consumer_group, self.consumer_name,
+                                             min_idle_time=RECLAIM_IDLE_MS, start_id=cursors[stream],
+                                             count=room)
+            cursors[stream], messages = response[0], response[1]
+            # Redis 7 also returns ids that were deleted from the stream; drop them
+            deleted = response[2] if len(response) > 2 else []
+            if deleted:
+                self.redis.xack(stream, self.consumer_group, *deleted)
+
+            for message_id, fields in messages:
+                with self.slots:
+                    if (stream, message_id) in self.held_ids:
+                        continue  # already queued or running here
+                if self._exceeded_deliveries(stream, message_id, fields):
+                    continue
+                logger.warning(f"Reclaimed stale {lane} job {message_id}")
+                self._enqueue(stream, message_id, fields)
+        self._dispatch_ready()
+        return cursors
+
+    def _reclaim_chunks(self):
+        """Adopt one chunk abandoned by a dead worker unless one is already queued here."""
+        if not self.chunk_queue.empty():
+            return
+        response = self.redis.xautoclaim(CHUNKS_STREAM, self.consumer_group, self.consumer_name,
+                                         min_idle_time=RECLAIM_IDLE_MS, start_id='0-0', count=1)
+        for message_id, fields in response[1]:
+            with self.slots:
+                if message_id in self.chunk_ids:
+                    continue
+            logger.warning(f"Reclaimed stale chunk {message_id}")
+            if fields:
+                self._enqueue_chunk(message_id, fields)
+            else:
+                self.redis.xack(CHUNKS_STREAM, self.consumer_group, message_id)
+
+    def _exceeded_deliveries(self, stream, message_id, fields) -> bool:
+        """Dead-letter entries that keep killing workers instead of looping forever."""
+        pending = self.redis.xpending_range(stream, self.consumer_group,
+                                            min=message_id, max=message_id, count=1)
+        if not pending or pending[0]['times_delivered'] <= RECLAIM_MAX_DELIVERIES:
+            return False
+        try:
+            payload = json.loads(fields['payload']) if fields else {}
+        except Exception:
+            payload = {}
+        job = self._new_job(message_id, payload, stream)
+        with self.slots:
+            self.held_ids.add((stream, message_id))
+        self._fail_job(job, RuntimeError(
+            f"Gave up after {pending[0]['times_delivered']} deliveries"
+        ))
+        return True
+
+    def _expire_consumers(self):
+        """Remove consumers (old python-worker-xxxx names) with nothing pending."""
+        for stream in list(LANE_STREAMS.values()) + [CHUNKS_STREAM]:
+            for consumer in self.redis.xinfo_consumers(stream, self.consumer_group):
+                if (consumer['name'] != self.consumer_name and consumer['pending'] == 0
+                        and consumer['idle'] > CONSUMER_EXPIRE_MS):
+                    self.redis.xgroup_delconsumer(stream, self.consumer_group, consumer['name'])
+                    logger.info(f"Removed idle consumer {consumer['name']} from {stream}")
+
+    def start_pipeline(self):
+        self.decoded = queue.Queue(maxsize=PIPELINE_DEPTH)
+        self.chunk_queue = queue.Queue()  # chunk tasks, served before `decoded`
+        self.slots = threading.Condition()
+        self.held_ids = set()   # (stream, id) queued in the scheduler or running
+        self.active = 0         # jobs handed to the download stage
+        self.chunk_ids = set()  # chunk tasks queued on or running in our model
+        self.scheduler = FairScheduler(
+            [(lane, LANE_WEIGHTS.get(lane, 1.0),
+              max(1, int(MAX_INFLIGHT_JOBS * BACKFILL_MAX_SHARE)) if lane == 'backfill' else 0)
+             for lane in LANE_STREAMS],
+            tenant_max_inflight=TENANT_MAX_INFLIGHT,
+            tenant_weights=TENANT_WEIGHTS
+        )
+        self.download_pool = ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS, thread_name_prefix='download')
+        self.analysis_pool = ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix='analysis')
+        self.diarize_pool = ThreadPoolExecutor(max_workers=DIARIZE_WORKERS, thread_name_prefix='diarize')
+        self.diarize_slots = threading.BoundedSemaphore(DIARIZE_WORKERS + PIPELINE_DEPTH)
+        self.chunk_wait_pool = ThreadPoolExecutor(max_workers=MAX_INFLIGHT_JOBS, thread_name_prefix='chunk-wait')
+        self.transcribe_thread = threading.Thread(target=self._transcribe_loop, name='transcribe', daemon=True)
+        self.transcribe_thread.start()
+        self.reclaim_thread = threading.Thread(target=self._reclaim_loop, name='reclaimer', daemon=True)
+        self.reclaim_thread.start()
+        if self.chunking:
+            self.chunk_thread = threading.Thread(target=self._chunk_reader_loop, name='chunk-reader', daemon=True)
+            self.chunk_thread.start()
+
+    def drain_pipeline(self):
+        """Wait for every running job to publish, then stop the stage threads.
+
+        Jobs still queued in the scheduler stay pending and are reclaimed by
+        another consumer after RECLAIM_IDLE_MS.
+        """
+        with self.slots:
+            self.slots.wait_for(lambda: self.active == 0)
+            queued = len(self.held_ids)
+        if queued:
+            logger.info(f"Leaving {queued} queued jobs pending for reclaim")
+        self.decoded.put(None)
+        self.transcribe_thread.join()
+        self.chunk_wait_pool.shutdown(wait=True)
+        self.diarize_pool.shutdown(wait=True)
+        self.download_pool.shutdown(wait=True)
+        self.analysis_pool.shutdown(wait=True)
+
+    def stop(self, *args):
+        """Finish in-flight jobs, then leave the read loop."""
+        logger.info(f"Worker {self.consumer_name} stopping...")
+        self.running = False
 
     def run(self):
         self.load_model()
         self.setup_redis()
         self.running = True
+        self.start_pipeline()
 
         logger.info(f"Worker {self.consumer_name} started. Waiting for jobs...")
 
         while self.running:
+            # Read only into lanes whose local queue has room; realtime is listed
+            # first so a busy backfill stream never delays its reads
+            rooms = {lane: self._lane_room(lane) for lane in LANE_STREAMS}
+            streams = {LANE_STREAMS[lane]: '>' for lane, room in rooms.items() if room > 0}
+            if not streams:
+                with self.slots:
+                    self.slots.wait(timeout=1)
+                continue
             try:
                 entries = self.redis.xreadgroup(
                     self.consumer_group,
                     self.consumer_name,
-                    {'jobs:transcription': '>'},
-                    count=1,
+                    streams,
+                    count=min(room for room in rooms.values() if room > 0),
                     block=1000
                 )
-
-                if not entries:
-                    continue
-
-                for stream, messages in entries:
-                    for message_id, fields in messages:
-                        try:
-                            payload = json.loads(fields['payload'])
-                            self.process_job(message_id, payload)
-                            self.redis.xack('jobs:transcription', self.consumer_group, message_id)
-                        except Exception as e:
-                            logger.error(f"Error processing message {message_id}: {e}")
-                            self.redis.xack('jobs:transcription', self.consumer_group, message_id)
-
             except Exception as e:
                 logger.error(f"Worker loop error: {e}")
                 time.sleep(1)
+                continue
 
-if __name__ == "__main__":
-    worker = TranscriptionWorker()
+            for stream, messages in entries or []:
+                for message_id, fields in messages:
+                    self._enqueue(stream, message_id, fields)
+            self._dispatch_ready()
+            self._refresh_backlog()
+
+        self.drain_pipeline()
+        logger.info(f"Worker {self.consumer_name} stopped.")
+
+
+def _run_child(cpu_threads: int, num_workers: int):
+    """Entry point for a supervised child process."""
+    # Siblings share the chunk stream, so long calls are split across them
+    worker = TranscriptionWorker(cpu_threads=cpu_threads, num_workers=num_workers, chunking=True)
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor handles Ctrl-C
     worker.run()
+
+
+class WorkerSupervisor:
+    """Runs N TranscriptionWorker processes that share the consumer group.
+
+    Every child loads its own WhisperModel replica and reads the lane
+    streams under a unique consumer name, so Redis spreads jobs
+    across them. Children that die are restarted after CHILD_RESTART_DELAY.
+    """
+
+    def __init__(self, processes: int, cpu_threads: int, num_workers: int = WHISPER_NUM_WORKERS):
+        self.processes = processes
+        self.cpu_threads = cpu_threads
+        self.num_workers = num_workers
+        self.ctx = multiprocessing.get_context('spawn')
+        self.children = {}
+        self.running = False
+
+    def _spawn(self, index: int):
+        proc = self.ctx.Process(
+            target=_run_child,
+            args=(self.cpu_threads, self.num_workers),
+            name=f'transcriber-{index}',
+            daemon=False
+        )
+        proc.start()
+        self.children[index] = proc
+        logger.info(f"Started child {proc.name} (pid {proc.pid})")
+
+    def stop(self, *args):
+        self.running = False
+
+    def run(self):
+        logger.info(
+            f"Supervisor starting {self.processes} workers "
+            f"({self.cpu_threads} cpu_threads each, {available_cores()} cores available)"
+        )
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.running = True
+
+        for index in range(self.processes):
+            self._spawn(index)
+
+        while self.running:
+            time.sleep(1)
+            for index, proc in list(self.children.items()):
+                if not proc.is_alive() and self.running:
+                    logger.error(f"Child {proc.name} exited with code {proc.exitcode}; restarting")
+                    time.sleep(CHILD_RESTART_DELAY)
+                    self._spawn(index)
+
+        logger.info("Supervisor shutting down children...")
+        for proc in self.children.values():
+            if proc.is_alive():
+                proc.terminate()
+        for proc in self.children.values():
+            proc.join(timeout=ANALYSIS_TIMEOUT + MAX_FFMPEG_SECONDS)
+            if proc.is_alive():
+                proc.kill()
+
+
+if __name__ == "__main__":
+    processes, cpu_threads = plan_process_pool()
+    if processes > 1:
+        WorkerSupervisor(processes, cpu_threads).run()
+    else:
+        worker = TranscriptionWorker(cpu_threads=cpu_threads, chunking=CHUNK_ACROSS_HOSTS)
+        signal.signal(signal.SIGTERM, worker.stop)
+        worker.run()
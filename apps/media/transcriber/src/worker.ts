@@ -152,6 +152,8 @@ export class TranscriberWorker {
           diarize: true,
           model: 'tiny',
           language: 'en',
+          // Python worker streams segments to jobs:transcription:partial:<jobId>
+          stream: process.env.TRANSCRIBE_STREAM_PARTIALS === 'true',
         },
         originalMessageId: messageId,
       };
@@ -1,8 +1,12 @@
-import subprocess, time, json, random, os
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock
+import asyncio, time, json, random, os, uuid
 import logging
+import signal
+from typing import Iterable
 from dotenv import load_dotenv
+from esl_client import ESLPool, ESLError
+from live_channels import LiveChannels, CHANNEL_EVENTS
+from pacing import PacingController
+from lead_store import LeadStore
 
 # Load environment variables from .env file
 load_dotenv()
@@ -35,6 +39,18 @@ LEAD_FILE = os.getenv('LEAD_FILE', '/opt/hopwhistle/test_lead.txt')
 PROGRESS_FILE = os.getenv('PROGRESS_FILE', '/opt/hopwhistle/already_called.log')
 PAUSE_FLAG = os.getenv('PAUSE_FLAG', '/opt/hopwhistle/pause.flag')
 STATUS_FILE = os.getenv('STATUS_FILE', '/opt/hopwhistle/dialer_status.json')
+CALL_LOG_FILE = os.getenv('CALL_LOG_FILE', '/opt/hopwhistle/call_outcomes.jsonl')
+
+# --- LEAD STORE ---
+# Leads are dialed from a SQLite index; LEAD_FILE is rescanned only when it
+# changes. A lead is committed as dialing before its originate; outcomes are
+# committed, and appended to PROGRESS_FILE, every LEAD_COMMIT_EVERY calls or
+# LEAD_COMMIT_SEC seconds. Deleting or editing PROGRESS_FILE re-dials the
+# numbers no longer in it (picked up at the next batch).
+LEAD_DB = os.getenv('LEAD_DB', '/opt/hopwhistle/leads.sqlite3')
+LEAD_FETCH_SIZE = int(os.getenv('LEAD_FETCH_SIZE', '500'))
+LEAD_COMMIT_EVERY = int(os.getenv('LEAD_COMMIT_EVERY', '50'))
+LEAD_COMMIT_SEC = float(os.getenv('LEAD_COMMIT_SEC', '2'))
 
 # --- CONCURRENCY SETTINGS ---
 MAX_CONCURRENT_CALLS = int(os.getenv('MAX_CONCURRENT_CALLS', '10'))
@@ -42,19 +58,45 @@ CALL_DELAY_MIN = float(os.getenv('CALL_DELAY_MIN', '3.0'))
 CALL_DELAY_MAX = float(os.getenv('CALL_DELAY_MAX', '6.0'))
 STAGGER_INITIAL_CALLS = os.getenv('STAGGER_INITIAL_CALLS', 'true').lower() == 'true'
 
+# --- PACING ---
+# "fixed": random CALL_DELAY_MIN..CALL_DELAY_MAX sleep between dials.
+# "predictive": dial from rolling answer / human rates so the expected share
+# of human transfers that find no free agent stays under PACING_TARGET_ABANDON;
+# measured abandonment above PACING_MAX_ABANDON (hard cap) drops to one dial
+# per free agent. MAX_CONCURRENT_CALLS and PACING_MAX_CPS still apply.
+PACING_MODE = os.getenv('PACING_MODE', 'fixed').lower()
+AGENT_SEATS = int(os.getenv('AGENT_SEATS', '1'))
+PACING_TARGET_ABANDON = float(os.getenv('PACING_TARGET_ABANDON', '0.02'))
+PACING_MAX_ABANDON = float(os.getenv('PACING_MAX_ABANDON', '0.03'))
+PACING_MAX_CPS = float(os.getenv('PACING_MAX_CPS', '1.0'))
+PACING_WINDOW = int(os.getenv('PACING_WINDOW', '200'))            # finished calls in the rolling rates
+PACING_MIN_SAMPLES = int(os.getenv('PACING_MIN_SAMPLES', '30'))   # one dial per free agent until then
+PACING_SCREEN_SEC = float(os.getenv('PACING_SCREEN_SEC', '25'))   # handler.lua greeting + record + AI verdict
+PACING_MIN_TRANSFER_SEC = float(os.getenv('PACING_MIN_TRANSFER_SEC', '5'))
+
 # CARRIER CONFIGS
 VOXBEAM_PREFIX = os.getenv('VOXBEAM_PREFIX', '0011104')
 
-# Docker container name (for fs_cli commands)
-FREESWITCH_CONTAINER = os.getenv('FREESWITCH_CONTAINER', 'docker-freeswitch-1')
-
-# Thread-safe progress tracking
-progress_lock = Lock()
-active_calls = 0
-active_calls_lock = Lock()
-
-
-def update_status(status: str, active: int = 0, completed: int = 0, remaining: int = 0):
+# --- ESL SETTINGS ---
+# Originates go over a pool of persistent inbound Event Socket connections;
+# each call waits for its BACKGROUND_JOB result up to ESL_JOB_TIMEOUT.
+ESL_POOL_SIZE = int(os.getenv('ESL_POOL_SIZE', '2'))
+ESL_CONNECT_TIMEOUT = float(os.getenv('ESL_CONNECT_TIMEOUT', '5'))
+ESL_JOB_TIMEOUT = float(os.getenv('ESL_JOB_TIMEOUT', '60'))
+# Calls whose hangup event never arrives are dropped from the live table after this
+CHANNEL_STALE_SEC = float(os.getenv('CHANNEL_STALE_SEC', '7200'))
+
+# Dialer state; only touched from the event loop, so no locks.
+# `live` holds every call from originate until CHANNEL_HANGUP_COMPLETE.
+live = None
+pacer = None
+leads = None
+esl_pool = ESLPool(FREESWITCH_HOST, int(FREESWITCH_ESL_PORT), FREESWITCH_ESL_PASSWORD,
+                   size=ESL_POOL_SIZE, timeout=ESL_CONNECT_TIMEOUT, events=CHANNEL_EVENTS)
+
+
+def update_status(status: str, active: int = 0, completed: int = 0, remaining: int = 0,
+                  pacing: dict = None):
     """Update status file for UI monitoring."""
     try:
         with open(STATUS_FILE, 'w') as f:
@@ -63,37 +105,32 @@ def update_status(status: str, active: int = 0, completed: int = 0, remaining: i
                 "active_calls": active,
                 "completed": completed,
                 "remaining": remaining,
+                "pacing": pacing,
                 "timestamp": time.time()
             }, f)
     except Exception as e:
         log.warning(f"Could not update status: {e}")
 
 
-def mark_complete(customer_num: str):
-    """Thread-safe progress marking."""
-    with progress_lock:
-        with open(PROGRESS_FILE, 'a') as f:
-            f.write(f"{customer_num}\n")
+def mark_complete(customer_num: str, outcome: str = None):
+    """Outcome marking (runs on the event loop thread only; committed in batches)."""
+    leads.mark_done(customer_num, outcome)
 
 
-def dial_single(customer_num: str, did_pool: dict) -> dict:
+async def dial_single(customer_num: str, did_pool: dict, call_uuid: str) -> dict:
     """
     Dial a single customer with failover chain.
-    Returns result dict with status.
+    `call_uuid` becomes the channel's origination_uuid; its row in `live`
+    must already be reserved. Returns result dict with status.
     """
-    global active_calls
-
-    with active_calls_lock:
-        active_calls += 1
-        current_active = active_calls
-
-    log.info(f"[DIAL] Starting call to {customer_num} (Active: {current_active}/{MAX_CONCURRENT_CALLS})")
+    log.info(f"[DIAL] Starting call to {customer_num} (Live: {len(live)}/{MAX_CONCURRENT_CALLS})")
 
     result = {
         "number": customer_num,
         "status": "pending",
         "carrier": None,
-        "error": None
+        "error": None,
+        "uuid": call_uuid
     }
 
     try:
@@ -126,48 +163,162 @@ def dial_single(customer_num: str, did_pool: dict) -> dict:
                 f"telnyx_auth_id={TELNYX_VALID_DID},fractel_mask_num={mask},"
                 f"origination_caller_id_number={TELNYX_VALID_DID},"
                 f"effective_caller_id_number={mask},effective_caller_id_name={mask},"
-                f"ignore_early_media=true,continue_on_fail=true")
-
-        cmd = f"docker exec {FREESWITCH_CONTAINER} fs_cli -x \"bgapi originate {{{vars}}}{dial_string} &lua(/opt/hopwhistle/handler.lua)\""
+                f"ignore_early_media=true,continue_on_fail=true,"
+                f"origination_uuid={call_uuid},dialer_lead={clean}")
 
-        proc_result = subprocess.run(cmd, shell=True, capture_output=True, text=True, timeout=30)
-
-        if proc_result.returncode != 0:
-            result["status"] = "error"
-            result["error"] = proc_result.stderr.strip()
-            log.error(f"[DIAL] Error for {customer_num}: {result['error']}")
-        else:
+        leads.claim(customer_num)
+        try:
+            job = esl_pool.bgapi(f"originate {{{vars}}}{dial_string} &lua(/opt/hopwhistle/handler.lua)")
+        except ESLError as e:
+            # Nothing reached FreeSWITCH: the lead stays undialed for the next batch
+            leads.release(customer_num)
+            result["status"] = "not_sent"
+            result["error"] = f"ESL: {e}"
+            log.warning(f"[DIAL] Not sent to {customer_num}: {e}")
+            return result
+        waiter = asyncio.wrap_future(job)
+        try:
+            outcome = await asyncio.wait_for(asyncio.shield(waiter), ESL_JOB_TIMEOUT)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # The channel may still be up: its row keeps the slot until the late
+            # result, CHANNEL_HANGUP_COMPLETE or the stale sweep frees it
+            waiter.add_done_callback(lambda done: late_job_result(call_uuid, done))
+            raise
+
+        result["job_uuid"] = outcome["jobUuid"]
+        if outcome["ok"]:
             result["status"] = "sent"
             result["carrier"] = "telnyx"  # First in chain
-            log.info(f"[DIAL] Sent {customer_num}: {proc_result.stdout.strip()}")
+            log.info(f"[DIAL] Sent {customer_num}: {outcome['body']}")
+        else:
+            result["status"] = "error"
+            result["error"] = outcome["body"]
+            log.error(f"[DIAL] Error for {customer_num}: {result['error']}")
 
-    except subprocess.TimeoutExpired:
+    except asyncio.TimeoutError:
         result["status"] = "timeout"
-        result["error"] = "Command timeout"
+        result["error"] = "Originate timeout"
         log.error(f"[DIAL] Timeout for {customer_num}")
+    except (ESLError, OSError) as e:
+        result["status"] = "error"
+        result["error"] = f"ESL: {e}"
+        log.error(f"[DIAL] ESL error for {customer_num}: {e}")
     except Exception as e:
         result["status"] = "exception"
         result["error"] = str(e)
         log.error(f"[DIAL] Exception for {customer_num}: {e}")
     finally:
-        with active_calls_lock:
-            active_calls -= 1
-        mark_complete(customer_num)
+        if result["status"] != "timeout":
+            live.job_done(call_uuid, result["status"] == "sent", result["error"])
+        if result["status"] != "not_sent":
+            mark_complete(customer_num, result["status"])
 
     return result
 
 
-def start_concurrent_blast():
+def late_job_result(call_uuid: str, done: asyncio.Future):
+    """Apply an originate result that arrived after ESL_JOB_TIMEOUT (event loop)."""
+    if done.cancelled() or done.exception() is not None:
+        return  # no result coming; hangup or the stale sweep frees the row
+    outcome = done.result()
+    live.job_done(call_uuid, outcome["ok"], None if outcome["ok"] else outcome["body"])
+
+
+async def wait_for_esl():
+    """Hold new dials while the ESL event connection is down (the pool reconnects in the background)."""
+    if esl_pool.ready:
+        return
+    log.warning("[ESL] FreeSWITCH connection down, holding new calls")
+    update_status("esl_down", active=len(live))
+    while not esl_pool.ready:
+        await asyncio.sleep(1)
+    log.info("[ESL] FreeSWITCH connection back, resuming")
+
+
+async def dial_batch(remaining: Iterable[str], total: int, did_pool: dict, completed_count: int) -> int:
+    """
+    Dial one batch of leads as asyncio tasks.
+    `remaining` is consumed lazily (a lead store cursor); `total` is its
+    length, for the status file.
+    A lead is only dialed once fewer than MAX_CONCURRENT_CALLS calls are
+    live (originating, ringing or talking), so memory stays flat however
+    long the batch. Returns the updated completed count.
+    """
+    tasks = set()
+    counts = {"completed": completed_count}
+    plan = None
+
+    def call_done(task: asyncio.Task):
+        tasks.discard(task)
+        if task.cancelled():
+            return  # shutting down
+        try:
+            if task.result()["status"] == "sent":
+                counts["completed"] += 1
+        except Exception as e:
+            log.error(f"Call task error: {e}")
+
+    for i, customer_num in enumerate(remaining):
+        # Check pause flag between submissions
+        if os.path.exists(PAUSE_FLAG):
+            log.info("Pause flag detected, stopping new calls")
+            break
+
+        if pacer is not None:
+            plan = await pacer.wait_turn()
+        # Stagger start times for spam avoidance
+        elif i > 0:
+            delay = random.uniform(CALL_DELAY_MIN, CALL_DELAY_MAX)
+            log.debug(f"Stagger delay: {delay:.1f}s before next call")
+            await asyncio.sleep(delay)
+        elif STAGGER_INITIAL_CALLS and i == 0:
+            # Small initial delay to let system stabilize
+            await asyncio.sleep(random.uniform(1.0, 2.0))
+
+        await wait_for_esl()
+        await live.wait_for_slot(MAX_CONCURRENT_CALLS)
+        call_uuid = str(uuid.uuid4())
+        live.reserve(call_uuid, customer_num)  # before yielding, so the cap cannot be overshot
+        task = asyncio.create_task(dial_single(customer_num, did_pool, call_uuid))
+        tasks.add(task)
+        task.add_done_callback(call_done)
+
+        update_status("running", active=len(live),
+                      completed=counts["completed"], remaining=total - i - 1, pacing=plan)
+
+    # Wait for in-flight originates (live calls keep their slots across batches)
+    if tasks:
+        await asyncio.wait(set(tasks))
+    leads.flush()
+    return counts["completed"]
+
+
+async def start_concurrent_blast():
     """
     Concurrent dialer with staggered starts for spam avoidance.
-    Uses ThreadPoolExecutor for parallel dialing with controlled pacing.
+    Runs every call as an asyncio task on one event loop, with controlled pacing.
     """
+    global live, pacer, leads
+    leads = LeadStore(LEAD_DB, commit_every=LEAD_COMMIT_EVERY, commit_sec=LEAD_COMMIT_SEC)
+    live = LiveChannels(CALL_LOG_FILE, stale_after=CHANNEL_STALE_SEC)
+    esl_pool.add_handler(live.handle_event)
+    if PACING_MODE == 'predictive':
+        pacer = PacingController(live, agents=AGENT_SEATS, target_abandon=PACING_TARGET_ABANDON,
+                                 max_abandon=PACING_MAX_ABANDON, max_cps=PACING_MAX_CPS,
+                                 window=PACING_WINDOW, min_samples=PACING_MIN_SAMPLES,
+                                 screen_sec=PACING_SCREEN_SEC, min_transfer_sec=PACING_MIN_TRANSFER_SEC,
+                                 limit=MAX_CONCURRENT_CALLS)
+
     log.info("=" * 60)
-    log.info("NOVA-3 CONCURRENT DIALER v2.0")
-    log.info(f"Max Concurrent: {MAX_CONCURRENT_CALLS}")
-    log.info(f"Call Delay: {CALL_DELAY_MIN}-{CALL_DELAY_MAX}s (randomized)")
+    log.info("NOVA-3 CONCURRENT DIALER v3.0 (asyncio)")
+    log.info(f"Max Concurrent: {MAX_CONCURRENT_CALLS} live calls")
+    if pacer is not None:
+        log.info(f"Pacing: predictive ({AGENT_SEATS} agents, target abandon {PACING_TARGET_ABANDON:.1%}, "
+                 f"cap {PACING_MAX_ABANDON:.1%}, max {PACING_MAX_CPS} CPS)")
+    else:
+        log.info(f"Call Delay: {CALL_DELAY_MIN}-{CALL_DELAY_MAX}s (randomized)")
     log.info(f"Telnyx Connection ID: {TELNYX_CONNECTION_ID}")
-    log.info(f"FreeSWITCH Host: {FREESWITCH_HOST}")
+    log.info(f"FreeSWITCH ESL: {FREESWITCH_HOST}:{FREESWITCH_ESL_PORT} (pool {ESL_POOL_SIZE})")
     log.info(f"Outbound Proxy: {OUTBOUND_SIP_PROXY}")
     log.info("Sequence: TELNYX -> VOXBEAM -> ANVEO")
     log.info("=" * 60)
@@ -177,86 +328,69 @@ def start_concurrent_blast():
         log.warning("TELNYX_API_KEY not set - some features may not work")
     if not DEEPGRAM_API_KEY:
         log.warning("DEEPGRAM_API_KEY not set - TTS/STT features disabled")
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, esl_pool.connect)
+    except (ESLError, OSError) as e:
+        log.error(f"ESL connect to {FREESWITCH_HOST}:{FREESWITCH_ESL_PORT} failed ({e}); retrying in the background")
 
     while True:
         if os.path.exists(PAUSE_FLAG):
             log.info("--- PAUSED ---")
-            update_status("paused")
-            time.sleep(5)
+            update_status("paused", active=len(live))
+            await asyncio.sleep(5)
             continue
 
-        # Load configuration
+        # Load configuration (LEAD_FILE is only rescanned when it changed)
         try:
             with open(DID_FILE, 'r') as f:
                 did_pool = json.load(f)
-            with open(LEAD_FILE, 'r') as f:
-                leads = [l.strip() for l in f if l.strip()]
-            done = set()
-            if os.path.exists(PROGRESS_FILE):
-                with open(PROGRESS_FILE, 'r') as f:
-                    done = set(l.strip() for l in f)
+            if not os.path.exists(LEAD_FILE):
+                raise FileNotFoundError(LEAD_FILE)
+            await asyncio.get_running_loop().run_in_executor(None, leads.sync, LEAD_FILE, PROGRESS_FILE)
+            remaining, done = leads.remaining(), leads.done()
         except Exception as e:
             log.error(f"File Error: {e}")
             update_status("error", remaining=0)
-            time.sleep(10)
+            await asyncio.sleep(10)
             continue
 
-        remaining = [l for l in leads if l not in done]
-
         if not remaining:
             log.info("--- CAMPAIGN COMPLETE ---")
-            update_status("complete", completed=len(done))
-            time.sleep(60)
+            update_status("complete", completed=done)
+            await asyncio.sleep(60)
             continue
 
-        log.info(f"Starting batch: {len(remaining)} leads remaining")
-        update_status("running", remaining=len(remaining))
-
-        # Process in concurrent batches
-        completed_count = len(done)
-        futures = []
-
-        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CALLS) as executor:
-            for i, customer_num in enumerate(remaining):
-                # Check pause flag between submissions
-                if os.path.exists(PAUSE_FLAG):
-                    log.info("Pause flag detected, stopping new calls")
-                    break
-
-                # Stagger start times for spam avoidance
-                if i > 0:
-                    delay = random.uniform(CALL_DELAY_MIN, CALL_DELAY_MAX)
-                    log.debug(f"Stagger delay: {delay:.1f}s before next call")
-                    time.sleep(delay)
-                elif STAGGER_INITIAL_CALLS and i == 0:
-                    # Small initial delay to let system stabilize
-                    time.sleep(random.uniform(1.0, 2.0))
-
-                # Submit call to thread pool
-                future = executor.submit(dial_single, customer_num, did_pool)
-                futures.append(future)
-
-                # Update status
-                with active_calls_lock:
-                    current_active = active_calls
-                update_status("running", active=current_active,
-                            completed=completed_count, remaining=len(remaining) - i - 1)
-
-            # Wait for all calls to complete
-            for future in as_completed(futures):
-                try:
-                    result = future.result()
-                    if result["status"] == "sent":
-                        completed_count += 1
-                except Exception as e:
-                    log.error(f"Future error: {e}")
+        log.info(f"Starting batch: {remaining} leads remaining")
+        update_status("running", active=len(live), remaining=remaining)
+
+        completed_count = await dial_batch(leads.iter_undialed(LEAD_FETCH_SIZE), remaining, did_pool, done)
 
         log.info(f"Batch complete. Total completed: {completed_count}")
-        update_status("batch_complete", completed=completed_count)
+        update_status("batch_complete", active=len(live), completed=completed_count)
 
         # Brief pause between batches
-        time.sleep(random.uniform(2.0, 4.0))
+        await asyncio.sleep(random.uniform(2.0, 4.0))
+
+
+async def main():
+    """Run the dialer until SIGTERM/SIGINT, then commit every buffered lead outcome."""
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, asyncio.current_task().cancel)
+    try:
+        await start_concurrent_blast()
+    except asyncio.CancelledError:
+        log.info("Shutting down")
+    finally:
+        # In-flight calls record their outcome as they unwind, then the buffer is flushed
+        calls = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in calls:
+            task.cancel()
+        await asyncio.gather(*calls, return_exceptions=True)
+        if leads is not None:
+            leads.close()
+        esl_pool.close()
 
 
 if __name__ == '__main__':
-    start_concurrent_blast()
+    asyncio.run(main())
@@ -0,0 +1,365 @@
+"""Minimal inbound Event Socket (ESL) client for FreeSWITCH.
+
+Keeps a small pool of authenticated, persistent sockets to mod_event_socket
+instead of spawning `fs_cli` per command. `bgapi()` picks the Job-UUID
+itself (sent as a header, so there is no race with the reply), registers a
+future for it, and resolves that future when the matching BACKGROUND_JOB
+event arrives. Only the first pooled connection subscribes to events; the
+others just carry commands.
+
+Callers never connect. A background thread reopens dead slots with
+exponential backoff, and while the event connection is down `bgapi()` and
+`api()` raise ESLError at once instead of blocking on a socket connect.
+
+Each connection has one reader thread that parses the ESL framing
+(`Content-Type` / `Content-Length` headers, url-encoded `text/event-plain`
+bodies) and dispatches command replies in order and events by name.
+"""
+
+import socket
+import logging
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+from typing import Callable, Dict, List, Optional
+from urllib.parse import unquote
+
+log = logging.getLogger(__name__)
+
+Event = Dict[str, str]
+
+
+class ESLError(Exception):
+    pass
+
+
+def _settle(future: Future, result=None, error: Optional[BaseException] = None):
+    """Resolve a job future once; the reply, event and disconnect paths may race."""
+    try:
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+def _read_headers(reader) -> Optional[Dict[str, str]]:
+    """One header block, or None when the socket closed."""
+    headers = {}
+    while True:
+        line = reader.readline()
+        if not line:
+            return None
+        line = line.decode('utf-8', 'replace').rstrip('\r\n')
+        if not line:
+            if headers:
+                return headers
+            continue  # stray blank line between messages
+        key, _, value = line.partition(':')
+        headers[key.strip()] = value.strip()
+
+
+def parse_event(body: str) -> Event:
+    """Decode a text/event-plain body: url-encoded headers, then an optional body."""
+    head, _, rest = body.partition('\n\n')
+    event = {}
+    for line in head.splitlines():
+        key, _, value = line.partition(':')
+        if key:
+            event[key.strip()] = unquote(value.strip())
+    length = int(event.get('Content-Length', 0) or 0)
+    if length:
+        event['_body'] = rest[:length]
+    return event
+
+
+class ESLConnection:
+    """One authenticated socket with a reader thread."""
+
+    def __init__(self, host: str, port: int, password: str, timeout: float = 5.0,
+                 on_event: Optional[Callable[[Event], None]] = None,
+                 on_close: Optional[Callable[['ESLConnection'], None]] = None):
+        self.host, self.port, self.password = host, port, password
+        self.timeout = timeout
+        self.on_event = on_event
+        self.on_close = on_close
+        self.sock = None
+        self.reader = None
+        self.write_lock = threading.Lock()
+        self.replies = deque()  # futures waiting for command/reply, in send order
+        self.alive = False
+
+    def connect(self, events: Optional[List[str]] = None):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        try:
+            self._handshake(events)
+        except Exception:
+            self.sock.close()
+            raise
+        self.sock.settimeout(None)  # the reader blocks; callers time out on futures
+        self.alive = True
+        threading.Thread(target=self._read_loop, name=f"esl-reader-{self.port}", daemon=True).start()
+
+    def _handshake(self, events: Optional[List[str]]):
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile('rb')
+        greeting = _read_headers(self.reader)
+        if not greeting or greeting.get('Content-Type') != 'auth/request':
+            raise ESLError(f"Unexpected ESL greeting: {greeting}")
+        self.sock.sendall(f"auth {self.password}\n\n".encode())
+        reply = _read_headers(self.reader)
+        if not reply or not reply.get('Reply-Text', '').startswith('+OK'):
+            raise ESLError(f"ESL auth failed: {(reply or {}).get('Reply-Text', 'connection closed')}")
+        if events:
+            self.sock.sendall(f"event plain {' '.join(events)}\n\n".encode())
+            reply = _read_headers(self.reader)
+            if not reply or not reply.get('Reply-Text', '').startswith('+OK'):
+                raise ESLError(f"ESL event subscription failed: {reply}")
+
+    def send(self, command: str, headers: Optional[Dict[str, str]] = None) -> Future:
+        """Send a command; the future resolves with its command/reply headers."""
+        future = Future()
+        lines = [command] + [f"{key}: {value}" for key, value in (headers or {}).items()]
+        data = ("\n".join(lines) + "\n\n").encode()
+        with self.write_lock:
+            if not self.alive:
+                raise ESLError("ESL connection is closed")
+            self.replies.append(future)
+            try:
+                self.sock.sendall(data)
+                return future
+            except OSError as e:
+                self.replies.remove(future)
+                error = e
+        self._shutdown(error)
+        raise ESLError(f"ESL send failed: {error}")
+
+    def _read_loop(self):
+        error = None
+        try:
+            while True:
+                headers = _read_headers(self.reader)
+                if headers is None:
+                    break
+                length = int(headers.get('Content-Length', 0) or 0)
+                body = self.reader.read(length).decode('utf-8', 'replace') if length else ''
+                kind = headers.get('Content-Type', '')
+                if kind in ('command/reply', 'api/response'):
+                    if self.replies:
+                        future = self.replies.popleft()
+                        if kind == 'api/response':
+                            headers['_body'] = body
+                        future.set_result(headers)
+                elif kind == 'text/event-plain':
+                    if self.on_event:
+                        try:
+                            self.on_event(parse_event(body))
+                        except Exception as e:
+                            log.error(f"[ESL] Event handler error: {e}")
+                elif kind == 'text/disconnect-notice':
+                    break
+        except (OSError, ValueError) as e:
+            error = e
+        self._shutdown(error)
+
+    def _shutdown(self, error=None):
+        with self.write_lock:
+            if not self.alive and self.sock is None:
+                return
+            was_alive, self.alive = self.alive, False
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+            pending, self.replies = list(self.replies), deque()
+        for future in pending:
+            if not future.done():
+                future.set_exception(ESLError(f"ESL connection lost: {error or 'closed'}"))
+        if was_alive:
+            log.warning(f"[ESL] Connection to {self.host}:{self.port} closed ({error or 'remote'})")
+            if self.on_close:
+                self.on_close(self)
+
+    def close(self):
+        self._shutdown()
+
+
+class ESLPool:
+    """Round-robin pool of ESL connections with Job-UUID correlation for bgapi."""
+
+    def __init__(self, host: str, port: int, password: str, size: int = 2, timeout: float = 5.0,
+                 events: Optional[List[str]] = None, retry_min: float = 1.0, retry_max: float = 30.0):
+        self.host, self.port, self.password = host, int(port), password
+        self.size = max(1, size)
+        self.timeout = timeout
+        self.retry_min, self.retry_max = retry_min, retry_max
+        self.events = ['BACKGROUND_JOB'] + [e for e in (events or []) if e != 'BACKGROUND_JOB']
+        self.handlers: List[Callable[[Event], None]] = []
+        self.jobs: Dict[str, Future] = {}
+        self.lock = threading.Lock()
+        self.connections: List[Optional[ESLConnection]] = [None] * self.size
+        self.next_index = 0
+        self.wake = threading.Event()     # a slot dropped
+        self.stopped = threading.Event()  # close() was called
+        self.reconnector: Optional[threading.Thread] = None
+
+    def add_handler(self, handler: Callable[[Event], None]):
+        """Call `handler(event)` on the reader thread for every subscribed event."""
+        self.handlers.append(handler)
+
+    @property
+    def ready(self) -> bool:
+        """True while the event connection is up, i.e. job results can arrive."""
+        conn = self.connections[0]
+        return conn is not None and conn.alive
+
+    def _dead_slots(self) -> List[int]:
+        return [index for index, conn in enumerate(self.connections) if conn is None or not conn.alive]
+
+    def _open(self, index: int) -> ESLConnection:
+        """Connect one slot. Blocking, so never called on a caller's thread or under self.lock."""
+        conn = ESLConnection(self.host, self.port, self.password, self.timeout,
+                             on_event=self._on_event, on_close=self._on_close)
+        # Connection 0 carries the event subscription, the rest only commands
+        conn.connect(self.events if index == 0 else None)
+        with self.lock:
+            if self.stopped.is_set():
+                conn.close()
+                raise ESLError("ESL pool is closed")
+            self.connections[index] = conn
+        log.info(f"[ESL] Connected to {self.host}:{self.port} (slot {index}{', events' if index == 0 else ''})")
+        return conn
+
+    def connect(self):
+        """Open every slot now (blocking), then keep them open from the reconnector thread.
+
+        Raises if a slot cannot be opened; the reconnector keeps retrying it.
+        """
+        try:
+            for index in self._dead_slots():
+                self._open(index)
+        finally:
+            self._start_reconnector()
+
+    def _start_reconnector(self):
+        with self.lock:
+            if self.reconnector is not None or self.stopped.is_set():
+                return
+            self.reconnector = threading.Thread(target=self._reconnect_loop, name="esl-reconnect", daemon=True)
+        self.reconnector.start()
+
+    def _reconnect_loop(self):
+        backoff = self.retry_min
+        while not self.stopped.is_set():
+            self.wake.clear()
+            dead = self._dead_slots()
+            if not dead:
+                backoff = self.retry_min
+                self.wake.wait()
+                continue
+            try:
+                for index in dead:
+                    self._open(index)
+                backoff = self.retry_min
+            except (OSError, ESLError) as e:
+                if self.stopped.is_set():
+                    return
+                log.error(f"[ESL] Reconnect to {self.host}:{self.port} failed ({e}); retrying in {backoff:.1f}s")
+                self.stopped.wait(backoff)
+                backoff = min(backoff * 2, self.retry_max)
+
+    def _on_close(self, conn: ESLConnection):
+        if self.connections[0] is conn:
+            # Job results arrive on the event connection; without it, pending jobs never resolve
+            with self.lock:
+                pending, self.jobs = list(self.jobs.values()), {}
+            for future in pending:
+                _settle(future, error=ESLError("ESL event connection lost"))
+        self.wake.set()
+
+    def _on_event(self, event: Event):
+        if event.get('Event-Name') == 'BACKGROUND_JOB':
+            with self.lock:
+                future = self.jobs.pop(event.get('Job-UUID', ''), None)
+            if future is not None:
+                body = event.get('_body', '').strip()
+                _settle(future, {
+                    'ok': body.startswith('+OK'),
+                    'body': body,
+                    'uuid': body[3:].strip() if body.startswith('+OK') else None,
+                    'jobUuid': event.get('Job-UUID')
+                })
+        for handler in self.handlers:
+            handler(event)
+
+    def _live_connection(self) -> ESLConnection:
+        """Next open slot, round-robin; raises ESLError while the event connection is down."""
+        with self.lock:
+            if self.ready:
+                for _ in range(self.size):
+                    conn = self.connections[self._next_slot()]
+                    if conn is not None and conn.alive:
+                        return conn
+        self._start_reconnector()
+        raise ESLError(f"ESL {self.host}:{self.port} is down (reconnecting)")
+
+    def api(self, command: str, timeout: Optional[float] = None) -> str:
+        """Blocking `api` command; returns the response body."""
+        conn = self._live_connection()
+        reply = conn.send(f"api {command}").result(timeout=timeout or self.timeout)
+        return reply.get('_body', '')
+
+    def bgapi(self, command: str) -> Future:
+        """Send `bgapi <command>` without waiting; returns the job's future.
+
+        The future resolves with the BACKGROUND_JOB result
+        {'ok', 'body', 'uuid' (originate's channel UUID), 'jobUuid'}, or fails
+        with ESLError if the command is rejected or the connection drops.
+        Never blocks: raises ESLError, with nothing sent, when no slot is open.
+        """
+        job_uuid = str(uuid.uuid4())
+        future = Future()
+        future.job_uuid = job_uuid
+        conn = self._live_connection()
+        with self.lock:
+            if not self.ready:  # dropped since; _on_close already failed the jobs table
+                raise ESLError(f"ESL {self.host}:{self.port} is down (reconnecting)")
+            self.jobs[job_uuid] = future
+        try:
+            reply = conn.send(f"bgapi {command}", {'Job-UUID': job_uuid})
+        except Exception:
+            self.forget(future)
+            raise
+
+        def on_reply(done: Future):
+            try:
+                text = done.result().get('Reply-Text', '')
+                error = None if text.startswith('+OK') else ESLError(text or 'bgapi rejected')
+            except Exception as e:
+                error = e
+            if error is not None:
+                self.forget(future)
+                _settle(future, error=error)
+
+        reply.add_done_callback(on_reply)
+        return future
+
+    def forget(self, future: Future):
+        """Drop a job that will get no BACKGROUND_JOB (send failed or command rejected)."""
+        with self.lock:
+            self.jobs.pop(getattr(future, 'job_uuid', None), None)
+
+    def _next_slot(self) -> int:
+        index = self.next_index
+        self.next_index = (self.next_index + 1) % self.size
+        return index
+
+    def close(self):
+        self.stopped.set()
+        self.wake.set()
+        for conn in self.connections:
+            if conn is not None:
+                conn.close()
@@ -8,19 +8,27 @@ Faster-Whisper ACA call analyzer
 - Saves consolidated transcripts, analyses, and a summary
 """
 
+import io
 import os
 import sys
+import time
 import logging
 import requests
 import datetime
 import re
 import hashlib
 import gc
+import shutil
 import subprocess
+from functools import lru_cache
 from faster_whisper import WhisperModel
-from typing import List, Dict, Any, Optional
+from faster_whisper.audio import decode_audio
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple
 from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 # Optional import for relative date calculations. Used in application submission prompt.
 try:
@@ -29,6 +37,20 @@ try:
 except ImportError:
     dateutil_available = False
 
+# Shared transcription helpers live next to the Redis worker.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "apps", "media", "transcriber", "python"))
+from whisper_batching import WhisperBatcher, batching_supported
+from audio_io import download_bytes, decode_buffer, hash_file
+from transcript_cache import TranscriptCache, open_cache
+from analysis_cache import AnalysisCache, make_key as make_analysis_key
+from deepseek_client import DeepSeekClient
+from prompt_compaction import compact_text
+from analysis_schema import (
+    AnalysisParseError, json_instructions, parse_analysis, parse_json_batch, parse_text_analysis
+)
+from vad_trim import VAD_TRIM_ENABLED, trim_silence, remap_segments
+from batch_checkpoint import open_checkpoint
+
 # -----------------------------------------------------------------------------
 # Environment & Logging
 # -----------------------------------------------------------------------------
@@ -76,51 +98,150 @@ WHISPER_COMPUTE = os.getenv("WHISPER_COMPUTE", "int8")   # int8/int8_float16/flo
 
 DOWNLOAD_TIMEOUT = int(os.getenv("DOWNLOAD_TIMEOUT", "60"))
 ANALYSIS_TIMEOUT = int(os.getenv("ANALYSIS_TIMEOUT", "90"))
+# Bump when the prompt changes so cached analyses are not reused across versions
+ANALYSIS_PROMPT_VERSION = "application-v2"
+# json: DeepSeek JSON mode + strict parser; text: legacy "Field: value" prompt.
+# Either way the analysis files keep the "Field: value" layout.
+ANALYSIS_RESPONSE_FORMAT = os.getenv("ANALYSIS_RESPONSE_FORMAT", "json").lower()
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", "86400"))
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "10000"))
+
+# Batched analysis for backfills: >1 packs up to K transcripts (within a prompt
+# token budget) into one request and parses the answer back per call.
+ANALYSIS_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", "1"))
+ANALYSIS_BATCH_MAX_TOKENS = int(os.getenv("ANALYSIS_BATCH_MAX_TOKENS", "24000"))
+ANALYSIS_BATCH_OUTPUT_TOKENS_PER_CALL = int(os.getenv("ANALYSIS_BATCH_OUTPUT_TOKENS_PER_CALL", "600"))
+ANALYSIS_BATCH_MAX_OUTPUT_TOKENS = 8192
 MAX_FFMPEG_SECONDS = int(os.getenv("FFMPEG_TIMEOUT", "120"))
 LARGE_FILE_THRESHOLD_MB = int(os.getenv("LARGE_FILE_THRESHOLD_MB", "20"))
+# Decode downloads in memory (no audio_files/ round-trip, no ffmpeg re-encode)
+AUDIO_IN_MEMORY = os.getenv("AUDIO_IN_MEMORY", "true").lower() == "true"
+
+# Cross-call batching: >1 groups speech windows from concurrent threads into one
+# encoder/decoder batch, flushed after BATCH_MAX_WAIT_MS at the latest.
+TRANSCRIBE_BATCH_SIZE = int(os.getenv("TRANSCRIBE_BATCH_SIZE", "1"))
+BATCH_MAX_WAIT_MS = int(os.getenv("BATCH_MAX_WAIT_MS", "50"))
+
+# Streaming runner: URLs are read lazily and at most MAX_IN_FLIGHT calls are held
+# in memory. Each finished call goes to the checkpoint (empty path disables), and
+# a restart skips URLs it already has as Success.
+URL_FILE = os.getenv("URL_FILE", "urls3.txt")
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", "10"))
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "0"))  # 0 = twice the pipeline's workers
+CHECKPOINT_PATH = os.getenv("CHECKPOINT_PATH", "fe_bill_checkpoint.sqlite3")
+
+# Process pool mode: TRANSCRIBE_PROCESSES > 0 (or "auto") runs Whisper in that many
+# processes with one model each, while downloads and DeepSeek calls run on
+# IO_WORKERS threads. "auto" fits min(cores / WHISPER_CPU_THREADS, available RAM /
+# MODEL_RAM_MB). 0 keeps the threaded mode sharing one in-process model.
+TRANSCRIBE_PROCESSES = os.getenv("TRANSCRIBE_PROCESSES", "0")
+WHISPER_CPU_THREADS = int(os.getenv("WHISPER_CPU_THREADS", "4"))
+MODEL_RAM_MB = int(os.getenv("MODEL_RAM_MB", "1500"))
+IO_WORKERS = int(os.getenv("IO_WORKERS", str(MAX_WORKERS)))
+UTILIZATION_REPORT_EVERY = int(os.getenv("UTILIZATION_REPORT_EVERY", "100"))
+
+# Transcript cache keyed by audio content + decode settings (empty path disables)
+TRANSCRIPT_CACHE_PATH = os.getenv("TRANSCRIPT_CACHE_PATH", "transcript_cache.sqlite3")
+TRANSCRIPT_CACHE_MAX_MB = int(os.getenv("TRANSCRIPT_CACHE_MAX_MB", "512"))
 
 # -----------------------------------------------------------------------------
 # Model Init
 # -----------------------------------------------------------------------------
-logger.info("Loading Faster-Whisper model...")
-try:
-    model = WhisperModel(WHISPER_MODEL_NAME, device=WHISPER_DEVICE, compute_type=WHISPER_COMPUTE)
-    logger.info("✓ Faster-Whisper model loaded")
-except Exception as e:
-    logger.error(f"Failed to load Faster-Whisper: {e}")
-    sys.exit(1)
+def available_ram_mb() -> int:
+    """MemAvailable from /proc/meminfo, else free physical pages; 0 if unknown."""
+    try:
+        with open("/proc/meminfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+def plan_transcribe_processes() -> Tuple[int, int]:
+    """Resolve (processes, cpu_threads per process); (0, 0) is threaded mode."""
+    setting = TRANSCRIBE_PROCESSES.strip().lower()
+    if setting != "auto":
+        processes = max(0, int(setting))
+        return (processes, WHISPER_CPU_THREADS) if processes else (0, 0)
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    processes = max(1, cores // max(1, WHISPER_CPU_THREADS))
+    ram_mb = available_ram_mb()
+    if ram_mb:
+        processes = max(1, min(processes, ram_mb // MODEL_RAM_MB))
+    return processes, max(1, cores // processes)
+
+def load_model(cpu_threads: int = 0):
+    logger.info("Loading Faster-Whisper model...")
+    try:
+        loaded = WhisperModel(WHISPER_MODEL_NAME, device=WHISPER_DEVICE, compute_type=WHISPER_COMPUTE,
+                              cpu_threads=cpu_threads)
+        logger.info("✓ Faster-Whisper model loaded")
+        return loaded
+    except Exception as e:
+        logger.error(f"Failed to load Faster-Whisper: {e}")
+        sys.exit(1)
+
+TRANSCRIBE_PROCESS_COUNT, TRANSCRIBE_CPU_THREADS = plan_transcribe_processes()
+
+# In process pool mode each pool process loads its own model (_init_process_model);
+# spawned children re-run this module, so the parent must not load one here.
+model = None if TRANSCRIBE_PROCESS_COUNT else load_model()
+
+batcher = None
+if TRANSCRIBE_BATCH_SIZE > 1 and model is not None and not batching_supported():
+    logger.warning("Batched inference needs faster-whisper 0.10 internals; transcribing per call")
+elif TRANSCRIBE_BATCH_SIZE > 1 and model is not None:
+    batcher = WhisperBatcher(model, max_batch_size=TRANSCRIBE_BATCH_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS, beam_size=1)
+    logger.info(f"✓ Batched inference enabled (batch={TRANSCRIBE_BATCH_SIZE}, wait={BATCH_MAX_WAIT_MS}ms)")
+
+transcript_cache = open_cache(TRANSCRIPT_CACHE_PATH, TRANSCRIPT_CACHE_MAX_MB)
+analysis_cache = AnalysisCache(ANALYSIS_CACHE_TTL, ANALYSIS_CACHE_SIZE)
+# Shared keep-alive client: caps concurrent requests (DEEPSEEK_MAX_CONCURRENCY)
+# across the worker threads and backs off on 429/5xx.
+deepseek = DeepSeekClient(DEEPSEEK_API_KEY, DEEPSEEK_ENDPOINT, DEEPSEEK_MODEL or "deepseek-chat", timeout=ANALYSIS_TIMEOUT)
 
 # -----------------------------------------------------------------------------
 # Helpers
 # -----------------------------------------------------------------------------
-def read_urls_from_file(file_name: str = "urls3.txt") -> List[str]:
-    """Read non-empty, non-comment lines from a text file as URLs."""
+def iter_urls(file_name: str = "urls3.txt") -> Iterator[str]:
+    """Yield non-empty, non-comment HTTP lines from a text file, one at a time."""
     if not os.path.exists(file_name):
         logger.error(f"URL file not found: {file_name}")
-        return []
+        return
     try:
         with open(file_name, "r", encoding="utf-8") as f:
-            urls = []
             for line in f:
                 s = line.strip()
                 if not s or s.startswith("#"):
                     continue
                 if s.startswith(("http://", "https://")):
-                    urls.append(s)
+                    yield s
                 else:
                     logger.warning(f"Skipping non-HTTP line: {s}")
-        logger.info(f"Loaded {len(urls)} URLs from {file_name}")
-        return urls
     except Exception as e:
         logger.error(f"Error reading URLs: {e}")
-        return []
 
+@lru_cache(maxsize=1)
 def _ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+DOWNLOAD_HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
+
+def fetch_audio_fast(url: str):
+    """Download audio into memory (no temp file). Returns (buffer, content sha256)."""
     try:
-        subprocess.run(["ffmpeg", "-version"], capture_output=True, check=False)
-        return True
-    except Exception:
-        return False
+        logger.info(f"Downloading: {url}")
+        return download_bytes(url, timeout=DOWNLOAD_TIMEOUT, headers=DOWNLOAD_HEADERS)
+    except Exception as e:
+        logger.error(f"Download failed for {url}: {e}")
+        return None
 
 def download_audio_fast(url: str, output_folder: str) -> Optional[str]:
     """Download audio to MP3; compress if size > threshold (MB)."""
@@ -129,8 +250,7 @@ def download_audio_fast(url: str, output_folder: str) -> Optional[str]:
         audio_file = os.path.join(output_folder, f"audio_{url_hash}.mp3")
 
         logger.info(f"Downloading: {url}")
-        headers = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"}
-        with requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT, headers=headers) as r:
+        with requests.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT, headers=DOWNLOAD_HEADERS) as r:
             r.raise_for_status()
             with open(audio_file, "wb") as f:
                 for chunk in r.iter_content(chunk_size=8192):
@@ -165,54 +285,88 @@ def download_audio_fast(url: str, output_folder: str) -> Optional[str]:
         logger.error(f"Download failed for {url}: {e}")
         return None
 
-def transcribe_audio_fast(audio_file: str) -> str:
-    """Transcribe with faster-whisper."""
-    if not audio_file or not os.path.exists(audio_file):
+def transcript_cache_key(audio_hash: Optional[str]) -> Optional[str]:
+    """Cache key for this audio under the current Whisper settings."""
+    if not transcript_cache or not audio_hash:
+        return None
+    return TranscriptCache.make_key(
+        audio_hash,
+        model=WHISPER_MODEL_NAME,
+        compute_type=WHISPER_COMPUTE,
+        beam_size=1,
+        batched=batcher is not None,
+        vad_trim=VAD_TRIM_ENABLED,
+        language="en"
+    )
+
+def transcribe_audio_fast(audio_file, cache_key: Optional[str] = None) -> str:
+    """Transcribe a file path, in-memory download, or 16 kHz array with faster-whisper.
+
+    When cache_key is given, a cached transcript of the same audio is returned
+    without running the model, and fresh transcripts are stored under it.
+    """
+    if cache_key:
+        try:
+            cached = transcript_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Transcript cache hit")
+                return " ".join(seg["text"] for seg in cached["segments"] if seg["text"])
+        except Exception as e:
+            logger.warning(f"Transcript cache read failed: {e}")
+
+    if audio_file is None:
+        return ""
+    if isinstance(audio_file, str) and not os.path.exists(audio_file):
         return ""
     try:
-        logger.info(f"Transcribing: {os.path.basename(audio_file)}")
-        segments, info = model.transcribe(audio_file, beam_size=1, language="en")
-        transcript = " ".join(seg.text.strip() for seg in segments if seg.text)
+        if isinstance(audio_file, str):
+            logger.info(f"Transcribing: {os.path.basename(audio_file)}")
+            audio = decode_audio(audio_file)
+        elif not hasattr(audio_file, "shape"):
+            audio = decode_buffer(audio_file)
+        else:
+            audio = audio_file
+        duration = len(audio) / 16000
+        # Drop dead air / ring time before the model; timestamps are mapped back below
+        audio, remap = trim_silence(audio)
+        logger.info(f"Transcribing: {len(audio) / 16000:.1f}s of {duration:.1f}s audio")
+        if batcher:
+            # Blocks this thread until the batcher has run all of the call's windows
+            segments, info = batcher.transcribe(audio, language="en")
+            language = info["language"]
+        else:
+            raw_segments, info = model.transcribe(audio, beam_size=1, language="en")
+            segments = [{"start": seg.start, "end": seg.end, "text": seg.text.strip()} for seg in raw_segments]
+            language = info.language
+        remap_segments(segments, remap)
+        transcript = " ".join(seg["text"] for seg in segments if seg["text"])
         logger.info(f"Transcription complete: {len(transcript)} chars")
+
+        if cache_key and transcript:
+            try:
+                transcript_cache.put(cache_key, {"segments": segments, "language": language, "durationSec": duration})
+            except Exception as e:
+                logger.warning(f"Transcript cache write failed: {e}")
         return transcript
     except Exception as e:
         logger.error(f"Transcription failed: {e}")
         return ""
 
-def analyze_single_transcript(transcript: str, url_identifier: str) -> str:
-    """Analyze transcript and determine whether a final expense application was submitted.
+def analysis_cutoff_date() -> str:
+    """81-year cutoff date used by the age criterion.
 
-    This function mirrors the prompt and response handling used in the original
-    application submission script. It asks the DeepSeek API to evaluate whether
-    an application was submitted and to extract supporting details such as
-    monthly premium, carrier, customer name, phone number, and agent name.
-    Only the structured output specified in the prompt should be returned.
+    Falls back to simple subtraction if dateutil is unavailable.
     """
-    if not transcript:
-        return "Analysis skipped: Empty transcript"
-    if not DEEPSEEK_API_KEY:
-        return "Analysis failed: No API key"
-
-    logger.info(f"Analyzing transcript for: {url_identifier[:60]}...")
-
-    # Calculate an 81-year cutoff date (retained for completeness, although not
-    # directly referenced in the prompt). Fallback to simple subtraction if
-    # dateutil is unavailable.
     today = datetime.date.today()
     if dateutil_available:
         cutoff_date = today - relativedelta(years=81)
-        cutoff_date_str = cutoff_date.strftime("%B %d, %Y")
-    else:
-        cutoff_year = today.year - 81
-        cutoff_date_str = f"{today.strftime('%B %d')}, {cutoff_year}"
-
-    # Construct the prompt exactly as in the original application analyzer.
-    prompt_content = f"""
-Analyze the following call transcript:
---- TRANSCRIPT START ---
-{transcript}
---- TRANSCRIPT END ---
+        return cutoff_date.strftime("%B %d, %Y")
+    cutoff_year = today.year - 81
+    return f"{today.strftime('%B %d')}, {cutoff_year}"
 
+def analysis_objectives(cutoff_date_str: str) -> str:
+    """Instruction block shared by the single-call and batched prompts."""
+    return f"""
 Your Objectives:
 1. Answered Call
 
@@ -261,47 +415,262 @@ Output for Application Submission:
     - Bank Routing Number: [Bank Routing Number or "Not Provided"]
     - Card Number, Exp Date, & 3 digit Code: [Card Number, Exp Date, & 3 Digit Code or "Not Provided"]
     - Agent Name: [First Name or "Not Provided"]
+""".strip()
 
+SINGLE_CALL_INSTRUCTIONS = """
 --- IMPORTANT INSTRUCTIONS ---
 Provide ONLY the structured output based on the format defined above.
 Do NOT include any introductory sentences, concluding remarks, summaries (like "### Summary:"), markdown formatting (like '###' or '```'), or any text other than the requested fields and their values.
 Ensure every field listed under 'Output for Application Submission' and 'Supporting Information' is present in your response, even if the value is 'No' or 'Not Provided'.
+""".strip()
+
+BATCH_INSTRUCTIONS = """
+--- IMPORTANT INSTRUCTIONS ---
+Apply the objectives above to EACH call separately. Never mix information between calls.
+For each call, output one section in this exact format, in call order:
+=== CALL <number> ===
+<structured output for that call>
+=== END CALL <number> ===
+Inside each section provide ONLY the structured output based on the format defined above.
+Do NOT include any introductory sentences, concluding remarks, summaries (like "### Summary:"), markdown formatting (like '###' or '```'), or any text other than the section markers, the requested fields and their values.
+Ensure every field listed under 'Output for Billability', 'Output for Application Submission' and 'Supporting Information' is present in every section, even if the value is 'No' or 'Not Provided'.
+""".strip()
+
+ANALYSIS_SYSTEM_MESSAGE = "You are an AI assistant analyzing call transcripts. Provide ONLY the requested structured data."
+
+def analysis_record(text: str, tokens_in: int = 0, tokens_out: int = 0,
+                    fields: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Analysis text, its parsed fields (None when skipped/failed) and the DeepSeek tokens spent."""
+    return {"text": text, "fields": fields, "tokensIn": tokens_in, "tokensOut": tokens_out}
+
+def parsed_record(analysis, tokens_in: int = 0, tokens_out: int = 0) -> Dict[str, Any]:
+    """analysis_record for a CallAnalysis, rendered in the report layout."""
+    return analysis_record(analysis.to_text(), tokens_in, tokens_out, analysis.to_dict())
+
+def analysis_prompt_version(cutoff_date_str: str) -> str:
+    return f"{ANALYSIS_PROMPT_VERSION}:{ANALYSIS_RESPONSE_FORMAT}:{cutoff_date_str}"
+
+def output_instructions(batch: bool = False) -> str:
+    if ANALYSIS_RESPONSE_FORMAT == "json":
+        return json_instructions(batch)
+    return BATCH_INSTRUCTIONS if batch else SINGLE_CALL_INSTRUCTIONS
+
+def response_format_options() -> Dict[str, Any]:
+    return {"response_format": {"type": "json_object"}} if ANALYSIS_RESPONSE_FORMAT == "json" else {}
+
+def prompt_transcript(transcript: str) -> str:
+    """The transcript as sent to DeepSeek: keyword windows for long calls, else in full."""
+    compacted, info = compact_text(transcript)
+    if compacted is None:
+        return transcript
+    logger.info(f"Compacted prompt to {info['keptWords']}/{info['totalWords']} words ({', '.join(info['categories'])})")
+    return compacted
+
+def analyze_single_transcript(transcript: str, url_identifier: str) -> Dict[str, Any]:
+    """Analyze transcript and determine whether a final expense application was submitted.
+
+    This function mirrors the prompt and response handling used in the original
+    application submission script. It asks the DeepSeek API to evaluate whether
+    an application was submitted and to extract supporting details such as
+    monthly premium, carrier, customer name, phone number, and agent name.
+    Only the structured output specified in the prompt should be returned.
+    Returns an analysis_record.
+    """
+    if not transcript:
+        return analysis_record("Analysis skipped: Empty transcript")
+    if not DEEPSEEK_API_KEY:
+        return analysis_record("Analysis failed: No API key")
+
+    logger.info(f"Analyzing transcript for: {url_identifier[:60]}...")
+
+    cutoff_date_str = analysis_cutoff_date()
+
+    # Identical transcripts (voicemail, dead air) share one cached/in-flight result
+    cache_key = make_analysis_key(transcript, analysis_prompt_version(cutoff_date_str))
+    return analysis_cache.get_or_compute(
+        cache_key,
+        lambda: _request_analysis(prompt_transcript(transcript), cutoff_date_str),
+        cacheable=lambda analysis: analysis["fields"] is not None
+    )
+
+def _request_analysis(transcript: str, cutoff_date_str: str) -> Dict[str, Any]:
+    """Build the application prompt and POST it to DeepSeek (uncached)."""
+    # Construct the prompt exactly as in the original application analyzer.
+    prompt_content = f"""
+Analyze the following call transcript:
+--- TRANSCRIPT START ---
+{transcript}
+--- TRANSCRIPT END ---
+
+{analysis_objectives(cutoff_date_str)}
+
+{output_instructions()}
 """.strip()
 
     try:
-        headers = {
-            "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-            "Content-Type": "application/json"
-        }
         messages = [
-            {
-                "role": "system",
-                "content": "You are an AI assistant analyzing call transcripts. Provide ONLY the requested structured data."
-            },
+            {"role": "system", "content": ANALYSIS_SYSTEM_MESSAGE},
             {"role": "user", "content": prompt_content}
         ]
-        data = {
-            "messages": messages,
-            # Use the configured model if provided, otherwise default to deepseek-chat
-            "model": DEEPSEEK_MODEL or "deepseek-chat",
-            "max_tokens": 1024,
-            "temperature": 0.1,
-            "stream": False
-        }
-        resp = requests.post(
-            DEEPSEEK_ENDPOINT,
-            headers=headers,
-            json=data,
-            timeout=ANALYSIS_TIMEOUT
-        )
-        resp.raise_for_status()
-        result = resp.json()
-        if "choices" in result and result["choices"]:
-            return result["choices"][0]["message"]["content"].strip()
-        return "Analysis failed: No response"
+        result = deepseek.complete(messages, max_tokens=1024, temperature=0.1, **response_format_options())
+        analysis_text = DeepSeekClient.content(result)
+        usage = result.get("usage") or {}
+        if not analysis_text:
+            return analysis_record("Analysis failed: No response")
+        analysis, parsed_as = parse_analysis(analysis_text, ANALYSIS_RESPONSE_FORMAT)
+        if parsed_as != ANALYSIS_RESPONSE_FORMAT:
+            logger.warning("Analysis reply was not valid JSON; used the line parser")
+        return parsed_record(analysis, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0))
     except Exception as e:
         logger.error(f"Analysis error: {e}")
-        return f"Analysis failed: {str(e)}"
+        return analysis_record(f"Analysis failed: {str(e)}")
+
+# -----------------------------------------------------------------------------
+# BATCHED ANALYSIS (backfills)
+# -----------------------------------------------------------------------------
+_SECTION_RE = re.compile(r"=== CALL (\d+) ===\s*(.*?)\s*=== END CALL \1 ===", re.DOTALL)
+
+def parse_batch_sections(analysis_text: str, count: int) -> Dict[int, str]:
+    """Split a batched response into {call_number: section_text}.
+
+    Sections that are missing the Billable or Application Submitted field are
+    dropped so the caller can re-run those calls in single-call mode.
+    """
+    sections = {}
+    for match in _SECTION_RE.finditer(analysis_text or ""):
+        number = int(match.group(1))
+        body = match.group(2).strip()
+        if not 1 <= number <= count or number in sections:
+            continue
+        if not re.search(r'Billable:\s*(Yes|No)', body, re.IGNORECASE):
+            continue
+        if not re.search(r'Application Submitted:\s*(Yes|No)', body, re.IGNORECASE):
+            continue
+        sections[number] = body
+    return sections
+
+def _request_batch_analysis(transcripts: List[str], cutoff_date_str: str) -> Dict[int, Dict[str, Any]]:
+    """Analyze several transcripts in one request. Returns {index: analysis_record}.
+
+    The request's token usage is split across the calls in proportion to
+    their transcript and section lengths.
+    """
+    calls = "\n\n".join(
+        f"--- CALL {n} TRANSCRIPT START ---\n{transcript}\n--- CALL {n} TRANSCRIPT END ---"
+        for n, transcript in enumerate(transcripts, start=1)
+    )
+    prompt_content = f"""
+Analyze each of the following {len(transcripts)} call transcripts independently:
+{calls}
+
+{analysis_objectives(cutoff_date_str)}
+
+{output_instructions(batch=True)}
+""".strip()
+
+    messages = [
+        {"role": "system", "content": ANALYSIS_SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt_content}
+    ]
+    max_tokens = min(ANALYSIS_BATCH_MAX_OUTPUT_TOKENS, ANALYSIS_BATCH_OUTPUT_TOKENS_PER_CALL * len(transcripts))
+    try:
+        result = deepseek.complete(messages, max_tokens=max_tokens, temperature=0.1, **response_format_options())
+    except Exception as e:
+        logger.error(f"Batch analysis error: {e}")
+        return {}
+    content = DeepSeekClient.content(result)
+    if ANALYSIS_RESPONSE_FORMAT == "json":
+        parsed = parse_json_batch(content, len(transcripts))
+    else:
+        parsed = {}
+        for number, text in parse_batch_sections(content, len(transcripts)).items():
+            try:
+                parsed[number] = parse_text_analysis(text)
+            except AnalysisParseError:
+                continue  # re-run in single-call mode
+    usage = result.get("usage") or {}
+    input_chars = sum(len(t) for t in transcripts) or 1
+    output_chars = sum(len(analysis.to_text()) for analysis in parsed.values()) or 1
+    return {
+        number - 1: parsed_record(
+            analysis,
+            round(usage.get("prompt_tokens", 0) * len(transcripts[number - 1]) / input_chars),
+            round(usage.get("completion_tokens", 0) * len(analysis.to_text()) / output_chars)
+        )
+        for number, analysis in parsed.items()
+    }
+
+def pack_analysis_batches(transcripts: List[str]) -> List[List[int]]:
+    """Group transcript indexes into batches of at most ANALYSIS_BATCH_SIZE calls
+    whose combined transcripts fit within ANALYSIS_BATCH_MAX_TOKENS."""
+    batches, current, current_tokens = [], [], 0
+    for index, transcript in enumerate(transcripts):
+        tokens = len(transcript) // 4
+        if current and (len(current) >= ANALYSIS_BATCH_SIZE or current_tokens + tokens > ANALYSIS_BATCH_MAX_TOKENS):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def analyze_transcripts_batched(transcripts: List[str], labels: List[str]) -> List[Dict[str, Any]]:
+    """Batched counterpart of analyze_single_transcript for a list of transcripts.
+
+    Cached transcripts are answered from the analysis cache, the rest are
+    packed into multi-call requests, and any call whose section fails to
+    parse falls back to a single-call request.
+    """
+    analyses: List[Optional[Dict[str, Any]]] = [None] * len(transcripts)
+    if not DEEPSEEK_API_KEY:
+        return [
+            analysis_record("Analysis failed: No API key" if t else "Analysis skipped: Empty transcript")
+            for t in transcripts
+        ]
+
+    cutoff_date_str = analysis_cutoff_date()
+    prompt_version = analysis_prompt_version(cutoff_date_str)
+    pending = []
+    for index, transcript in enumerate(transcripts):
+        if not transcript:
+            analyses[index] = analysis_record("Analysis skipped: Empty transcript")
+            continue
+        cached = analysis_cache.get(make_analysis_key(transcript, prompt_version))
+        if cached is not None:
+            analyses[index] = cached
+        else:
+            pending.append(index)
+
+    prompts = {index: prompt_transcript(transcripts[index]) for index in pending}
+    for batch in pack_analysis_batches([prompts[i] for i in pending]):
+        indexes = [pending[i] for i in batch]
+        if len(indexes) == 1:
+            continue  # a batch of one is just the single-call prompt
+        logger.info(f"Analyzing {len(indexes)} transcripts in one request...")
+        sections = _request_batch_analysis([prompts[i] for i in indexes], cutoff_date_str)
+        for position, index in enumerate(indexes):
+            if position in sections:
+                analyses[index] = sections[position]
+                analysis_cache.put(make_analysis_key(transcripts[index], prompt_version), sections[position])
+        if len(sections) < len(indexes):
+            logger.warning(f"Batch parse recovered {len(sections)}/{len(indexes)} calls; falling back for the rest")
+
+    for index, analysis in enumerate(analyses):
+        if analysis is None:
+            analyses[index] = analyze_single_transcript(transcripts[index], labels[index])
+    return analyses
+
+def analysis_status(analysis: Dict[str, Any]) -> str:
+    """Call status for an analysed transcript; a failed analysis is retried on the next run."""
+    return "Success" if analysis["fields"] is not None else "Analysis Failed"
+
+def application_status(analysis: Dict[str, Any]) -> bool:
+    """Application Submitted from the parsed fields; skipped/failed analyses count as No."""
+    fields = analysis.get("fields")
+    if fields is not None:
+        return fields["applicationSubmitted"]
+    return extract_application_status(analysis["text"])
 
 def extract_application_status(analysis_text: str) -> bool:
     """Determine whether the analysis indicates an application was submitted.
@@ -321,204 +690,421 @@ def extract_application_status(analysis_text: str) -> bool:
 # -----------------------------------------------------------------------------
 # PARALLEL PROCESSING
 # -----------------------------------------------------------------------------
-def process_single_url(url_and_num):
-    """Process a single URL end-to-end (download → transcribe → analyze).
-
-    This is used by multiple worker threads so calls run in parallel.
-    """
-    url, i = url_and_num
-    logger.info(f"[{i}] Starting: {url[:120]}")
-
-    result: Dict[str, Any] = {
+class StageStats:
+    """Busy seconds per pipeline stage, reported as utilization of that stage's pool."""
+
+    def __init__(self, pools: Dict[str, Tuple[str, int]]):
+        self.pools = pools                      # stage -> (pool name, workers)
+        self.busy = {stage: 0.0 for stage in pools}
+        self.calls = {stage: 0 for stage in pools}
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self.lock:
+            self.busy[stage] += seconds
+            self.calls[stage] += 1
+
+    @contextmanager
+    def timed(self, stage: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(stage, time.monotonic() - started)
+
+    def report(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        with self.lock:
+            parts = []
+            for stage, (pool, workers) in self.pools.items():
+                calls = self.calls[stage]
+                avg = self.busy[stage] / calls if calls else 0.0
+                parts.append(
+                    f"{stage} {self.busy[stage] / (elapsed * workers):.0%} of {workers} {pool}"
+                    f" ({calls} runs, {avg:.1f}s avg)"
+                )
+        return " | ".join(parts)
+
+def new_result(url: str, i: int) -> Dict[str, Any]:
+    return {
         "url": url,
         "call_number": i,
         "status": "Processing",
         "transcript": "",
         "analysis": "",
-        "application_submitted": False
+        "application_submitted": False,
+        "analysis_fields": None,
+        "tokens_in": 0,
+        "tokens_out": 0
     }
 
-    # Download
+def download_stage(url: str):
+    """Returns (audio_file, audio_hash); audio_file is None when the download failed."""
+    if AUDIO_IN_MEMORY:
+        return fetch_audio_fast(url) or (None, None)
     audio_file = download_audio_fast(url, AUDIO_FOLDER)
-    if not audio_file:
-        result["status"] = "Download Failed"
-        result["analysis"] = "Analysis skipped: Download Failed"
-        return result
-
-    # Transcribe
-    transcript = transcribe_audio_fast(audio_file)
+    audio_hash = hash_file(audio_file) if audio_file and transcript_cache else None
+    return audio_file, audio_hash
+
+def remove_audio_file(audio_file, i: int):
+    if isinstance(audio_file, str):
+        try:
+            os.remove(audio_file)
+            logger.info(f"[{i}] Cleaned up audio file")
+        except Exception:
+            pass
+
+def apply_transcript(result: Dict[str, Any], transcript: str, analyze: bool) -> bool:
+    """Record the transcript; returns True when the call should go on to analysis."""
     result["transcript"] = transcript
-
-    # Cleanup audio
-    try:
-        os.remove(audio_file)
-        logger.info(f"[{i}] Cleaned up audio file")
-    except Exception:
-        pass
-
     if not transcript:
         result["status"] = "Transcription Failed"
         result["analysis"] = "Analysis skipped: No Transcript"
-        return result
-
-    # Analyze
-    analysis = analyze_single_transcript(transcript, url)
-    result["analysis"] = analysis
-    result["application_submitted"] = extract_application_status(analysis)
-    result["status"] = "Success"
-
-    gc.collect()
-    logger.info(f"✓ Completed call {i}")
+        return False
+    if not analyze:
+        result["status"] = "Transcribed"
+        return False
+    return True
+
+def analyze_stage(result: Dict[str, Any]) -> Dict[str, Any]:
+    analysis = analyze_single_transcript(result["transcript"], result["url"])
+    result["analysis"] = analysis["text"]
+    result["application_submitted"] = application_status(analysis)
+    result["analysis_fields"] = analysis["fields"]
+    result["tokens_in"], result["tokens_out"] = analysis["tokensIn"], analysis["tokensOut"]
+    result["analysis_cached"] = analysis.get("cached", False)
+    result["status"] = analysis_status(analysis)
+    logger.info(f"✓ Completed call {result['call_number']}")
     return result
 
-def process_all_urls(urls: List[str]) -> List[Dict[str, Any]]:
-    """FAST multithreaded version. Whisper stays loaded ONCE."""
-    all_results = []
-
-    if not urls:
-        return all_results
-
-    max_workers = min(10, len(urls))
-    logger.info(f"🚀 Running with {max_workers} threads...")
-
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = {
-            executor.submit(process_single_url, (url, i + 1)): i + 1
-            for i, url in enumerate(urls)
-        }
+def process_single_url(url_and_num, analyze: bool = True, stats: Optional[StageStats] = None):
+    """Process a single URL end-to-end (download → transcribe → analyze).
 
-        for future in as_completed(futures):
-            try:
-                all_results.append(future.result())
-            except Exception as e:
-                idx = futures[future]
-                logger.error(f"Error in thread for call {idx}: {e}")
+    This is used by multiple worker threads so calls run in parallel. With
+    analyze=False the result stops at status "Transcribed" so the caller can
+    analyze it as part of a batch.
+    """
+    url, i = url_and_num
+    logger.info(f"[{i}] Starting: {url[:120]}")
+    stats = stats or StageStats({"download": ("threads", 1), "transcribe": ("threads", 1), "analyze": ("threads", 1)})
+    result = new_result(url, i)
 
-    all_results.sort(key=lambda r: r["call_number"])
-    return all_results
+    with stats.timed("download"):
+        audio_file, audio_hash = download_stage(url)
+    if audio_file is None:
+        result["status"] = "Download Failed"
+        result["analysis"] = "Analysis skipped: Download Failed"
+        return result
 
-def save_separated_outputs(results: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """Save transcripts and analyses separated by application submission status.
+    # Transcribe (reuses the cached transcript when this audio was seen before)
+    with stats.timed("transcribe"):
+        transcript = transcribe_audio_fast(audio_file, transcript_cache_key(audio_hash))
+    remove_audio_file(audio_file, i)
+    audio_file = None
 
-    This function creates or appends to four files:
-        - applications_submitted_transcripts.txt
-        - applications_not_submitted_transcripts.txt
-        - applications_submitted_analysis.txt
-        - applications_not_submitted_analysis.txt
+    if not apply_transcript(result, transcript, analyze):
+        return result
+    with stats.timed("analyze"):
+        return analyze_stage(result)
+
+class ThreadPipeline:
+    """Threaded mode: each call runs start to finish on one of MAX_WORKERS threads."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        pool = ("threads", workers)
+        self.stats = StageStats({"download": pool, "transcribe": pool, "analyze": pool})
+        logger.info(f"🚀 Running with {workers} threads...")
+
+    def submit(self, url: str, number: int, analyze: bool) -> Future:
+        return self.executor.submit(process_single_url, (url, number), analyze, self.stats)
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+def _init_process_model(cpu_threads: int):
+    """Process pool initializer: one model per process, loaded once."""
+    global model
+    model = load_model(cpu_threads)
+
+def transcribe_in_process(audio, cache_key: Optional[str]) -> Tuple[str, float]:
+    """Process pool task; returns (transcript, seconds spent in this process)."""
+    started = time.monotonic()
+    if isinstance(audio, bytes):
+        audio = io.BytesIO(audio)
+    return transcribe_audio_fast(audio, cache_key), time.monotonic() - started
+
+class ProcessPipeline:
+    """Process pool mode: Whisper in `processes` model replicas, I/O on threads.
+
+    Each call is chained download (I/O thread) → transcribe (process) →
+    analyze (I/O thread) through future callbacks, so no thread is parked
+    waiting on the model and each pool can be sized on its own.
+    """
 
-    Each call that was successfully processed will be written to the appropriate
-    transcript and analysis file depending on whether an application was submitted.
-    A timestamp and session header are added at the start of each run.
+    def __init__(self, processes: int, cpu_threads: int, io_workers: int):
+        self.workers = processes + io_workers
+        self.io = ThreadPoolExecutor(max_workers=io_workers)
+        self.cpu = ProcessPoolExecutor(
+            max_workers=processes,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_process_model,
+            initargs=(cpu_threads,)
+        )
+        io_pool = ("I/O threads", io_workers)
+        self.stats = StageStats({
+            "download": io_pool,
+            "transcribe": ("processes", processes),
+            "analyze": io_pool
+        })
+        logger.info(f"🚀 Running {processes} model processes x {cpu_threads} threads + {io_workers} I/O threads...")
+
+    def submit(self, url: str, number: int, analyze: bool) -> Future:
+        final: Future = Future()
+        result = new_result(url, number)
+        logger.info(f"[{number}] Starting: {url[:120]}")
+
+        def guarded(step):
+            def callback(future):
+                try:
+                    step(future)
+                except Exception as e:
+                    if not final.done():
+                        final.set_exception(e)
+            return callback
+
+        def timed_download():
+            with self.stats.timed("download"):
+                return download_stage(url)
+
+        def timed_analyze():
+            with self.stats.timed("analyze"):
+                return analyze_stage(result)
+
+        def downloaded(future):
+            audio_file, audio_hash = future.result()
+            if audio_file is None:
+                result["status"] = "Download Failed"
+                result["analysis"] = "Analysis skipped: Download Failed"
+                final.set_result(result)
+                return
+            # Ship the encoded bytes; decoding is CPU work and happens in the process
+            payload = audio_file.getvalue() if hasattr(audio_file, "getvalue") else audio_file
+            transcribing = self.cpu.submit(transcribe_in_process, payload, transcript_cache_key(audio_hash))
+            transcribing.add_done_callback(guarded(lambda f: transcribed(f, audio_file)))
+
+        def transcribed(future, audio_file):
+            remove_audio_file(audio_file, number)
+            transcript, busy = future.result()
+            self.stats.add("transcribe", busy)
+            if apply_transcript(result, transcript, analyze):
+                self.io.submit(timed_analyze).add_done_callback(guarded(lambda f: final.set_result(f.result())))
+            else:
+                final.set_result(result)
+
+        self.io.submit(timed_download).add_done_callback(guarded(downloaded))
+        return final
+
+    def shutdown(self):
+        self.io.shutdown()
+        self.cpu.shutdown()
+
+def analyze_result_batch(results: List[Dict[str, Any]], stats: Optional[StageStats] = None):
+    """Fill in analysis fields for a group of transcribed results in place."""
+    if stats:
+        with stats.timed("analyze"):
+            return analyze_result_batch(results)
+    analyses = analyze_transcripts_batched([r["transcript"] for r in results], [r["url"] for r in results])
+    for result, analysis in zip(results, analyses):
+        result["analysis"] = analysis["text"]
+        result["application_submitted"] = application_status(analysis)
+        result["analysis_fields"] = analysis["fields"]
+        result["tokens_in"], result["tokens_out"] = analysis["tokensIn"], analysis["tokensOut"]
+        result["analysis_cached"] = analysis.get("cached", False)
+        result["status"] = analysis_status(analysis)
+        logger.info(f"✓ Completed call {result['call_number']}")
+
+def process_all_urls(urls: Iterable[str], checkpoint=None) -> Dict[str, Any]:
+    """Stream URLs through download → transcribe → analyze with flat memory.
+
+    URLs are pulled from the iterable only as slots free up. Each finished
+    call is appended to the output files and the checkpoint, then dropped.
+    URLs the checkpoint already has as Success are skipped. Returns this
+    run's counts.
     """
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-
-    # File paths (append mode)
-    app_submitted_transcripts = os.path.join(TRANSCRIPTS_FOLDER, "applications_submitted_transcripts.txt")
-    app_not_submitted_transcripts = os.path.join(TRANSCRIPTS_FOLDER, "applications_not_submitted_transcripts.txt")
-    app_submitted_analysis = os.path.join(ANALYSIS_FOLDER, "applications_submitted_analysis.txt")
-    app_not_submitted_analysis = os.path.join(ANALYSIS_FOLDER, "applications_not_submitted_analysis.txt")
-
-    # Counts for reporting
-    app_yes_count = sum(1 for r in results if r.get("application_submitted") and r["status"] == "Success")
-    app_no_count = sum(1 for r in results if not r.get("application_submitted") and r["status"] == "Success")
-
-    # Write transcripts for calls with submitted applications
-    with open(app_submitted_transcripts, "a", encoding="utf-8") as f:
-        f.write(f"\n{'='*80}\n")
-        f.write(f"SESSION: {timestamp}\n")
-        f.write(f"{'='*80}\n\n")
-        for result in results:
-            if result.get("application_submitted") and result["status"] == "Success":
-                f.write(f"--- CALL {result['call_number']} (Application Submitted: YES) ---\n")
-                f.write(f"URL: {result['url']}\n")
-                f.write(f"Timestamp: {timestamp}\n\n")
-                f.write("TRANSCRIPT:\n")
-                f.write(result["transcript"])
-                f.write("\n\n" + "-"*60 + "\n\n")
-
-    # Write transcripts for calls without submitted applications
-    with open(app_not_submitted_transcripts, "a", encoding="utf-8") as f:
-        f.write(f"\n{'='*80}\n")
-        f.write(f"SESSION: {timestamp}\n")
-        f.write(f"{'='*80}\n\n")
-        for result in results:
-            if not result.get("application_submitted") and result["status"] == "Success":
-                f.write(f"--- CALL {result['call_number']} (Application Submitted: NO) ---\n")
-                f.write(f"URL: {result['url']}\n")
-                f.write(f"Timestamp: {timestamp}\n\n")
-                f.write("TRANSCRIPT:\n")
-                f.write(result["transcript"])
-                f.write("\n\n" + "-"*60 + "\n\n")
-
-    # Write analysis for calls with submitted applications
-    with open(app_submitted_analysis, "a", encoding="utf-8") as f:
-        f.write(f"\n{'='*80}\n")
-        f.write(f"SESSION: {timestamp}\n")
-        f.write(f"{'='*80}\n\n")
-        for result in results:
-            if result.get("application_submitted") and result["status"] == "Success":
-                f.write(f"--- CALL {result['call_number']} (Application Submitted: YES) ---\n")
-                f.write(f"URL: {result['url']}\n")
-                f.write(f"Timestamp: {timestamp}\n\n")
-                f.write("ANALYSIS:\n")
-                f.write(result["analysis"])
-                f.write("\n\n" + "-"*60 + "\n\n")
-
-    # Write analysis for calls without submitted applications
-    with open(app_not_submitted_analysis, "a", encoding="utf-8") as f:
-        f.write(f"\n{'='*80}\n")
-        f.write(f"SESSION: {timestamp}\n")
-        f.write(f"{'='*80}\n\n")
-        for result in results:
-            if not result.get("application_submitted") and result["status"] == "Success":
-                f.write(f"--- CALL {result['call_number']} (Application Submitted: NO) ---\n")
-                f.write(f"URL: {result['url']}\n")
-                f.write(f"Timestamp: {timestamp}\n\n")
-                f.write("ANALYSIS:\n")
-                f.write(result["analysis"])
-                f.write("\n\n" + "-"*60 + "\n\n")
-
-    logger.info(f"\n✓ Files saved successfully!")
-    logger.info(f"   Applications Submitted (YES): {app_yes_count} calls")
-    logger.info(f"   - Transcripts: {app_submitted_transcripts}")
-    logger.info(f"   - Analysis:   {app_submitted_analysis}")
-    logger.info(f"\n   Applications NOT Submitted (NO): {app_no_count} calls")
-    logger.info(f"   - Transcripts: {app_not_submitted_transcripts}")
-    logger.info(f"   - Analysis:   {app_not_submitted_analysis}")
-
+    write_session_headers(timestamp)
+    summary = {"total": 0, "skipped": 0, "app_yes": 0, "app_no": 0, "failed": 0, "tokens_in": 0, "tokens_out": 0}
+    summary_lock = threading.Lock()
+
+    batch_analysis = ANALYSIS_BATCH_SIZE > 1
+    if batch_analysis:
+        logger.info(f"📦 Batched analysis: up to {ANALYSIS_BATCH_SIZE} calls per request")
+    if TRANSCRIBE_PROCESS_COUNT:
+        pipeline = ProcessPipeline(TRANSCRIBE_PROCESS_COUNT, TRANSCRIBE_CPU_THREADS, IO_WORKERS)
+    else:
+        pipeline = ThreadPipeline(MAX_WORKERS)
+    max_in_flight = MAX_IN_FLIGHT or pipeline.workers * 2
+    analysis_workers = max(1, MAX_WORKERS // 2)
+    analysis_executor = ThreadPoolExecutor(max_workers=analysis_workers)
+    analysis_futures = set()
+    pending: List[Dict[str, Any]] = []
+    in_flight: Dict[Any, str] = {}
+
+    def finish(results: List[Dict[str, Any]]):
+        with summary_lock:
+            for result in results:
+                if checkpoint:
+                    checkpoint.record(result)
+                if result["status"] != "Success":
+                    summary["failed"] += 1
+                elif result["application_submitted"]:
+                    summary["app_yes"] += 1
+                else:
+                    summary["app_no"] += 1
+                summary["tokens_in"] += result["tokens_in"]
+                summary["tokens_out"] += result["tokens_out"]
+            save_separated_outputs(results, timestamp)
+            finished = summary["app_yes"] + summary["app_no"] + summary["failed"]
+            if UTILIZATION_REPORT_EVERY and finished // UTILIZATION_REPORT_EVERY > (finished - len(results)) // UTILIZATION_REPORT_EVERY:
+                logger.info(f"📊 {finished} calls done | {pipeline.stats.report()}")
+                gc.collect()
+
+    def analyze_and_finish(results: List[Dict[str, Any]]):
+        try:
+            analyze_result_batch(results, pipeline.stats)
+        except Exception as e:
+            logger.error(f"Error in batch analysis: {e}")
+        finish(results)
+
+    def submit_analysis(results: List[Dict[str, Any]]):
+        # Bound queued analysis batches too, so a slow API cannot pile up transcripts
+        while len(analysis_futures) >= analysis_workers * 2:
+            done, _ = wait(analysis_futures, return_when=FIRST_COMPLETED)
+            analysis_futures.difference_update(done)
+        analysis_futures.add(analysis_executor.submit(analyze_and_finish, results))
+
+    def collect(done):
+        nonlocal pending
+        for future in done:
+            url = in_flight.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Error in thread for {url[:120]}: {e}")
+                continue
+            if result["status"] != "Transcribed":
+                finish([result])
+                continue
+            pending.append(result)
+            if len(pending) >= ANALYSIS_BATCH_SIZE:
+                submit_analysis(pending)
+                pending = []
+
+    logger.info(f"Up to {max_in_flight} calls in flight")
+    try:
+        for number, url in enumerate(urls, start=1):
+            summary["total"] += 1
+            if url in in_flight.values() or (checkpoint and checkpoint.is_done(url)):
+                summary["skipped"] += 1
+                continue
+            while len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight[pipeline.submit(url, number, not batch_analysis)] = url
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            collect(done)
+
+        if pending:
+            submit_analysis(pending)
+        wait(analysis_futures)
+    finally:
+        analysis_executor.shutdown()
+        pipeline.shutdown()
+    summary["utilization"] = pipeline.stats.report()
+    return summary
+
+def output_paths() -> Dict[str, str]:
     return {
-        "app_yes": app_yes_count,
-        "app_no": app_no_count,
-        "files": {
-            "transcripts_yes": app_submitted_transcripts,
-            "transcripts_no": app_not_submitted_transcripts,
-            "analysis_yes": app_submitted_analysis,
-            "analysis_no": app_not_submitted_analysis
-        }
+        "transcripts_yes": os.path.join(TRANSCRIPTS_FOLDER, "applications_submitted_transcripts.txt"),
+        "transcripts_no": os.path.join(TRANSCRIPTS_FOLDER, "applications_not_submitted_transcripts.txt"),
+        "analysis_yes": os.path.join(ANALYSIS_FOLDER, "applications_submitted_analysis.txt"),
+        "analysis_no": os.path.join(ANALYSIS_FOLDER, "applications_not_submitted_analysis.txt")
     }
 
+def write_session_headers(timestamp: str):
+    """Start a session block in each of the four output files."""
+    for path in output_paths().values():
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(f"\n{'='*80}\n")
+            f.write(f"SESSION: {timestamp}\n")
+            f.write(f"{'='*80}\n\n")
+
+def save_separated_outputs(results: List[Dict[str, Any]], timestamp: str):
+    """Append transcripts and analyses, separated by application submission status.
+
+    Each successfully processed call is appended to the transcript and the
+    analysis file for its status, under the session block started by
+    write_session_headers. Called as calls finish, so nothing is lost if the
+    run stops part way.
+    """
+    paths = output_paths()
+    for result in results:
+        if result["status"] != "Success":
+            continue
+        submitted = bool(result.get("application_submitted"))
+        suffix = "yes" if submitted else "no"
+        header = f"--- CALL {result['call_number']} (Application Submitted: {'YES' if submitted else 'NO'}) ---\n"
+
+        with open(paths[f"transcripts_{suffix}"], "a", encoding="utf-8") as f:
+            f.write(header)
+            f.write(f"URL: {result['url']}\n")
+            f.write(f"Timestamp: {timestamp}\n\n")
+            f.write("TRANSCRIPT:\n")
+            f.write(result["transcript"])
+            f.write("\n\n" + "-"*60 + "\n\n")
+
+        with open(paths[f"analysis_{suffix}"], "a", encoding="utf-8") as f:
+            f.write(header)
+            f.write(f"URL: {result['url']}\n")
+            f.write(f"Timestamp: {timestamp}\n")
+            cached = " (cached analysis)" if result.get("analysis_cached") else ""
+            f.write(f"Tokens: {result['tokens_in']} in / {result['tokens_out']} out{cached}\n\n")
+            f.write("ANALYSIS:\n")
+            f.write(result["analysis"])
+            f.write("\n\n" + "-"*60 + "\n\n")
+
 # -----------------------------------------------------------------------------
 # Main
 # -----------------------------------------------------------------------------
 if __name__ == "__main__":
     logger.info("🎯 Faster-Whisper Call Analysis Started")
 
-    urls = read_urls_from_file("urls3.txt")
-    if not urls:
-        logger.error("No URLs found in urls3.txt")
-        sys.exit(1)
+    checkpoint = open_checkpoint(CHECKPOINT_PATH)
+    if checkpoint:
+        logger.info(f"Checkpoint {CHECKPOINT_PATH}: {checkpoint.summary()['done']} calls already done")
 
     start_time = datetime.datetime.now()
-    results = process_all_urls(urls)
-
-    # Save outputs separated by application submission status
-    output_info = save_separated_outputs(results)
+    summary = process_all_urls(iter_urls(URL_FILE), checkpoint)
+    if summary["total"] == 0:
+        logger.error(f"No URLs found in {URL_FILE}")
+        sys.exit(1)
 
+    paths = output_paths()
     duration = (datetime.datetime.now() - start_time).total_seconds()
     logger.info("\n" + "="*70)
     logger.info("✓ PROCESSING COMPLETE")
-    logger.info(f"Total URLs: {len(urls)}")
+    logger.info(f"Total URLs: {summary['total']} ({summary['skipped']} skipped as done or duplicate, {summary['failed']} failed)")
     logger.info(f"Time: {duration:.1f} seconds ({duration/60:.1f} minutes)")
-    logger.info(f"Applications Submitted: {output_info['app_yes']}")
-    logger.info(f"Applications NOT Submitted: {output_info['app_no']}")
+    logger.info(f"Applications Submitted: {summary['app_yes']} ({paths['transcripts_yes']}, {paths['analysis_yes']})")
+    logger.info(f"Applications NOT Submitted: {summary['app_no']} ({paths['transcripts_no']}, {paths['analysis_no']})")
+    logger.info(f"Tokens in/out: {summary['tokens_in']}/{summary['tokens_out']}")
+    logger.info(f"Stage utilization: {summary['utilization']}")
+    if checkpoint:
+        logger.info(f"Checkpoint totals: {checkpoint.summary()}")
+    logger.info(f"Analysis cache: {analysis_cache.stats()}")
+    logger.info(f"DeepSeek client: {deepseek.stats()}")
     logger.info("="*70)
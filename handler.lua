@@ -28,6 +28,9 @@ for i=1, 20 do
     end
 end
 
+-- Expose the AI result on the channel (reported in CHANNEL_HANGUP_COMPLETE to the dialer)
+session:setVariable("hopwhistle_result", (string.gsub(result, "%s+", "")))
+
 -- Finalizing Duration before Bridge or Hangup
 local end_time = os.time()
 local duration = os.difftime(end_time, start_time)
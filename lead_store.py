@@ -0,0 +1,269 @@
+"""SQLite lead store for the dialer.
+
+Leads live in one WAL-mode table keyed by number, with an index on
+(status, generation, id). The dialer walks undialed leads with an id
+cursor, K rows per query, instead of re-reading LEAD_FILE and
+PROGRESS_FILE into memory every batch.
+
+A lead is claimed ("dialing", committed at once) just before its
+originate, so a crash never re-dials a number that was sent. Outcomes
+are buffered and committed in batches, and the same batch is appended to
+PROGRESS_FILE.
+
+LEAD_FILE is still the way leads come in (the API rewrites it and the
+Streamlit app appends to it). It is rescanned only when its size or mtime
+changes. Each rescan bumps the generation, so a lead dropped from a
+rewritten file stops being dialed, the same as with the old re-read.
+
+PROGRESS_FILE (already_called.log) keeps its old contract: every number
+in it counts as called. The store remembers the file's inode, size and
+mtime after each append. When they differ at the next sync, the file was
+edited or deleted outside the dialer: every "done" lead goes back to "new"
+and the file is imported again, so numbers removed from it are dialed
+again. Claimed ("dialing") leads stay claimed, since their originate may
+already have gone out before a crash.
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import logging
+import threading
+from typing import Iterator, List, Optional
+
+log = logging.getLogger(__name__)
+
+NEW, DIALING, DONE = "new", "dialing", "done"
+IMPORT_CHUNK = 5000
+
+
+def _numbers(path: str) -> Iterator[str]:
+    with open(path, 'r') as f:
+        for line in f:
+            number = line.strip()
+            if number:
+                yield number
+
+
+def _chunks(items: Iterator, size: int) -> Iterator[List]:
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class LeadStore:
+    def __init__(self, path: str, commit_every: int = 50, commit_sec: float = 2.0):
+        self.path = path
+        self.commit_every = commit_every
+        self.commit_sec = commit_sec
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS leads ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " number TEXT NOT NULL UNIQUE,"
+            " status TEXT NOT NULL,"
+            " generation INTEGER NOT NULL,"
+            " outcome TEXT,"
+            " updated REAL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS leads_status ON leads (status, generation, id)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self.generation = int(self._meta('generation') or 0)
+        self.pending = []  # (outcome, updated, number) waiting for the next commit
+        self.last_commit = time.time()
+        self.progress_file: Optional[str] = None
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    @staticmethod
+    def _progress_signature(progress_file: str) -> str:
+        try:
+            st = os.stat(progress_file)
+        except FileNotFoundError:
+            return "missing"
+        return f"{st.st_ino}:{st.st_size}:{st.st_mtime_ns}"
+
+    # --- import ---
+    def sync(self, lead_file: str, progress_file: Optional[str] = None) -> bool:
+        """Rescan LEAD_FILE if it changed since the last scan; True when it did.
+
+        Also (re)imports PROGRESS_FILE when it was edited or deleted since the
+        dialer last wrote it.
+        """
+        try:
+            st = os.stat(lead_file)
+        except FileNotFoundError:
+            return False
+        if progress_file:
+            self.progress_file = progress_file
+        signature = f"{st.st_size}:{st.st_mtime_ns}"
+        if signature == self._meta('lead_file_signature') and self.generation:
+            if progress_file:
+                with self.lock:
+                    self._sync_progress(progress_file)
+            return False
+
+        started = time.time()
+        with self.lock:
+            generation = self.generation + 1
+            count = 0
+            self.db.execute("BEGIN")
+            try:
+                for chunk in _chunks(_numbers(lead_file), IMPORT_CHUNK):
+                    self.db.executemany(
+                        "INSERT INTO leads (number, status, generation) VALUES (?, ?, ?)"
+                        " ON CONFLICT(number) DO UPDATE SET generation = excluded.generation",
+                        [(number, NEW, generation) for number in chunk]
+                    )
+                    count += len(chunk)
+                self._set_meta('generation', generation)
+                self._set_meta('lead_file_signature', signature)
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+            self.generation = generation
+            log.info(f"[LEADS] Imported {count} leads from {lead_file} "
+                     f"(generation {generation}, {time.time() - started:.1f}s)")
+
+            if progress_file:
+                self._sync_progress(progress_file)
+        return True
+
+    def _sync_progress(self, progress_file: str):
+        """Import PROGRESS_FILE unless it is exactly as this store last left it (lock held)."""
+        stored = self._meta('progress_signature')
+        if stored == self._progress_signature(progress_file):
+            return
+        if stored is not None:
+            log.info(f"[LEADS] {progress_file} changed outside the dialer; re-reading it")
+        self._import_progress(progress_file, reset=stored is not None)
+
+    def _import_progress(self, progress_file: str, reset: bool):
+        """Mark every number in PROGRESS_FILE done; with `reset`, other done leads go back to new."""
+        count = 0
+        self.db.execute("BEGIN")
+        try:
+            if reset:
+                self.db.execute("UPDATE leads SET status = ? WHERE status = ?", (NEW, DONE))
+            if os.path.exists(progress_file):
+                now = time.time()
+                for chunk in _chunks(_numbers(progress_file), IMPORT_CHUNK):
+                    # Numbers no longer in LEAD_FILE are kept (generation 0) so they stay done
+                    self.db.executemany(
+                        "INSERT INTO leads (number, status, generation, outcome, updated) VALUES (?, ?, 0, 'imported', ?)"
+                        " ON CONFLICT(number) DO UPDATE SET status = excluded.status, outcome = excluded.outcome,"
+                        " updated = excluded.updated",
+                        [(number, DONE, now) for number in chunk]
+                    )
+                    count += len(chunk)
+            if not reset:
+                # First sync: numbers called before the file was tracked go into it
+                dialed = self.db.execute(
+                    "SELECT number FROM leads WHERE status != ? AND outcome IS NOT 'imported' ORDER BY updated",
+                    (NEW,)
+                ).fetchall()
+                self._append_progress(progress_file, [number for number, in dialed])
+            self._set_meta('progress_signature', self._progress_signature(progress_file))
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+        log.info(f"[LEADS] Imported {count} completed numbers from {progress_file}")
+
+    @staticmethod
+    def _append_progress(progress_file: str, numbers: List[str]):
+        if numbers:
+            with open(progress_file, 'a') as f:
+                f.write("".join(f"{number}\n" for number in numbers))
+
+    # --- dialing ---
+    def iter_undialed(self, page_size: int = 500) -> Iterator[str]:
+        """Undialed leads of the current generation in file order, fetched page_size at a time."""
+        cursor = 0
+        while True:
+            with self.lock:
+                rows = self.db.execute(
+                    "SELECT id, number FROM leads WHERE status = ? AND generation = ? AND id > ?"
+                    " ORDER BY id LIMIT ?", (NEW, self.generation, cursor, page_size)
+                ).fetchall()
+            if not rows:
+                return
+            for lead_id, number in rows:
+                cursor = lead_id
+                yield number
+
+    def claim(self, number: str):
+        """Commit a lead as dialing before its originate is sent, so a restart skips it."""
+        with self.lock:
+            self.db.execute(
+                "UPDATE leads SET status = ?, updated = ? WHERE number = ?", (DIALING, time.time(), number)
+            )
+
+    def release(self, number: str):
+        """Undo claim() for an originate that was never sent."""
+        with self.lock:
+            self.db.execute("UPDATE leads SET status = ? WHERE number = ? AND status = ?", (NEW, number, DIALING))
+
+    def mark_done(self, number: str, outcome: Optional[str] = None):
+        """Buffer a finished lead's outcome; commits every commit_every leads or commit_sec seconds."""
+        self.pending.append((outcome, time.time(), number))
+        if len(self.pending) >= self.commit_every or time.time() - self.last_commit >= self.commit_sec:
+            self.flush()
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        self.last_commit = time.time()
+        if not pending:
+            return
+        with self.lock:
+            self.db.execute("BEGIN")
+            self.db.executemany(
+                f"UPDATE leads SET status = '{DONE}', outcome = ?, updated = ? WHERE number = ?", pending
+            )
+            if self.progress_file:
+                try:
+                    self._append_progress(self.progress_file, [number for _, _, number in pending])
+                    self._set_meta('progress_signature', self._progress_signature(self.progress_file))
+                except OSError as e:
+                    log.warning(f"[LEADS] Could not append to {self.progress_file}: {e}")
+            self.db.execute("COMMIT")
+
+    def remaining(self) -> int:
+        with self.lock:
+            return self.db.execute(
+                "SELECT COUNT(*) FROM leads WHERE status = ? AND generation = ?", (NEW, self.generation)
+            ).fetchone()[0]
+
+    def done(self) -> int:
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM leads WHERE status != ?", (NEW,)).fetchone()[0]
+
+    def close(self):
+        self.flush()
+        self.db.close()
+
+
+if __name__ == '__main__':
+    # One-off import: python3 lead_store.py LEAD_DB LEAD_FILE [PROGRESS_FILE]
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    if len(sys.argv) < 3:
+        sys.exit("usage: lead_store.py LEAD_DB LEAD_FILE [PROGRESS_FILE]")
+    store = LeadStore(sys.argv[1])
+    store.sync(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
+    log.info(f"{store.remaining()} leads to dial, {store.done()} done")
+    store.close()
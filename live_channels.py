@@ -0,0 +1,150 @@
+"""Live-channel table for the dialer, fed by ESL channel events.
+
+Every originate gets its own origination_uuid, and the dialer reserves a
+row for it before sending the command. CHANNEL_CREATE / CHANNEL_ANSWER /
+CHANNEL_HANGUP_COMPLETE events then move the row through ringing ->
+answered -> ended. A call holds its dial slot until it really hangs up,
+so MAX_CONCURRENT_CALLS limits live channels rather than originate
+commands.
+
+Events arrive on the ESL reader thread and are handed to the event loop
+with call_soon_threadsafe; the table itself is only touched on the loop.
+Finished calls are appended to CALL_LOG_FILE as JSON lines (outcome,
+hangup cause, ring and talk time).
+"""
+
+import asyncio
+import json
+import time
+import logging
+from typing import Callable, Dict, List, Optional
+
+log = logging.getLogger(__name__)
+
+CHANNEL_EVENTS = ['CHANNEL_CREATE', 'CHANNEL_ANSWER', 'CHANNEL_HANGUP_COMPLETE']
+
+
+class LiveChannels:
+    def __init__(self, log_file: Optional[str] = None, stale_after: float = 7200.0):
+        self.loop = asyncio.get_running_loop()
+        self.log_file = log_file
+        self.stale_after = stale_after
+        self.calls: Dict[str, dict] = {}
+        self.changed = asyncio.Condition()
+        self.listeners: List[Callable[[dict], None]] = []
+        self.totals = {"answered": 0, "failed": 0, "stale": 0}
+
+    def __len__(self) -> int:
+        return len(self.calls)
+
+    def add_listener(self, listener: Callable[[dict], None]):
+        """Call `listener(record)` on the loop for every finished call."""
+        self.listeners.append(listener)
+
+    # --- dialer side (event loop) ---
+    def reserve(self, uuid: str, number: str):
+        """Claim a slot for an originate that is about to be sent."""
+        self.calls[uuid] = {
+            "uuid": uuid,
+            "number": number,
+            "state": "dialing",
+            "started": time.time(),
+            "created": None,
+            "answered": None,
+            "legCauses": []
+        }
+
+    def job_done(self, uuid: str, ok: bool, error: Optional[str] = None):
+        """Originate result: a failed originate frees its slot now."""
+        call = self.calls.get(uuid)
+        if call is None:
+            return
+        if ok:
+            call["answered"] = call["answered"] or time.time()
+            call["state"] = "answered"
+        else:
+            if error and error.startswith('-ERR'):
+                error = error[4:].strip()  # "-ERR NO_ANSWER" -> "NO_ANSWER"
+            self._finish(uuid, "failed", cause=error or (call["legCauses"][-1] if call["legCauses"] else None))
+
+    async def wait_for_slot(self, limit: int):
+        """Block until fewer than `limit` calls are live."""
+        async with self.changed:
+            while len(self.calls) >= limit:
+                self._sweep()
+                if len(self.calls) < limit:
+                    break
+                try:
+                    await asyncio.wait_for(self.changed.wait(), timeout=30)
+                except asyncio.TimeoutError:
+                    pass
+
+    # --- ESL side (reader thread) ---
+    def handle_event(self, event: dict):
+        if event.get('Event-Name') in CHANNEL_EVENTS:
+            self.loop.call_soon_threadsafe(self._apply, event)
+
+    def _apply(self, event: dict):
+        uuid = event.get('Unique-ID')
+        call = self.calls.get(uuid)
+        if call is None:
+            return  # not one of ours (agent bridge legs, inbound calls)
+        name = event['Event-Name']
+        if name == 'CHANNEL_CREATE':
+            call["created"] = call["created"] or time.time()
+            if call["state"] == "dialing":
+                call["state"] = "ringing"
+        elif name == 'CHANNEL_ANSWER':
+            call["answered"] = call["answered"] or time.time()
+            call["state"] = "answered"
+        elif call["state"] == "answered":
+            self._finish(uuid, "answered", cause=event.get('Hangup-Cause'),
+                         result=event.get('variable_hopwhistle_result'),
+                         billsec=event.get('variable_billsec'))
+        else:
+            # An unanswered leg of the failover chain; the next leg reuses the
+            # UUID, so the slot is only freed by the originate result
+            call["legCauses"].append(event.get('Hangup-Cause'))
+            call["state"] = "dialing"
+
+    def _finish(self, uuid: str, status: str, cause: Optional[str] = None,
+                result: Optional[str] = None, billsec: Optional[str] = None):
+        call = self.calls.pop(uuid, None)
+        if call is None:
+            return
+        now = time.time()
+        answered = call["answered"]
+        record = {
+            "uuid": uuid,
+            "number": call["number"],
+            "status": status,
+            "cause": cause,
+            "result": result,
+            "ringSec": round((answered or now) - call["started"], 2),
+            "talkSec": round(now - answered, 2) if answered else 0.0,
+            "billsec": int(billsec) if billsec and billsec.isdigit() else None,
+            "legCauses": call["legCauses"],
+            "ended": now
+        }
+        self.totals[status] = self.totals.get(status, 0) + 1
+        log.info(f"[CALL] {call['number']} {status} ({cause or 'n/a'}, talk {record['talkSec']:.0f}s"
+                 f"{', ' + result if result else ''})")
+        if self.log_file:
+            try:
+                with open(self.log_file, 'a') as f:
+                    f.write(json.dumps(record) + "\n")
+            except OSError as e:
+                log.warning(f"Could not write call log: {e}")
+        for listener in self.listeners:
+            listener(record)
+        self.loop.create_task(self._notify())
+
+    def _sweep(self):
+        """Drop rows whose hangup never arrived (e.g. lost while ESL reconnected)."""
+        cutoff = time.time() - self.stale_after
+        for uuid in [u for u, call in self.calls.items() if call["started"] < cutoff]:
+            self._finish(uuid, "stale")
+
+    async def _notify(self):
+        async with self.changed:
+            self.changed.notify_all()
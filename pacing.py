@@ -0,0 +1,157 @@
+"""Predictive pacing for the dialer, driven by the live-channel table.
+
+Every finished call (LiveChannels listener record) goes into a rolling
+window, which gives the answer rate (answered / dialed) and the human rate
+(HUMAN_POSITIVE / answered, the same outcomes dashboard.py counts). Their
+product p is the chance that one dial turns into a transfer.
+
+Calls are split by where they are:
+  pending      originating, ringing, or answered but still inside the
+               screening window (playback + record + AI verdict)
+  transferred  answered calls still up after PACING_SCREEN_SEC, i.e.
+               bridged to an agent
+
+With `free = agents - transferred`, the transfers coming out of N pending
+calls are ~Binomial(N, p); every transfer beyond `free` is an abandoned
+call. The controller dials while N is below the largest value whose
+expected abandonment ratio E[(X - free)+] / E[X] stays under the target.
+
+Safety rails: until PACING_MIN_SAMPLES calls have finished, p is taken as
+1 (one dial per free agent). If the measured abandonment over the window
+(HUMAN_POSITIVE calls that hung up before a transfer could hold) goes over
+the hard cap, the controller also falls back to one dial per free agent
+until the window recovers. Dials are never closer together than 1/max_cps.
+"""
+
+import asyncio
+import time
+import logging
+from collections import deque
+from typing import Dict
+
+log = logging.getLogger(__name__)
+
+HUMAN = "HUMAN_POSITIVE"
+
+
+def expected_abandon_ratio(pending: int, p: float, free: int) -> float:
+    """E[(X - free)+] / E[X] for X ~ Binomial(pending, p)."""
+    if pending <= 0 or p <= 0:
+        return 0.0
+    if free <= 0:
+        return 1.0
+    expected = pending * p
+    # E[min(X, free)] = sum_{k < free} P(X > k)
+    q = 1.0 - p
+    pmf = q ** pending if q > 0 else 0.0
+    cdf = 0.0
+    served = 0.0
+    for k in range(min(free, pending + 1)):
+        cdf += pmf
+        served += 1.0 - cdf
+        if q > 0:
+            pmf *= (pending - k) / (k + 1) * p / q
+        else:
+            pmf = 1.0 if k + 1 == pending else 0.0
+    return max(0.0, expected - served) / expected
+
+
+def max_pending(p: float, free: int, target: float, limit: int) -> int:
+    """Largest N <= limit with expected_abandon_ratio(N, p, free) <= target."""
+    if free <= 0:
+        return 0
+    if p >= 1.0:
+        return min(free, limit)
+    best = min(free, limit)
+    n = best + 1
+    while n <= limit and expected_abandon_ratio(n, p, free) <= target:
+        best = n
+        n += 1
+    return best
+
+
+class PacingController:
+    def __init__(self, live, agents: int = 1, target_abandon: float = 0.02, max_abandon: float = 0.03,
+                 max_cps: float = 1.0, window: int = 200, min_samples: int = 30,
+                 screen_sec: float = 15.0, min_transfer_sec: float = 5.0, limit: int = 10):
+        self.live = live
+        self.agents = max(1, agents)
+        self.max_abandon = max_abandon
+        self.target_abandon = min(target_abandon, max_abandon)
+        self.min_interval = 1.0 / max_cps if max_cps > 0 else 0.0
+        self.min_samples = min_samples
+        self.screen_sec = screen_sec
+        self.min_transfer_sec = min_transfer_sec
+        self.limit = limit
+        self.records = deque(maxlen=window)
+        self.last_dial = 0.0
+        self.last_log = 0.0
+        live.add_listener(self.record)
+
+    def record(self, record: dict):
+        """LiveChannels listener: one finished call."""
+        if record["status"] == "stale":
+            return
+        answered = record["status"] == "answered"
+        human = answered and (record.get("result") or "").startswith(HUMAN)
+        # A "human" that was gone before the bridge could hold was dropped on an agent-less line
+        abandoned = human and record["talkSec"] < self.screen_sec + self.min_transfer_sec
+        self.records.append((answered, human, abandoned))
+
+    def rates(self) -> Dict[str, float]:
+        dialed = len(self.records)
+        answered = sum(1 for a, _, _ in self.records if a)
+        humans = sum(1 for _, h, _ in self.records if h)
+        abandoned = sum(1 for _, _, ab in self.records if ab)
+        return {
+            "samples": dialed,
+            "answerRate": answered / dialed if dialed else 0.0,
+            "humanRate": humans / answered if answered else 0.0,
+            "abandonRate": abandoned / humans if humans else 0.0
+        }
+
+    def plan(self) -> dict:
+        """Current rates, live split and the pending-call target."""
+        now = time.time()
+        pending = transferred = 0
+        for call in self.live.calls.values():
+            if call["answered"] and now - call["answered"] >= self.screen_sec:
+                transferred += 1
+            else:
+                pending += 1
+        rates = self.rates()
+        free = self.agents - transferred
+        if rates["samples"] < self.min_samples:
+            mode, p = "warmup", 1.0
+        elif rates["abandonRate"] > self.max_abandon:
+            mode, p = "capped", 1.0
+        else:
+            # Floor p so a window with no transfers yet cannot open the dialer all the way
+            mode, p = "predictive", max(rates["answerRate"] * rates["humanRate"], 1.0 / (rates["samples"] + 1))
+        target = max_pending(p, free, self.target_abandon, self.limit)
+        return dict(rates, mode=mode, p=round(p, 4), pending=pending, transferred=transferred,
+                    free=free, target=target)
+
+    async def wait_turn(self) -> dict:
+        """Block until the next dial is allowed; returns the plan it was allowed under."""
+        while True:
+            plan = self.plan()
+            now = time.time()
+            if now - self.last_log >= 30:
+                self.last_log = now
+                log.info(f"[PACING] {plan['mode']}: answer {plan['answerRate']:.0%}, human {plan['humanRate']:.0%}, "
+                         f"abandon {plan['abandonRate']:.1%} ({plan['samples']} calls) | pending "
+                         f"{plan['pending']}/{plan['target']}, agents busy {plan['transferred']}/{self.agents}")
+            wait = self.last_dial + self.min_interval - now
+            if plan["pending"] < plan["target"]:
+                if wait <= 0:
+                    self.last_dial = now
+                    return plan
+                await asyncio.sleep(wait)
+                continue
+            # Wake on a hangup, or re-check as calls age past the screening window
+            async with self.live.changed:
+                try:
+                    await asyncio.wait_for(self.live.changed.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
@@ -0,0 +1,126 @@
+"""Fake FreeSWITCH mod_event_socket for the dialer tests.
+
+Speaks just enough inbound ESL: the auth/request greeting, `auth`,
+`event plain`, `api` and `bgapi`. A bgapi job answers with a command/reply
+and then a BACKGROUND_JOB event (body from `job_body`) on every connection
+subscribed to it. `stop()` drops every client and stops listening;
+`start()` listens again on the same port.
+"""
+
+import socket
+import threading
+from urllib.parse import quote
+
+
+class FakeESL:
+    def __init__(self, password: str = "ClueCon", port: int = 0):
+        self.password = password
+        self.port = port
+        self.job_body = "+OK 00000000-0000-0000-0000-000000000000\n"
+        self.commands = []
+        self.logins = 0
+        self.lock = threading.Lock()
+        self.clients = []      # (socket, write lock)
+        self.subscribers = []  # (socket, write lock, event names)
+        self.server = None
+
+    def start(self):
+        self.server = socket.socket()
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("127.0.0.1", self.port))
+        self.server.listen(16)
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._accept, args=(self.server,), daemon=True).start()
+
+    def stop(self):
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)  # wakes the blocked accept()
+        except OSError:
+            pass
+        self.server.close()
+        with self.lock:
+            clients, self.clients, self.subscribers = self.clients, [], []
+        for client, _ in clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            client.close()
+
+    def _accept(self, server):
+        while True:
+            try:
+                client, _ = server.accept()
+            except OSError:
+                return
+            write_lock = threading.Lock()
+            with self.lock:
+                self.clients.append((client, write_lock))
+            threading.Thread(target=self._serve, args=(client, write_lock), daemon=True).start()
+
+    def _send(self, client, write_lock, data: str):
+        with write_lock:
+            client.sendall(data.encode())
+
+    def send_event(self, headers: dict, body: str = ""):
+        headers = dict(headers)
+        if body:
+            headers["Content-Length"] = str(len(body))
+        payload = "".join(f"{key}: {quote(str(value))}\n" for key, value in headers.items()) + "\n" + body
+        message = f"Content-Length: {len(payload.encode())}\nContent-Type: text/event-plain\n\n{payload}"
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for client, write_lock, events in subscribers:
+            if headers["Event-Name"] in events:
+                try:
+                    self._send(client, write_lock, message)
+                except OSError:
+                    pass
+
+    def _serve(self, client, write_lock):
+        reader = client.makefile("rb")
+        try:
+            self._send(client, write_lock, "Content-Type: auth/request\n\n")
+            while True:
+                lines = []
+                while True:
+                    line = reader.readline()
+                    if not line:
+                        return
+                    line = line.decode().rstrip("\r\n")
+                    if line:
+                        lines.append(line)
+                    elif lines:
+                        break
+                command = lines[0]
+                headers = dict(line.split(": ", 1) for line in lines[1:])
+                with self.lock:
+                    self.commands.append(command)
+                self._reply(client, write_lock, command, headers)
+        except OSError:
+            pass
+
+    def _reply(self, client, write_lock, command: str, headers: dict):
+        if command.startswith("auth "):
+            ok = command[5:] == self.password
+            if ok:
+                with self.lock:
+                    self.logins += 1
+            self._send(client, write_lock,
+                       f"Content-Type: command/reply\nReply-Text: {'+OK accepted' if ok else '-ERR invalid'}\n\n")
+            if not ok:
+                client.close()
+        elif command.startswith("event plain "):
+            with self.lock:
+                self.subscribers.append((client, write_lock, set(command.split()[2:])))
+            self._send(client, write_lock, "Content-Type: command/reply\nReply-Text: +OK event listener enabled plain\n\n")
+        elif command.startswith("bgapi "):
+            job = headers["Job-UUID"]
+            self._send(client, write_lock, f"Content-Type: command/reply\nReply-Text: +OK Job-UUID: {job}\n\n")
+            self.send_event({"Event-Name": "BACKGROUND_JOB", "Job-UUID": job, "Job-Command": command.split()[1]},
+                            self.job_body)
+        elif command.startswith("api "):
+            body = "UP 0 years, 0 days\n"
+            self._send(client, write_lock, f"Content-Type: api/response\nContent-Length: {len(body)}\n\n{body}")
+        else:
+            self._send(client, write_lock, "Content-Type: command/reply\nReply-Text: -ERR command not found\n\n")
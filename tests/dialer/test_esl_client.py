@@ -0,0 +1,115 @@
+"""ESLPool against a fake mod_event_socket.
+
+Run from the repository root:  python -m unittest discover tests/dialer
+"""
+
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from esl_client import ESLPool, ESLError  # noqa: E402
+from fake_esl import FakeESL  # noqa: E402
+
+
+def wait_until(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+class ESLPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.server = FakeESL()
+        self.server.start()
+        self.pools = []
+
+    def tearDown(self):
+        for pool in self.pools:
+            pool.close()
+        self.server.stop()
+
+    def pool(self, password: str = "ClueCon", **kwargs) -> ESLPool:
+        options = {"size": 2, "timeout": 1.0, "events": ["CHANNEL_ANSWER"], "retry_min": 0.05, "retry_max": 0.2}
+        options.update(kwargs)
+        pool = ESLPool("127.0.0.1", self.server.port, password, **options)
+        self.pools.append(pool)
+        return pool
+
+    def test_connect_authenticates_and_subscribes(self):
+        pool = self.pool()
+        pool.connect()
+        self.assertTrue(pool.ready)
+        self.assertEqual(self.server.logins, 2)
+        self.assertIn("event plain BACKGROUND_JOB CHANNEL_ANSWER", self.server.commands)
+        self.assertEqual(pool.api("status").strip(), "UP 0 years, 0 days")
+
+    def test_bad_password(self):
+        pool = self.pool(password="wrong")
+        with self.assertRaises(ESLError):
+            pool.connect()
+        self.assertFalse(pool.ready)
+
+    def test_bgapi_resolves_from_background_job(self):
+        pool = self.pool()
+        pool.connect()
+        result = pool.bgapi("originate sofia/internal/100 &park").result(timeout=2)
+        self.assertTrue(result["ok"])
+        self.assertEqual(result["uuid"], "00000000-0000-0000-0000-000000000000")
+        self.assertEqual(pool.jobs, {})
+
+        self.server.job_body = "-ERR NO_ANSWER\n"
+        result = pool.bgapi("originate sofia/internal/101 &park").result(timeout=2)
+        self.assertFalse(result["ok"])
+        self.assertEqual(result["body"], "-ERR NO_ANSWER")
+
+    def test_events_reach_handlers(self):
+        pool = self.pool()
+        seen = []
+        pool.add_handler(seen.append)
+        pool.connect()
+        self.server.send_event({"Event-Name": "CHANNEL_ANSWER", "Unique-ID": "abc"})
+        self.assertTrue(wait_until(lambda: any(e.get("Unique-ID") == "abc" for e in seen)))
+
+    def test_fails_fast_while_down_and_reconnects(self):
+        pool = self.pool()
+        pool.connect()
+        self.server.stop()
+        self.assertTrue(wait_until(lambda: not pool.ready))
+
+        started = time.monotonic()
+        with self.assertRaises(ESLError):
+            pool.bgapi("originate sofia/internal/100 &park")
+        with self.assertRaises(ESLError):
+            pool.api("status")
+        self.assertLess(time.monotonic() - started, 0.1)
+        self.assertEqual(pool.jobs, {})
+
+        self.server.start()
+        self.assertTrue(wait_until(lambda: pool.ready and not pool._dead_slots()))
+        self.assertTrue(pool.bgapi("originate sofia/internal/100 &park").result(timeout=2)["ok"])
+
+    def test_pending_jobs_fail_when_event_connection_drops(self):
+        pool = self.pool()
+        pool.connect()
+        self.server.send_event = lambda *args, **kwargs: None  # results never arrive
+        job = pool.bgapi("originate sofia/internal/100 &park")
+        self.server.stop()
+        with self.assertRaises(ESLError):
+            job.result(timeout=2)
+
+    def test_unconnected_pool_fails_fast_and_connects_in_background(self):
+        pool = self.pool()
+        with self.assertRaises(ESLError):
+            pool.bgapi("originate sofia/internal/100 &park")
+        self.assertTrue(wait_until(lambda: pool.ready))
+
+
+if __name__ == "__main__":
+    unittest.main()
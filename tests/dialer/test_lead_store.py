@@ -0,0 +1,182 @@
+"""LeadStore import, claims and the PROGRESS_FILE contract.
+
+Run from the repository root:  python -m unittest discover tests/dialer
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from lead_store import DIALING, DONE, NEW, LeadStore  # noqa: E402
+
+
+class LeadStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.dir.name, "leads.sqlite3")
+        self.lead_file = os.path.join(self.dir.name, "leads.txt")
+        self.progress_file = os.path.join(self.dir.name, "already_called.log")
+        self.stores = []
+
+    def tearDown(self):
+        for store in self.stores:
+            store.db.close()
+        self.dir.cleanup()
+
+    def store(self) -> LeadStore:
+        store = LeadStore(self.db_path, commit_every=1000, commit_sec=3600)
+        self.stores.append(store)
+        return store
+
+    def write(self, path: str, numbers):
+        with open(path, "w") as f:
+            f.write("".join(f"{number}\n" for number in numbers))
+        # Make sure a rewrite within the same mtime tick still looks changed
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    def read_progress(self) -> list:
+        with open(self.progress_file) as f:
+            return f.read().split()
+
+    def status(self, store: LeadStore, number: str) -> str:
+        return store.db.execute("SELECT status FROM leads WHERE number = ?", (number,)).fetchone()[0]
+
+    def test_sync_imports_once_and_bumps_generation(self):
+        self.write(self.lead_file, ["1001", "1002", "", "1003"])
+        store = self.store()
+        self.assertTrue(store.sync(self.lead_file))
+        self.assertEqual(store.generation, 1)
+        self.assertEqual(list(store.iter_undialed(page_size=2)), ["1001", "1002", "1003"])
+        self.assertFalse(store.sync(self.lead_file))
+        self.assertEqual(store.generation, 1)
+
+        self.write(self.lead_file, ["1003", "1004"])
+        self.assertTrue(store.sync(self.lead_file))
+        self.assertEqual(store.generation, 2)
+        # Leads dropped from the rewritten file stop being dialed
+        self.assertEqual(list(store.iter_undialed()), ["1003", "1004"])
+        self.assertEqual(store.remaining(), 2)
+
+    def test_generation_survives_reopen(self):
+        self.write(self.lead_file, ["1001"])
+        self.store().sync(self.lead_file)
+        store = self.store()
+        self.assertEqual(store.generation, 1)
+        self.assertFalse(store.sync(self.lead_file))
+
+    def test_missing_lead_file(self):
+        self.assertFalse(self.store().sync(self.lead_file))
+
+    def test_progress_file_numbers_count_as_called(self):
+        self.write(self.lead_file, ["1001", "1002", "1003"])
+        self.write(self.progress_file, ["1002", "9999"])
+        store = self.store()
+        store.sync(self.lead_file, self.progress_file)
+        self.assertEqual(list(store.iter_undialed()), ["1001", "1003"])
+        self.assertEqual(store.done(), 2)  # includes 9999, which is not a lead
+
+    def test_claim_and_release(self):
+        self.write(self.lead_file, ["1001", "1002"])
+        store = self.store()
+        store.sync(self.lead_file)
+        store.claim("1001")
+        self.assertEqual(self.status(store, "1001"), DIALING)
+        self.assertEqual(list(store.iter_undialed()), ["1002"])
+        store.release("1001")
+        self.assertEqual(self.status(store, "1001"), NEW)
+
+        store.claim("1002")
+        store.mark_done("1002", "HUMAN_POSITIVE")
+        store.flush()
+        store.release("1002")  # too late: already done
+        self.assertEqual(self.status(store, "1002"), DONE)
+
+    def test_claim_survives_a_crash(self):
+        self.write(self.lead_file, ["1001", "1002"])
+        store = self.store()
+        store.sync(self.lead_file)
+        store.claim("1001")
+        self.assertEqual(list(self.store().iter_undialed()), ["1002"])
+
+    def test_flush_commits_and_appends_to_progress_file(self):
+        self.write(self.lead_file, ["1001", "1002", "1003"])
+        store = self.store()
+        store.sync(self.lead_file, self.progress_file)
+        for number in ("1001", "1002"):
+            store.claim(number)
+            store.mark_done(number, "NO_ANSWER")
+        self.assertEqual(self.status(store, "1001"), DIALING)  # buffered until the flush
+        store.flush()
+        self.assertEqual(self.status(store, "1001"), DONE)
+        self.assertEqual(self.read_progress(), ["1001", "1002"])
+        self.assertEqual(store.remaining(), 1)
+        # Our own appends are not mistaken for an outside edit
+        self.assertFalse(store.sync(self.lead_file, self.progress_file))
+        self.assertEqual(list(store.iter_undialed()), ["1003"])
+
+    def test_mark_done_commits_in_batches(self):
+        self.write(self.lead_file, ["1001", "1002", "1003"])
+        store = LeadStore(self.db_path, commit_every=2, commit_sec=3600)
+        self.stores.append(store)
+        store.sync(self.lead_file)
+        store.mark_done("1001")
+        self.assertEqual(store.done(), 0)
+        store.mark_done("1002")
+        self.assertEqual(store.done(), 2)
+
+    def test_edited_progress_file_is_reimported(self):
+        self.write(self.lead_file, ["1001", "1002", "1003"])
+        store = self.store()
+        store.sync(self.lead_file, self.progress_file)
+        for number in ("1001", "1002"):
+            store.claim(number)
+            store.mark_done(number)
+        store.flush()
+
+        # Someone removes 1001 from already_called.log to have it dialed again
+        self.write(self.progress_file, ["1002"])
+        store.sync(self.lead_file, self.progress_file)
+        self.assertEqual(list(store.iter_undialed()), ["1001", "1003"])
+
+    def test_edit_keeps_claims_made_before_a_crash(self):
+        self.write(self.lead_file, ["1001", "1002", "1003"])
+        store = self.store()
+        store.sync(self.lead_file, self.progress_file)
+        store.claim("1001")  # originate sent, then the dialer died
+
+        self.write(self.progress_file, ["1003"])
+        store = self.store()
+        store.sync(self.lead_file, self.progress_file)
+        self.assertEqual(self.status(store, "1001"), DIALING)
+        self.assertEqual(list(store.iter_undialed()), ["1002"])
+
+    def test_deleted_progress_file_redials_everything_done(self):
+        self.write(self.lead_file, ["1001", "1002"])
+        store = self.store()
+        store.sync(self.lead_file, self.progress_file)
+        store.mark_done("1001")
+        store.flush()
+        os.remove(self.progress_file)
+        store.sync(self.lead_file, self.progress_file)
+        self.assertEqual(list(store.iter_undialed()), ["1001", "1002"])
+
+    def test_first_progress_sync_appends_numbers_already_dialed(self):
+        self.write(self.lead_file, ["1001", "1002", "1003"])
+        store = self.store()
+        store.sync(self.lead_file)
+        store.claim("1001")
+        store.mark_done("1002")
+        store.flush()
+
+        self.write(self.progress_file, ["1003"])
+        store.sync(self.lead_file, self.progress_file)
+        self.assertEqual(sorted(self.read_progress()), ["1001", "1002", "1003"])
+        self.assertEqual(store.remaining(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+"""Binomial predictive pacing.
+
+Run from the repository root:  python -m unittest discover tests/dialer
+"""
+
+import asyncio
+import os
+import sys
+import time
+import unittest
+from math import comb
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from pacing import PacingController, expected_abandon_ratio, max_pending  # noqa: E402
+
+
+def brute_force_ratio(pending: int, p: float, free: int) -> float:
+    """E[(X - free)+] / E[X] straight from the Binomial pmf."""
+    over = sum(comb(pending, k) * p ** k * (1 - p) ** (pending - k) * (k - free)
+               for k in range(free + 1, pending + 1))
+    return over / (pending * p)
+
+
+class FakeLive:
+    """The bits of LiveChannels the controller uses."""
+
+    def __init__(self):
+        self.calls = {}
+        self.listeners = []
+        self.changed = asyncio.Condition()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+
+def finished(status: str = "answered", result: str = "", talk_sec: float = 120.0) -> dict:
+    return {"status": status, "result": result, "talkSec": talk_sec}
+
+
+class ExpectedAbandonRatioTest(unittest.TestCase):
+    def test_matches_binomial(self):
+        for pending, p, free in [(10, 0.3, 2), (6, 0.5, 1), (20, 0.1, 3), (4, 0.9, 3)]:
+            with self.subTest(pending=pending, p=p, free=free):
+                self.assertAlmostEqual(expected_abandon_ratio(pending, p, free),
+                                       brute_force_ratio(pending, p, free), places=9)
+
+    def test_edges(self):
+        self.assertEqual(expected_abandon_ratio(0, 0.5, 2), 0.0)
+        self.assertEqual(expected_abandon_ratio(5, 0.0, 2), 0.0)
+        self.assertEqual(expected_abandon_ratio(5, 0.5, 0), 1.0)
+        self.assertEqual(expected_abandon_ratio(3, 0.5, 3), 0.0)  # never more transfers than agents
+        self.assertAlmostEqual(expected_abandon_ratio(5, 1.0, 2), 0.6)
+
+
+class MaxPendingTest(unittest.TestCase):
+    def test_no_free_agents(self):
+        self.assertEqual(max_pending(0.2, 0, 0.02, 10), 0)
+
+    def test_certain_answers_dial_one_per_agent(self):
+        self.assertEqual(max_pending(1.0, 3, 0.02, 10), 3)
+        self.assertEqual(max_pending(1.5, 3, 0.02, 2), 2)
+
+    def test_low_answer_rate_overdials_within_target(self):
+        n = max_pending(0.1, 2, 0.02, 50)
+        self.assertGreater(n, 2)
+        self.assertLessEqual(expected_abandon_ratio(n, 0.1, 2), 0.02)
+        self.assertGreater(expected_abandon_ratio(n + 1, 0.1, 2), 0.02)
+
+    def test_limit_caps_the_overdial(self):
+        self.assertEqual(max_pending(0.01, 2, 0.02, 6), 6)
+
+    def test_never_below_free_agents(self):
+        # Even when one extra call would break the target, every free agent gets a dial
+        self.assertEqual(max_pending(0.9, 2, 0.0, 10), 2)
+
+
+class PacingControllerTest(unittest.TestCase):
+    def setUp(self):
+        self.live = FakeLive()
+        self.pacing = PacingController(self.live, agents=2, target_abandon=0.02, max_abandon=0.03,
+                                       min_samples=30, screen_sec=15.0, min_transfer_sec=5.0, limit=10)
+
+    def record(self, count: int, **kwargs):
+        for _ in range(count):
+            self.pacing.record(finished(**kwargs))
+
+    def test_registers_as_listener(self):
+        self.assertEqual(self.live.listeners, [self.pacing.record])
+
+    def test_rates(self):
+        self.record(6, result="HUMAN_POSITIVE")
+        self.record(2, result="HUMAN_POSITIVE", talk_sec=3.0)  # hung up before the bridge held
+        self.record(2, result="MACHINE")
+        self.record(10, status="no_answer")
+        self.record(5, status="stale")  # ignored
+        rates = self.pacing.rates()
+        self.assertEqual(rates["samples"], 20)
+        self.assertAlmostEqual(rates["answerRate"], 0.5)
+        self.assertAlmostEqual(rates["humanRate"], 0.8)
+        self.assertAlmostEqual(rates["abandonRate"], 0.25)
+
+    def test_low_sample_warmup_dials_one_per_free_agent(self):
+        self.record(29, status="no_answer")
+        plan = self.pacing.plan()
+        self.assertEqual(plan["mode"], "warmup")
+        self.assertEqual(plan["p"], 1.0)
+        self.assertEqual(plan["target"], 2)
+
+    def test_predictive_overdials_at_low_answer_rate(self):
+        self.record(5, result="HUMAN_POSITIVE")
+        self.record(95, status="no_answer")
+        plan = self.pacing.plan()
+        self.assertEqual(plan["mode"], "predictive")
+        self.assertAlmostEqual(plan["p"], 0.05)
+        self.assertGreater(plan["target"], 2)
+        self.assertLessEqual(plan["target"], 10)
+
+    def test_no_transfers_yet_does_not_open_the_dialer(self):
+        self.pacing.limit = 100
+        self.record(40, status="no_answer")
+        plan = self.pacing.plan()
+        self.assertEqual(plan["p"], round(1 / 41, 4))
+        self.assertEqual(plan["target"], max_pending(1 / 41, 2, 0.02, 100))
+        self.assertLess(plan["target"], 100)
+
+    def test_high_answer_rate_dials_one_per_free_agent(self):
+        self.record(40, result="HUMAN_POSITIVE")
+        plan = self.pacing.plan()
+        self.assertEqual(plan["mode"], "predictive")
+        self.assertEqual(plan["p"], 1.0)
+        self.assertEqual(plan["target"], 2)
+
+    def test_abandon_cap_falls_back_to_one_per_free_agent(self):
+        self.record(2, result="HUMAN_POSITIVE", talk_sec=10.0)  # 2 / 20 humans abandoned
+        self.record(18, result="HUMAN_POSITIVE")
+        self.record(80, status="no_answer")
+        plan = self.pacing.plan()
+        self.assertGreater(plan["abandonRate"], 0.03)
+        self.assertEqual(plan["mode"], "capped")
+        self.assertEqual(plan["target"], 2)
+
+    def test_live_split_and_busy_agents(self):
+        now = time.time()
+        self.live.calls = {
+            "ringing": {"answered": None},
+            "screening": {"answered": now - 5},
+            "bridged": {"answered": now - 60},
+        }
+        self.record(40, result="HUMAN_POSITIVE")
+        plan = self.pacing.plan()
+        self.assertEqual((plan["pending"], plan["transferred"], plan["free"]), (2, 1, 1))
+        self.assertEqual(plan["target"], 1)
+
+        self.live.calls["bridged2"] = {"answered": now - 60}
+        self.assertEqual(self.pacing.plan()["target"], 0)
+
+    def test_wait_turn_returns_when_under_target(self):
+        plan = asyncio.run(self.pacing.wait_turn())
+        self.assertEqual(plan["pending"], 0)
+        self.assertGreater(self.pacing.last_dial, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()